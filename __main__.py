@@ -1,14 +1,32 @@
+import argparse
 from caenParser import select_file, Parser
-import matplotlib.pyplot as plt
+from caenParser.utils import get_backend, profiler
+
+plt = get_backend("matplotlib")  # matplotlib.pyplot, imported when the first plot is made
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Load a CAEN digitizer file and plot its first events.")
+    parser.add_argument("file", nargs="?", help="file to load, possibly compressed, or - for stdin (a file dialog opens when omitted)")
+    parser.add_argument("--profile", action="store_true", help="print the per-stage load profile")
+    parser.add_argument("--profile-memory", action="store_true", help="--profile with tracemalloc peaks (slower)")
+    parser.add_argument("--no-plot", action="store_true", help="load the file without plotting")
+    args = parser.parse_args()
+
+    if args.profile or args.profile_memory:
+        profiler.enable(memory=args.profile_memory)
+
     dc = Parser()
     dc.set_measure_magnitude("VOLTAGE")  # Set the measure magnitude to ADC_COUNTS
-    dc.loadFile(select_file())
+    dc.loadFile(args.file or select_file())
+    if profiler.enabled:
+        print(profiler.format())
+    if args.no_plot:
+        return
+
     plt.figure(figsize=(10, 6))
     event_id = 1
-    
+
     df = dc.get_data_frame(event_id, 0)
     plt.plot(df["Time"], df["Amplitude"], label=f"Event {event_id}", alpha=0.5)
     plt.title("Channel Data from Events")
@@ -24,4 +42,4 @@ def main():
     plt.show()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
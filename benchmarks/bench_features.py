@@ -0,0 +1,98 @@
+"""
+Throughput of pulse feature extraction, in events per second: the
+per-event pandas loop analyses used before against
+PulseFeatures.extract_features over the whole events x samples matrix.
+
+The traces are synthetic negative pulses (random amplitude and arrival
+time, 5/50 sample rise/fall constants, gaussian noise) on a 14-bit
+baseline, 1024 samples at 250 MHz with the trigger at sample 256.
+
+    python benchmarks/bench_features.py [--samples N] [--repeat N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from caenParser.domain.PulseFeatures import extract_features  # noqa: E402
+
+EVENTS = [1000, 10000, 50000]
+FREQUENCY = 250e6
+TRIGGER = 256
+
+
+def synthetic_pulses(n_events: int, n_samples: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples)
+    x = t[None, :] - rng.uniform(TRIGGER + 20, TRIGGER + 120, n_events)[:, None]
+    pulse = np.where(x > 0, (1 - np.exp(-x / 5.0)) * np.exp(-x / 50.0), 0.0)
+    pulse /= pulse.max(axis=1, keepdims=True)
+    amplitude = rng.uniform(100, 2000, n_events)[:, None]
+    return (8000 - amplitude * pulse + rng.normal(0, 2, pulse.shape)).astype(np.uint16)
+
+
+def legacy_features(matrix: np.ndarray) -> list[dict]:
+    # One DataFrame per event, as the analyses built from get_data_frame did
+    out = []
+    for row in matrix:
+        df = pd.DataFrame(row.astype(float), columns=["Amplitude"])
+        df["Time"] = (df.index - TRIGGER) / FREQUENCY
+        baseline = df["Amplitude"].iloc[:TRIGGER].mean()
+        signal = baseline - df["Amplitude"]
+        peak = signal.idxmax()
+        amplitude = signal[peak]
+        leading = signal.iloc[:peak]
+        lo = leading[leading < 0.1 * amplitude].index.max()
+        hi = leading[leading < 0.9 * amplitude].index.max()
+        half = leading[leading < 0.5 * amplitude].index.max()
+        trailing = signal.iloc[peak:]
+        fall = trailing[trailing < 0.1 * amplitude].index.min()
+        out.append({
+            "baseline": baseline,
+            "amplitude": amplitude,
+            "peak_time": df["Time"][peak],
+            "charge": signal.sum() / FREQUENCY,
+            "rise_time": (hi - lo) / FREQUENCY,
+            "fall_time": (fall - peak) / FREQUENCY,
+            "cfd_time": df["Time"][half],
+        })
+    return out
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=1024, help="samples per trace")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    # The legacy loop is timed on a subset, it scales linearly with the events
+    legacy_matrix = synthetic_pulses(500, args.samples)
+    legacy_rate = len(legacy_matrix) / best_of(lambda: legacy_features(legacy_matrix), 1)
+
+    print(f"{'events':>8} {'per-event pandas [ev/s]':>24} {'vectorised [ev/s]':>18} {'speedup':>8}")
+    for n in EVENTS:
+        matrix = synthetic_pulses(n, args.samples)
+        features = extract_features(matrix, TRIGGER, polarity=-1, frequency=FREQUENCY)
+        reference = legacy_features(matrix[:50])
+        assert np.allclose(features["amplitude"][:50], [r["amplitude"] for r in reference])
+        elapsed = best_of(lambda: extract_features(matrix, TRIGGER, polarity=-1, frequency=FREQUENCY), args.repeat)
+        print(f"{n:>8} {legacy_rate:>24,.0f} {n / elapsed:>18,.0f} {(n / elapsed) / legacy_rate:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
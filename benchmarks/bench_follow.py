@@ -0,0 +1,143 @@
+"""
+Latency of FileParserRAW.follow and afollow, from the moment the DAQ
+completes an event in the file to the moment the tail yields it.
+
+A synthetic run (see synthetic.py) is copied into a growing file event by
+event: the event is written up to the middle of its last record, the tail
+must not yield anything, then the record is completed and the time until
+the event comes out is measured. On Linux the tail is woken by inotify, so
+every event must come well under poll_interval (by default a tenth of it);
+elsewhere the tail polls and the check fails by design. Exits with status
+1 when an event came early, late, or not at all.
+
+    python benchmarks/bench_follow.py [--events N] [--poll-interval S] [--bound S]
+"""
+import argparse
+import asyncio
+import queue
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import synthetic  # noqa: E402
+from caenParser.persistence.FileParserRAW import FileParserRAW  # noqa: E402
+
+HALF_WRITE_WAIT = 0.05  # How long a half written event is watched for an early yield, in seconds
+
+
+def split_events(data: bytes) -> tuple[bytes, list[tuple[int, bytes]]]:
+    """(descriptor and settings records, [(event id, its waveform records)]) of a RAW run."""
+    prelude, events, offset = b"", [], 0
+    while offset < len(data):
+        size, record_type = struct.unpack_from("<II", data, offset)
+        record = data[offset:offset + size]
+        if record_type != synthetic.TP_TRACE_DATA:
+            prelude += record
+        else:
+            event_id = struct.unpack_from("<I", data, offset + 8)[0]
+            if events and events[-1][0] == event_id:
+                events[-1] = (event_id, events[-1][1] + record)
+            else:
+                events.append((event_id, record))
+        offset += size
+    return prelude, events
+
+
+def _reader(path: str, asynchronous: bool, poll_interval: float, stop: threading.Event, out: queue.Queue):
+    parser = FileParserRAW()
+    parser.open(path)
+    try:
+        if asynchronous:
+            async def consume():
+                async for event in parser.afollow(poll_interval=poll_interval, stop=stop):
+                    out.put((time.monotonic(), event.id))
+            asyncio.run(consume())
+        else:
+            for event in parser.follow(poll_interval=poll_interval, stop=stop):
+                out.put((time.monotonic(), event.id))
+    finally:
+        parser.close()
+        out.put(None)
+
+
+def measure(prelude: bytes, events: list[tuple[int, bytes]], asynchronous: bool, poll_interval: float,
+            record_size: int) -> tuple[list[float], list[str]]:
+    """(latency of every event in s, problems seen) of one tail of a file written event by event."""
+    latencies, problems = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "live.bin")
+        with open(path, "wb") as f:
+            f.write(prelude)
+            f.flush()
+            stop, out = threading.Event(), queue.Queue()
+            reader = threading.Thread(target=_reader, args=(path, asynchronous, poll_interval, stop, out))
+            reader.start()
+            for event_id, records in events:
+                cut = len(records) - record_size // 2
+                f.write(records[:cut])
+                f.flush()
+                try:
+                    early = out.get(timeout=HALF_WRITE_WAIT)
+                    problems.append(f"event {early[1]} yielded before its last record was complete")
+                    continue
+                except queue.Empty:
+                    pass
+                f.write(records[cut:])
+                f.flush()
+                written = time.monotonic()
+                try:
+                    item = out.get(timeout=2 * poll_interval + 1.0)
+                except queue.Empty:
+                    problems.append(f"event {event_id} never yielded")
+                    continue
+                if item is None or item[1] != event_id:
+                    problems.append(f"expected event {event_id}, got {item}")
+                    continue
+                latencies.append(item[0] - written)
+            stop.set()
+            reader.join()
+    return latencies, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=30, help="events written to the followed file")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="poll_interval of the tail in s")
+    parser.add_argument("--bound", type=float, default=None,
+                        help="maximum latency of any event in s, a tenth of poll_interval by default")
+    args = parser.parse_args()
+    bound = args.poll_interval / 10 if args.bound is None else args.bound
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run = Path(tmp) / "run.bin"
+        synthetic.write_raw(run, events=args.events, channels=4, samples=1024)
+        prelude, events = split_events(run.read_bytes())
+    record_size = struct.unpack_from("<I", events[0][1])[0]
+
+    print(f"{args.events} events, poll_interval {args.poll_interval * 1000:.0f} ms, bound {bound * 1000:.0f} ms")
+    print(f"{'iterator':<10} {'median [ms]':>12} {'max [ms]':>10}")
+    failed = False
+    for name, asynchronous in (("follow", False), ("afollow", True)):
+        latencies, problems = measure(prelude, events, asynchronous, args.poll_interval, record_size)
+        if latencies:
+            print(f"{name:<10} {statistics.median(latencies) * 1000:>12.1f} {max(latencies) * 1000:>10.1f}")
+        for problem in problems:
+            print(f"FAIL: {name}: {problem}")
+        if problems or not latencies or max(latencies) > bound:
+            failed = True
+            if latencies and max(latencies) > bound:
+                print(f"FAIL: {name}: an event took {max(latencies) * 1000:.1f} ms, over the "
+                      f"{bound * 1000:.0f} ms bound")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
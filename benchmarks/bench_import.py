@@ -0,0 +1,94 @@
+"""
+Time of a cold `import caenParser`, and check that none of the optional
+backends (ROOT, tkinter, matplotlib, pandas, pyarrow) nor the modules only
+the file readers need (xml, json, hashlib) is imported by it.
+
+Every run is a fresh interpreter that imports numpy, which caenParser cannot
+do without and whose import time depends mostly on the machine, and then
+caenParser, timing both by wall clock. The median of what caenParser adds
+on top of numpy is compared against the budget. One more interpreter run
+with -X importtime lists the modules that cost the most; its figures carry
+the overhead of the tracing and are for orientation only. Exits with status
+1 when over budget or when one of those modules was imported.
+
+    python benchmarks/bench_import.py [--runs N] [--budget MS] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+LAZY = ["ROOT", "tkinter", "matplotlib", "pandas", "pyarrow", "xml.etree.ElementTree", "json", "hashlib"]
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import numpy
+baseline = time.perf_counter()
+import caenParser
+end = time.perf_counter()
+lazy = [m for m in {LAZY!r} if m in sys.modules]
+print(repr(((baseline - start) * 1000, (end - baseline) * 1000, lazy)))
+"""
+
+
+def _env() -> dict:
+    return dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT_DIR / "src"), os.environ.get("PYTHONPATH", "")]))
+
+
+def run_once() -> tuple[float, float, list[str]]:
+    """(numpy ms, caenParser on top of numpy ms, lazy modules imported) in a fresh interpreter."""
+    proc = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=_env(), check=True)
+    numpy_ms, own_ms, imported = eval(proc.stdout.strip().splitlines()[-1])
+    return numpy_ms, own_ms, imported
+
+
+def slowest_modules(top: int) -> list[tuple[str, float]]:
+    """Modules imported by caenParser, outside numpy, with the largest self time under -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import numpy; import caenParser"],
+        capture_output=True, text=True, env=_env(), check=True
+    )
+    lines = [line[len("import time:"):].split("|") for line in proc.stderr.splitlines()
+             if line.startswith("import time:") and "cumulative" not in line]
+    names = [name.strip() for _, _, name in lines]
+    after_numpy = names.index("numpy") + 1 if "numpy" in names else 0
+    own = [(name.strip(), int(self_us) / 1000) for self_us, _, name in lines[after_numpy:]]
+    return sorted(own, key=lambda kv: -kv[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time, the median is kept")
+    parser.add_argument("--budget", type=float, default=40.0,
+                        help="maximum median time in ms that import caenParser adds to import numpy")
+    parser.add_argument("--top", type=int, default=10, help="modules with the largest self import time to list")
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    own = [own_ms for _, own_ms, _ in results]
+    median = statistics.median(own)
+    imported = sorted({m for _, _, lazy in results for m in lazy})
+
+    print(f"import caenParser after numpy: median {median:.1f} ms, min {min(own):.1f} ms over {args.runs} runs "
+          f"(budget {args.budget:.0f} ms)")
+    print(f"  import numpy alone: median {statistics.median(n for n, _, _ in results):.1f} ms")
+    print(f"\n{'module (-X importtime, self)':<50} {'[ms]':>8}")
+    for name, ms in slowest_modules(args.top):
+        print(f"{name:<50} {ms:>8.1f}")
+
+    failed = False
+    if imported:
+        print(f"\nFAIL: modules imported eagerly: {', '.join(imported)}")
+        failed = True
+    if median > args.budget:
+        print(f"\nFAIL: import caenParser adds {median:.1f} ms to numpy, over the {args.budget:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
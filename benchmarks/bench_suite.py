@@ -0,0 +1,399 @@
+"""
+End-to-end benchmark of every reader and of the Parser (DomainController)
+load and query paths, on synthetic runs of a configurable size written by
+synthetic.py in every input format.
+
+Every case runs in a fresh interpreter, repeat times; the best time is
+kept, together with the largest peak RSS. Each case reports events/s, MB/s
+of input (of trace data for the in-memory queries), peak RSS and seconds;
+the import case times `import caenParser` alone, and gunzip the
+decompression of the gzip copy of the RAW run that raw_gzip parses. Results are written as
+JSON (by default to benchmarks/results/<date>-<commit>.json) and, with
+--compare, checked against an earlier result file: a case slower, or with
+a peak RSS larger, by more than --tolerance exits with status 1.
+
+    python benchmarks/bench_suite.py [--events N] [--channels N] [--samples N] [--repeat N]
+                                     [--cases a,b,...] [--out FILE] [--compare FILE] [--tolerance F]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+sys.path.insert(0, str(ROOT_DIR / "benchmarks"))
+
+import synthetic  # noqa: E402
+
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+QUERY_WINDOWS = 1000
+
+
+def run_files(data: Path, args) -> dict[str, list[Path]]:
+    """Writes (or reuses) the synthetic run in every format, named after its size."""
+    sizes = dict(events=args.events, channels=args.channels, samples=args.samples, seed=args.seed)
+    stem = data / f"run_{args.events}x{args.channels}x{args.samples}_s{args.seed}"
+    files = {
+        "raw": [stem.with_suffix(".bin")],
+        "xml": [stem.with_suffix(".xml")],
+        "wd2": [stem.with_suffix(".wd2")],
+        "wd2_one": [stem.with_name(f"{stem.name}_one_ch{c}.wd2") for c in range(args.channels)],
+        "raw_gz": [stem.with_suffix(".bin.gz")],
+        "wd2_gz": [stem.with_suffix(".wd2.gz")],
+    }
+    if not files["raw"][0].exists():
+        synthetic.write_raw(files["raw"][0], **sizes)
+    if not files["xml"][0].exists():
+        synthetic.write_xml(files["xml"][0], **sizes)
+    if not files["wd2"][0].exists():
+        synthetic.write_wavedump2(files["wd2"][0], layout="normal", **sizes)
+    if not all(p.exists() for p in files["wd2_one"]):
+        synthetic.write_wavedump2(stem.with_name(f"{stem.name}_one.wd2"), layout="one", **sizes)
+    for plain, compressed in (("raw", "raw_gz"), ("wd2", "wd2_gz")):
+        if not files[compressed][0].exists():
+            _gzip(files[plain][0], files[compressed][0])
+    return files
+
+
+def _gzip(source: Path, target: Path):
+    import gzip
+    import shutil
+    with open(source, "rb") as f, gzip.open(target, "wb", compresslevel=6) as g:
+        shutil.copyfileobj(f, g, 4 << 20)
+
+
+# Cases: fn(files) -> (seconds, events, bytes), only the timed part counts
+
+def case_import(files):
+    start = time.perf_counter()
+    import caenParser  # noqa: F401
+    return time.perf_counter() - start, 0, 0
+
+
+def case_raw_stream(files):
+    from caenParser.persistence.FileParserRAW import FileParserRAW
+    start = time.perf_counter()
+    parser = FileParserRAW()
+    parser.open(str(files["raw"][0]))
+    events = sum(1 for _ in parser.iter_events())
+    parser.close()
+    return time.perf_counter() - start, events, _size(files["raw"])
+
+
+def case_raw_stream_channel(files):
+    from caenParser import Selection
+    from caenParser.persistence.FileParserRAW import FileParserRAW
+    start = time.perf_counter()
+    parser = FileParserRAW(selection=Selection(channels=[0]))
+    parser.open(str(files["raw"][0]))
+    events = sum(1 for _ in parser.iter_events())
+    parser.close()
+    return time.perf_counter() - start, events, _size(files["raw"])
+
+
+def case_raw_mapped(files):
+    from caenParser.persistence.FileParserRAWMapped import FileParserRAWMapped
+    start = time.perf_counter()
+    parser = FileParserRAWMapped()
+    parser.open(str(files["raw"][0]))
+    parser.parse()
+    run = parser.load_run()
+    parser.close()
+    return time.perf_counter() - start, len(run.event_ids), _size(files["raw"])
+
+
+def case_xml_stream(files):
+    from caenParser.persistence.FileParserXML import FileParserXML
+    start = time.perf_counter()
+    parser = FileParserXML()
+    parser.open(str(files["xml"][0]))
+    events = sum(1 for _ in parser.iter_events())
+    parser.close()
+    return time.perf_counter() - start, events, _size(files["xml"])
+
+
+def case_gunzip(files):
+    # What the compressed cases can at best reach: the decompressor alone
+    import gzip
+    start = time.perf_counter()
+    with gzip.open(files["raw_gz"][0], "rb") as f:
+        while f.read(4 << 20):
+            pass
+    return time.perf_counter() - start, 0, _size(files["raw_gz"])
+
+
+def case_raw_gzip(files):
+    from caenParser.persistence.FileParserRAW import FileParserRAW
+    start = time.perf_counter()
+    parser = FileParserRAW()
+    parser.open(str(files["raw_gz"][0]))
+    events = sum(1 for _ in parser.iter_events())
+    parser.close()
+    return time.perf_counter() - start, events, _size(files["raw_gz"])
+
+
+def case_wd2_iter(files):
+    from caenParser import WaveDump2BinParser
+    start = time.perf_counter()
+    with WaveDump2BinParser(str(files["wd2"][0]), data_type="uint") as parser:
+        events = sum(1 for _ in parser)
+    return time.perf_counter() - start, events, _size(files["wd2"])
+
+
+def case_wd2_array(files):
+    from caenParser import WaveDump2BinParser
+    start = time.perf_counter()
+    with WaveDump2BinParser(str(files["wd2"][0]), data_type="uint") as parser:
+        events = 0
+        for chunk in parser.iter_chunks():
+            chunk["waveform"].sum()  # Touch every sample of the mapping
+            events += len(chunk)
+    return time.perf_counter() - start, events, _size(files["wd2"])
+
+
+def case_wd2_gzip(files):
+    from caenParser import WaveDump2BinParser
+    start = time.perf_counter()
+    with WaveDump2BinParser(str(files["wd2_gz"][0]), data_type="uint") as parser:
+        events = 0
+        for chunk in parser.iter_chunks():
+            chunk["waveform"].sum()
+            events += len(chunk)
+    return time.perf_counter() - start, events, _size(files["wd2_gz"])
+
+
+def case_wd2_multi(files):
+    from caenParser import WaveDump2MultiFileParser
+    start = time.perf_counter()
+    with WaveDump2MultiFileParser({c: str(p) for c, p in enumerate(files["wd2_one"])}, data_type="uint") as parser:
+        events = sum(len(batch["event_num"]) for batch in parser.iter_batches())
+    return time.perf_counter() - start, events, _size(files["wd2_one"])
+
+
+def _load(path: Path, **kwargs):
+    from caenParser import Parser
+    parser = Parser()
+    start = time.perf_counter()
+    parser.loadFile(str(path), **kwargs)
+    return parser, time.perf_counter() - start
+
+
+def case_load_raw(files):
+    parser, seconds = _load(files["raw"][0])
+    return seconds, len(parser.events_ids), _size(files["raw"])
+
+
+def case_load_raw_mapped(files):
+    parser, seconds = _load(files["raw"][0], mapped=True)
+    return seconds, len(parser.events_ids), _size(files["raw"])
+
+
+def case_load_raw_lazy(files):
+    parser, seconds = _load(files["raw"][0], lazy=True)
+    return seconds, len(parser.events_ids), _size(files["raw"])
+
+
+def case_load_raw_run(files):
+    parser, seconds = _load(files["raw"][0], workers=1)
+    return seconds, len(parser.events_ids), _size(files["raw"])
+
+
+def case_load_xml(files):
+    parser, seconds = _load(files["xml"][0])
+    return seconds, len(parser.events_ids), _size(files["xml"])
+
+
+def case_query_matrix(files):
+    parser, _ = _load(files["raw"][0])
+    ids = parser.events_ids
+    start = time.perf_counter()
+    matrix, _ = parser.get_channel_matrix(ids, 0, "voltage")
+    return time.perf_counter() - start, len(ids), len(ids) * matrix.shape[1] * 2
+
+
+def case_query_features(files):
+    parser, _ = _load(files["raw"][0])
+    ids = parser.events_ids
+    start = time.perf_counter()
+    features = parser.get_features(ids, 0, "adc_counts")
+    seconds = time.perf_counter() - start
+    return seconds, len(features), len(ids) * parser.get_event(ids[0]).get_channel_data(0).shape[0] * 2
+
+
+def case_query_time(files):
+    import numpy as np
+    parser, _ = _load(files["raw"][0])
+    start = time.perf_counter()
+    times = parser.time_index().times / 1e9
+    edges = np.linspace(times[0], times[-1], QUERY_WINDOWS + 1)
+    found = sum(len(parser.events_between(t0, t1)) for t0, t1 in zip(edges[:-1], edges[1:]))
+    parser.get_rate(bin_width=0.1)
+    return time.perf_counter() - start, found, 0
+
+
+CASES = {
+    name[len("case_"):]: fn for name, fn in globals().items() if name.startswith("case_")
+}
+
+
+def _size(paths: list[Path]) -> int:
+    return sum(p.stat().st_size for p in paths)
+
+
+def _peak_rss_mb():
+    # ru_maxrss survives fork and exec on Linux, so it would report the parent's peak; VmHWM does not
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def run_child(case: str, files: dict):
+    seconds, events, n_bytes = CASES[case]({k: [Path(p) for p in v] for k, v in files.items()})
+    # The last stdout line is the result, the library may print before it
+    print("\n" + json.dumps({"seconds": seconds, "events": events, "bytes": n_bytes, "peak_rss_mb": _peak_rss_mb()}))
+
+
+def run_case(case: str, files: dict, repeat: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT_DIR / "src"), os.environ.get("PYTHONPATH", "")]))
+    payload = json.dumps({k: [str(p) for p in v] for k, v in files.items()})
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", case, "--files", payload],
+            capture_output=True, text=True, env=env
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Case {case} failed:\n{proc.stderr.strip()}")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    best = min(runs, key=lambda r: r["seconds"])
+    rss = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+    return {
+        "seconds": best["seconds"],
+        "events": best["events"],
+        "events_per_s": best["events"] / best["seconds"] if best["events"] else None,
+        "mb_per_s": best["bytes"] / 2 ** 20 / best["seconds"] if best["bytes"] else None,
+        "peak_rss_mb": max(rss) if rss else None,
+    }
+
+
+def environment(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import numpy as np
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sizes": {"events": args.events, "channels": args.channels, "samples": args.samples, "seed": args.seed},
+        "repeat": args.repeat,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Cases slower, or with a larger peak RSS, than in baseline by more than tolerance."""
+    if results["meta"]["sizes"] != baseline["meta"]["sizes"]:
+        print(f"WARNING: Baseline sizes {baseline['meta']['sizes']} differ from {results['meta']['sizes']}",
+              file=sys.stderr)
+    regressions = []
+    print(f"\n{'case':<22} {'seconds':>10} {'baseline':>10} {'ratio':>7} {'rss [MB]':>9} {'baseline':>9}")
+    for case, now in results["cases"].items():
+        before = baseline["cases"].get(case)
+        if before is None:
+            continue
+        ratio = now["seconds"] / before["seconds"]
+        rss, rss_before = now["peak_rss_mb"], before["peak_rss_mb"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = " slower"
+        if rss is not None and rss_before is not None and rss > rss_before * (1 + tolerance):
+            flag += " larger"
+        if flag:
+            regressions.append(case)
+        print(f"{case:<22} {now['seconds']:>10.4f} {before['seconds']:>10.4f} {ratio:>7.2f} "
+              f"{_fmt(rss, 9, 1)} {_fmt(rss_before, 9, 1)}{flag}")
+    return regressions
+
+
+def _fmt(value, width: int, digits: int) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--samples", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per case, the best time is kept")
+    parser.add_argument("--cases", help=f"comma separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--data", help="directory for the synthetic files, kept and reused (default: a temporary one)")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown or RSS growth, as a fraction")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--files", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.files))
+        return
+
+    cases = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Path(args.data or tmp)
+        data.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        files = run_files(data, args)
+        print(f"{args.events} events x {args.channels} channels x {args.samples} samples, "
+              f"written in {time.perf_counter() - start:.1f} s to {data}")
+
+        results = {"meta": environment(args), "cases": {}}
+        print(f"\n{'case':<22} {'seconds':>10} {'events/s':>12} {'MB/s':>9} {'rss [MB]':>9}")
+        for case in cases:
+            r = results["cases"][case] = run_case(case, files, args.repeat)
+            print(f"{case:<22} {r['seconds']:>10.4f} {_fmt(r['events_per_s'], 12, 0)} "
+                  f"{_fmt(r['mb_per_s'], 9, 1)} {_fmt(r['peak_rss_mb'], 9, 1)}")
+
+    meta = results["meta"]
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{meta['date'][:10]}-{meta['commit'] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            print(f"\nRegressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
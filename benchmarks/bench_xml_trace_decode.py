@@ -0,0 +1,66 @@
+"""
+Throughput of <trace> body decoding in FileParserXML, before and after
+the switch to decode_samples.
+
+The trace bodies are built from the samples in .DATA/test1.xml, repeated
+up to the window sizes the digitizer supports and laid out 14 per line like
+the CAEN export.
+
+    python benchmarks/bench_xml_trace_decode.py [--repeat N]
+"""
+import argparse
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from caenParser.persistence.FileParserXML import decode_samples  # noqa: E402
+
+WINDOWS = [630, 10230, 163830, 655350]
+
+
+def legacy_decode(text: str) -> list[int]:
+    # The per-token loop FileParserXML._traverse_event used before
+    trace_body = re.split(r"[ \n]", text)
+    return [int(x) for x in trace_body if x.isdigit()]
+
+
+def sample_body(n_samples: int) -> str:
+    tree = ET.parse(ROOT_DIR / ".DATA" / "test1.xml")
+    seed = np.array(tree.getroot().find("event/trace").text.split(), dtype=np.uint16)
+    samples = np.resize(seed, n_samples).astype(str)
+    lines = [" ".join(samples[i:i + 14]) for i in range(0, n_samples, 14)]
+    return "\n".join(lines) + "\n"
+
+
+def best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the best is kept")
+    args = parser.parse_args()
+
+    print(f"{'samples':>10} {'before [Msamples/s]':>20} {'after [Msamples/s]':>19} {'speedup':>8}")
+    for n in WINDOWS:
+        text = sample_body(n)
+        assert np.array_equal(decode_samples(text), legacy_decode(text))
+        before = best_of(legacy_decode, text, args.repeat)
+        after = best_of(decode_samples, text, args.repeat)
+        print(f"{n:>10} {n / before / 1e6:>20.2f} {n / after / 1e6:>19.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Deterministic synthetic runs for the benchmarks, in every input format:
+
+- write_raw: the CBinaryIn record layout (.bin) read by FileParserRAW
+- write_xml: the <caendigitizer> schema read by FileParserXML
+- write_wavedump2: the WaveDump2 normal, multi-board and
+  one-file-each-channel layouts
+
+Every run is one digitizer with one settings record, events x channels x
+samples negative pulses (random amplitude and arrival, 5/50 sample
+rise/fall constants, gaussian noise) on a 14-bit baseline. Events arrive
+at ~1 kHz; trigger tags count 8 ns ticks and wrap at 32 bits, clock times
+are whole seconds. The same seed always gives the same bytes.
+
+    python benchmarks/synthetic.py raw out.bin --events 1000 --channels 4 --samples 1024
+"""
+import argparse
+import struct
+from pathlib import Path
+
+import numpy as np
+
+BOARD_CHANNELS = 8
+DIGITIZER_ID = 7
+SETTINGS_ID = 2
+FREQUENCY = 250_000_000
+POST_TRIGGER = 75         # % of the window after the trigger
+START_TIME = 1_558_428_702
+TICK_NS = 8
+RATE_HZ = 1000.0
+EVENTS_PER_CHUNK = 1024   # Events generated and written at a time
+
+TP_DIGITIZER_DESCRIPTION, TP_DIGITIZER_SETTINGS, TP_TRACE_DATA = 1, 2, 3
+RAW_WAVEFORM_HEADER = np.dtype([
+    ("s_size", "<u4"), ("s_type", "<u4"),
+    ("s_eventId", "<u4"), ("s_did", "<u4"), ("s_sid", "<u4"), ("s_triggerTag", "<u4"),
+    ("s_todStamp", "<u8"), ("s_shift", "<i4"), ("s_channel", "<u4"), ("s_nSamples", "<u4"),
+])
+
+
+def board_channels(channels: int) -> int:
+    # The Parser requires fewer recorded channels than the board has
+    return max(BOARD_CHANNELS, channels + 1)
+
+
+def pulses(rng: np.random.Generator, n_traces: int, n_samples: int) -> np.ndarray:
+    """n_traces x n_samples uint16 negative pulses after the trigger, on a 14-bit baseline."""
+    trigger = n_samples * (100 - POST_TRIGGER) // 100
+    t = np.arange(n_samples, dtype=np.float32)
+    x = t[None, :] - rng.uniform(trigger + 5, trigger + 40, n_traces).astype(np.float32)[:, None]
+    shape = np.where(x > 0, (1 - np.exp(-x / 5.0)) * np.exp(-x / 50.0), 0.0).astype(np.float32)
+    shape /= np.maximum(shape.max(axis=1, keepdims=True), 1e-6)
+    amplitude = rng.uniform(100, 2000, n_traces).astype(np.float32)[:, None]
+    noise = rng.normal(0, 2, shape.shape).astype(np.float32)
+    return np.clip(8000 - amplitude * shape + noise, 0, 16383).astype(np.uint16)
+
+
+def event_times(rng: np.random.Generator, n_events: int) -> tuple[np.ndarray, np.ndarray]:
+    """(32-bit trigger tags, epoch-second clock times) of n_events Poisson arrivals."""
+    seconds = 0.37 + np.cumsum(rng.exponential(1.0 / RATE_HZ, n_events))
+    ticks = np.rint(seconds * 1e9 / TICK_NS).astype(np.int64)
+    return (ticks % (1 << 32)).astype(np.uint32), START_TIME + np.floor(seconds).astype(np.uint64)
+
+
+def _chunks(n_events: int, channels: int, samples: int, seed: int):
+    # (first event index, tags, clocks, events x channels x samples) per chunk, the same for every format
+    rng = np.random.default_rng(seed)
+    tags, clocks = event_times(rng, n_events)
+    for start in range(0, n_events, EVENTS_PER_CHUNK):
+        n = min(EVENTS_PER_CHUNK, n_events - start)
+        waves = pulses(rng, n * channels, samples).reshape(n, channels, samples)
+        yield start, tags[start:start + n], clocks[start:start + n], waves
+
+
+def write_raw(path, events: int = 1000, channels: int = 4, samples: int = 1024, seed: int = 0) -> int:
+    """Writes a RAW (.bin) run and returns its size in bytes."""
+    n_board = board_channels(channels)
+    with open(path, "wb") as f:
+        body = struct.pack("<II20s20sIIIIQIIii", DIGITIZER_ID, 725, b"4.22", b"0.12", 912, 1, n_board, 14,
+                           FREQUENCY, 655360, 0, 0, 2)
+        f.write(struct.pack("<II", 8 + len(body), TP_DIGITIZER_DESCRIPTION) + body)
+
+        mask = (1 << channels) - 1
+        body = struct.pack("<8I", SETTINGS_ID, DIGITIZER_ID, 1, 3, samples, POST_TRIGGER, mask, n_board)
+        body += struct.pack(f"<{n_board}I", *([32768] * n_board)) + struct.pack(f"<{n_board}I", *([2417] * n_board))
+        f.write(struct.pack("<II", 8 + len(body), TP_DIGITIZER_SETTINGS) + body)
+
+        dtype = np.dtype([("header", RAW_WAVEFORM_HEADER), ("trace", "<u2", (samples,))])
+        for start, tags, clocks, waves in _chunks(events, channels, samples, seed):
+            n = len(tags)
+            records = np.zeros((n, channels), dtype=dtype)
+            header = records["header"]
+            header["s_size"] = dtype.itemsize
+            header["s_type"] = TP_TRACE_DATA
+            header["s_eventId"] = np.arange(start + 1, start + n + 1)[:, None]
+            header["s_did"] = DIGITIZER_ID
+            header["s_sid"] = SETTINGS_ID
+            header["s_triggerTag"] = tags[:, None]
+            header["s_todStamp"] = clocks[:, None]
+            header["s_channel"] = np.arange(channels)[None, :]
+            header["s_nSamples"] = samples
+            records["trace"] = waves
+            f.write(records.tobytes())
+    return Path(path).stat().st_size
+
+
+def write_xml(path, events: int = 1000, channels: int = 4, samples: int = 1024, seed: int = 0) -> int:
+    """Writes an XML run in the CAEN export layout (14 samples per line) and returns its size in bytes."""
+    n_board = board_channels(channels)
+    digitizer = "0A708183A6AB2BF6A3D944461802EAA8"
+    with open(path, "w") as f:
+        f.write("<caendigitizer>\n")
+        f.write(f'<digitizer id="{digitizer}" family="xx725" version="240"\nserial="912">\n'
+                f'<channels value="{n_board}"></channels>\n<resolution bits="14"></resolution>\n'
+                f'<frequency hz="{FREQUENCY:.1f}"></frequency>\n<maxsamples maxsamples="655360"></maxsamples>\n'
+                '<channelgroups capable="0"></channelgroups>\n<zerosuppression capable=""></zerosuppression>\n'
+                '<inspection capable=""></inspection>\n<dualedge capable=""></dualedge>\n'
+                '<voltagerange low="0.0" hi="2.0"></voltagerange>\n'
+                f'<windows>\n<window size="{samples}"></window>\n</windows>\n</digitizer>\n')
+        f.write(f'<settings id="{SETTINGS_ID}" digitizer="{digitizer}">\n<dcoffsets>\n')
+        f.write("".join(f'<dcoffset channel="{c}" value="32768"></dcoffset>\n' for c in range(n_board)))
+        f.write('</dcoffsets>\n<trigger direction="falling" mask="1" external="disabled">\n')
+        f.write("".join(f'<level channel="{c}" value="2417"></level>\n' for c in range(n_board)))
+        f.write(f'</trigger>\n<window size="{samples}"></window>\n<posttrigger value="{POST_TRIGGER}.0%"></posttrigger>\n'
+                f'<channels mask="{(1 << channels) - 1}"></channels>\n</settings>\n\n')
+
+        # One format string per trace length: 14 samples per line
+        lines = [" ".join(["{}"] * min(14, samples - i)) for i in range(0, samples, 14)]
+        trace_format = "\n".join(lines) + "\n"
+        for start, tags, clocks, waves in _chunks(events, channels, samples, seed):
+            out = []
+            for i in range(len(tags)):
+                out.append(f'<event id="{start + i + 1}" settings="{SETTINGS_ID}" digitizer="{digitizer}"\n'
+                           f'timestamp="{tags[i]}" clocktime="{clocks[i]}">\n<triggershift samples="0"></triggershift>\n')
+                for c in range(channels):
+                    out.append(f'<trace channel="{c}">' + trace_format.format(*waves[i, c].tolist()) + "</trace>\n")
+                out.append("</event>\n")
+            f.write("".join(out))
+        f.write("</caendigitizer>\n")
+    return Path(path).stat().st_size
+
+
+def write_wavedump2(path, events: int = 1000, channels: int = 4, samples: int = 1024, seed: int = 0,
+                    layout: str = "normal", data_type: str = "uint") -> list[Path]:
+    """
+    Writes a WaveDump2 run in layout "normal", "multi" (multi-board) or
+    "one" (one file for each channel, named <stem>_ch<c><suffix>) with
+    'uint' ADC counts or 'float' samples. Returns the files written.
+    """
+    if layout not in ("normal", "multi", "one"):
+        raise ValueError(f"Unknown WaveDump2 layout: {layout}")
+    sample_type = "<u2" if data_type == "uint" else "<f4"
+    path = Path(path)
+    single = layout == "one"
+    header = [("event_num", "<u4"), ("timestamp", "<u8"), ("samples", "<u4"), ("sampling_period_ns", "<u8")]
+    if not single:
+        header.append(("channels", "<i4"))
+    record_channels = 1 if single else channels
+    dtype = np.dtype(header + [("padding", "V2"), ("waveform", sample_type, (record_channels, samples))])
+
+    paths = [path.with_name(f"{path.stem}_ch{c}{path.suffix}") for c in range(channels)] if single else [path]
+    files = [open(p, "wb") for p in paths]
+    try:
+        for start, tags, clocks, waves in _chunks(events, channels, samples, seed):
+            n = len(tags)
+            records = np.zeros(n, dtype=dtype)
+            records["event_num"] = np.arange(start, start + n)
+            records["timestamp"] = tags.astype(np.uint64) * TICK_NS
+            records["samples"] = samples
+            records["sampling_period_ns"] = 1e9 // FREQUENCY
+            if single:
+                for c, f in enumerate(files):
+                    records["waveform"][:, 0, :] = waves[:, c, :]
+                    f.write(records.tobytes())
+            else:
+                records["channels"] = channels
+                records["waveform"] = waves
+                files[0].write(records.tobytes())
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("format", choices=["raw", "xml", "wavedump2", "wavedump2-multi", "wavedump2-one"])
+    parser.add_argument("path")
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--samples", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = dict(events=args.events, channels=args.channels, samples=args.samples, seed=args.seed)
+    if args.format == "raw":
+        write_raw(args.path, **sizes)
+    elif args.format == "xml":
+        write_xml(args.path, **sizes)
+    else:
+        layout = {"wavedump2": "normal", "wavedump2-multi": "multi", "wavedump2-one": "one"}[args.format]
+        write_wavedump2(args.path, layout=layout, **sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ import pybind11
 ext_modules = [
     Pybind11Extension(
         "caen_cpp",
-        ["src/cpp/pybind11_module.cpp", "src/cpp/CBinaryIn.cpp"],
+        ["src/cpp/pybind11_module.cpp", "src/cpp/CBinaryIn.cpp", "src/cpp/CBinaryMap.cpp", "src/cpp/CBinaryOut.cpp"],
         language = "c++",
         include_dirs = ["./src/cpp/", pybind11.get_include()],
         cxx_std = 11,
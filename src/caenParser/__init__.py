@@ -1,5 +1,7 @@
 from .domain import DomainController as Parser
 from .utils import select_file
+from .persistence import Selection
 from .wavedump2.WaveDump2BinParser import WaveDump2BinParser
+from .wavedump2.WaveDump2MultiFileParser import WaveDump2MultiFileParser
 
-__all__ = ["Parser", "select_file", "WaveDump2BinParser"]
\ No newline at end of file
+__all__ = ["Parser", "select_file", "WaveDump2BinParser", "WaveDump2MultiFileParser", "Selection"]
\ No newline at end of file
@@ -2,23 +2,48 @@ from .Digitizer import Digitizer
 from .Settings import Settings
 from .Trigger import Trigger, TriggerMode, ExternalTrigger
 from .Event import Event, MeasureMagnitudeEnum
-from typing import Optional, cast
+from .EventStore import EventStore, EventTraceMap
+from typing import Iterator, Optional, cast
 from caenParser.persistence.PersistenceController import PersistenceController
-from caenParser.persistence.dtos import DigitizerDTO, SettingsDTO, EventDTO, TriggerDTO
-import pandas as pd
+from caenParser.persistence.Selection import Selection
+from caenParser.persistence.dtos import DigitizerDTO, SettingsDTO, EventDTO, TriggerDTO, RunDTO
+from caenParser.utils import TraceCache, get_backend, to_t_graph, profiler
+from itertools import repeat
+from typing import Sequence, Union
+import numpy as np
+import os
 import sys
-import ROOT
 
+pd = get_backend("pandas")
 
 
 
+
+def _load_run(file_path: str, mapped: bool, cache: bool) -> Optional[RunDTO]:
+    # Runs in the worker processes of DomainController.load_files. With cache
+    # the run stays on disk and None is returned, unless it could not be saved
+    from caenParser.persistence.RunCache import RunCache  # Kept out of the package import time
+    if cache:
+        run = PersistenceController().load_run(file_path, mapped=mapped, cache=True)
+        return None if RunCache.load(file_path) is not None else run
+    return PersistenceController().load_run(file_path, mapped=mapped)
+
+
 class DomainController:
-    def __init__(self):
+
+    DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+    TRIGGER_TAG_NS = 8.0  # Period of the trigger time tag counter
+
+    def __init__(self, cache_bytes: int = DEFAULT_CACHE_BYTES):
         self._digitizer: dict[str, Digitizer] = dict()
         self._settings: dict[int, Settings] = dict()
-        self._events: dict[int, Event] = dict()
+        self._events = EventStore()
         self._persistence_controller = PersistenceController()
+        self._sources: list["LazyTraceSource"] = []  # Files kept open by lazy loads
+        self._trace_cache = TraceCache(cache_bytes)
         self.measure_magnitude = MeasureMagnitudeEnum.ADC_COUNTS  # Default measure magnitude
+        self.trigger_tag_ns = self.TRIGGER_TAG_NS
+        self._time_index: Optional[tuple[tuple, "TimeIndex"]] = None  # (store rows, tick) it was built for
 
 
     def get_digitizer(self, id: str) -> Optional[Digitizer]:
@@ -28,11 +53,45 @@ class DomainController:
         return self._settings.get(id, None)
 
     def get_event(self, id: int) -> Optional[Event]:
-        return self._events.get(id, None)
+        row = self._events.row(id)
+        if row is None:
+            return None
+        return self._event_view(row)
 
-    def loadFile(self, file_path: str) -> None:
-        # Example implementation, adjust as needed
-        [digitizers_raw, settings_raw, events_raw] = self._persistence_controller.load(file_path)
+    def iter_events(self) -> Iterator[Event]:
+        """Yields a view of every loaded event, in load order."""
+        for id in self._events.ids:
+            yield self._event_view(self._events.row(id))
+
+    @profiler.timed("DomainController.loadFile")
+    def loadFile(self, file_path: str, mapped: bool = False, use_index: bool = False, lazy: bool = False,
+                 workers: Optional[int] = None, cache: bool = False, selection: Optional[Selection] = None) -> None:
+        """
+        Loads every digitizer, settings and event of a file. With lazy=True
+        (.bin files only) just the event metadata is loaded; traces are read
+        from the file when first requested and kept in the LRU trace cache.
+        With workers set, a .bin file is memory-mapped and its traces are
+        copied into the store by that many threads in parallel.
+        With cache=True the run is reopened from its converted copy (see
+        RunCache) when that is up to date, traces staying memory-mapped, and
+        converted and cached otherwise.
+        With a selection only the channels, events, settings ids and time
+        range it accepts are loaded; .bin readers skip the other records
+        without reading their traces (see Selection).
+        """
+        if lazy:
+            self._load_file_lazy(file_path, use_index, selection)
+            return
+
+        if cache or (workers is not None and file_path.endswith('.bin')):
+            self._add_run(self._persistence_controller.load_run(
+                file_path, mapped=file_path.endswith('.bin'), workers=workers or 1, cache=cache, selection=selection
+            ))
+            return
+
+        [digitizers_raw, settings_raw, events_raw] = self._persistence_controller.load(
+            file_path, mapped=mapped, use_index=use_index, selection=selection
+        )
 
         for digitizer_dto in digitizers_raw:
             d = self.digitizer_translator(digitizer_dto)
@@ -42,9 +101,119 @@ class DomainController:
             s = self.settings_translator(setting_dto)
             self._settings[s.id] = s
 
-        for event_dto in events_raw:
-            e = self.event_translator(event_dto)
-            self._events[e.id] = e
+        with profiler.stage("DomainController.event_translator"):
+            for event_dto in events_raw:
+                self.event_translator(event_dto)
+        if profiler.enabled:
+            profiler.count("DomainController.event_translator", events=len(events_raw),
+                           traces=sum(len(e.trace) for e in events_raw))
+
+
+    def load_files(self, file_paths: Sequence[str], workers: Optional[int] = None, mapped: bool = False,
+                   cache: bool = False) -> dict[str, dict]:
+        """
+        Loads several files, parsing them in a pool of worker processes
+        (workers defaults to the number of CPUs, workers=1 parses in this
+        process). Every file comes back as a column-wise RunDTO of NumPy
+        arrays and is merged into the controller in the order given.
+
+        Ids that collide with ones already loaded are remapped: a file whose
+        event ids clash is moved past the largest event id loaded, and a
+        settings id already taken gets the next free id unless the settings
+        are identical to those of an earlier file of the same call. Returns,
+        per file, {"event_offset": int, "settings": {file id: loaded id}}.
+
+        With cache=True the workers only convert files whose RunCache is
+        missing or stale; every run is then reopened here from its cache.
+        """
+        file_paths = list(file_paths)
+        workers = min(workers or os.cpu_count() or 1, len(file_paths))
+        merged_settings: dict[int, dict] = {}  # Loaded id -> settings of this call, for reuse
+        remaps = {}
+
+        if workers <= 1:
+            runs = map(_load_run, file_paths, repeat(mapped), repeat(cache))
+            for path, run in zip(file_paths, runs):
+                remaps[path] = self._merge_run(self._cached_run(path, run), merged_settings)
+            return remaps
+
+        from concurrent.futures import ProcessPoolExecutor  # Kept out of the package import time
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Results are merged in order as they arrive, while later files are still parsing
+            for path, run in zip(file_paths, pool.map(_load_run, file_paths, repeat(mapped), repeat(cache))):
+                remaps[path] = self._merge_run(self._cached_run(path, run), merged_settings)
+        return remaps
+
+
+    def _cached_run(self, path: str, run: Optional[RunDTO]) -> RunDTO:
+        # _load_run returns None for runs it left in their cache; an empty run is a run
+        return run if run is not None else self._persistence_controller.load_run(path, cache=True)
+
+    def _merge_run(self, run: RunDTO, merged_settings: dict[int, dict]) -> dict:
+        # Remaps the ids of run that collide with loaded ones, then adds it
+        settings_map: dict[int, int] = {}
+        kept_settings = []
+        for setting_dto in run.settings:
+            content = {k: v for k, v in setting_dto.to_dict().items() if k != "id"}
+            same = [i for i, c in merged_settings.items() if c == content]
+            if same:
+                settings_map[setting_dto.id] = same[0]
+                continue
+            new_id = setting_dto.id
+            if new_id in self._settings or new_id in settings_map.values():
+                new_id = max([*self._settings, *settings_map.values()]) + 1
+            settings_map[setting_dto.id] = new_id
+            setting_dto.id = new_id
+            kept_settings.append(setting_dto)
+            merged_settings[new_id] = content
+        run.settings = kept_settings
+
+        event_offset = 0
+        loaded = self._events.column("id")
+        if len(run) and len(loaded) and np.isin(run.event_ids, loaded).any():
+            event_offset = int(loaded.max()) + 1 - int(run.event_ids.min())
+        run.event_ids = run.event_ids + event_offset
+
+        if len(run):
+            run.settings_ids = np.vectorize(lambda i: settings_map.get(i, i), otypes=[np.int64])(run.settings_ids)
+        run.traces = {(settings_map.get(sid, sid), channel, samples): block for (sid, channel, samples), block in run.traces.items()}
+
+        self._add_run(run)
+        return {"event_offset": event_offset, "settings": settings_map}
+
+
+    @profiler.timed("DomainController.add_run")
+    def _add_run(self, run: RunDTO) -> None:
+        for digitizer_dto in run.digitizers:
+            d = self.digitizer_translator(digitizer_dto)
+            self._digitizer[d.id] = d
+
+        for setting_dto in run.settings:
+            s = self.settings_translator(setting_dto)
+            self._settings[s.id] = s
+
+        self._events.extend(
+            run.event_ids, run.settings_ids, run.digitizer_ids, run.digitizer_codes,
+            run.time_stamps, run.clock_times, run.trigger_shifts, run.traces
+        )
+
+
+    def _load_file_lazy(self, file_path: str, use_index: bool, selection: Optional[Selection] = None) -> None:
+        from .LazyTraceSource import LazyTraceSource  # Kept out of the package import time
+        parser = self._persistence_controller.open(file_path, use_index=use_index, selection=selection)
+        source = LazyTraceSource(file_path, parser, self._trace_cache)
+        self._sources.append(source)
+
+        for digitizer_dto in parser.digitizers:
+            d = self.digitizer_translator(digitizer_dto)
+            self._digitizer[d.id] = d
+
+        for setting_dto in parser.settings:
+            s = self.settings_translator(setting_dto)
+            self._settings[s.id] = s
+
+        for event_dto, channels in parser.iter_event_headers():
+            self.lazy_event_translator(event_dto, channels, source)
 
 
     def digitizer_translator(self,digitizer: DigitizerDTO) -> Digitizer:
@@ -68,20 +237,34 @@ class DomainController:
         return Digitizer(params)
     
 
-    def event_translator(self,event: EventDTO) -> Event:
+    def event_translator(self,event: EventDTO) -> int:
+        # Events are stored column-wise; returns the row the event went to
+        assert len(event.trace) < self._digitizer.get(event.digitizer_id).num_channels
+        return self._events.append(
+            event.id, event.settings_id, event.digitizer_id, event.time_stamp,
+            event.clock_time, event.trigger_shift, traces=event.trace
+        )
+    
 
+    def lazy_event_translator(self, event: EventDTO, channels: list[int], source: "LazyTraceSource") -> int:
+        return self._events.append(
+            event.id, event.settings_id, event.digitizer_id, event.time_stamp,
+            event.clock_time, event.trigger_shift, channels=channels, source=source
+        )
+
+
+    def _event_view(self, row: int) -> Event:
+        # Events are built on request as views over one row of the store
         params = {
-            "id": event.id,
-            "settings": self._settings.get(event.settings_id),
-            "digitizer": self._digitizer.get(event.digitizer_id),
-            "time_stamp": event.time_stamp,
-            "clock_time": event.clock_time,
-            "trigger_shift": event.trigger_shift,
-            "trace": {k: pd.DataFrame(t, columns=['Amplitude']) for k, t in event.trace.items()}
+            "id": self._events.value(row, "id"),
+            "settings": self._settings.get(self._events.value(row, "settings_id")),
+            "digitizer": self._digitizer.get(self._events.digitizer_id(row)),
+            "time_stamp": self._events.value(row, "time_stamp"),
+            "clock_time": self._events.clock_time(row),
+            "trigger_shift": self._events.value(row, "trigger_shift"),
+            "trace": EventTraceMap(self._events, row)
         }
-        assert len(event.trace) < self._digitizer.get(event.digitizer_id).num_channels
         return Event(params)
-    
 
 
     def settings_translator(self, settings: SettingsDTO) -> Settings:
@@ -121,20 +304,194 @@ class DomainController:
         }
         return Trigger(params)
     
-    def get_data_frame(self, event_id: int, channel:int) -> Optional[pd.DataFrame]:
-        event = self._events.get(event_id)
+    def get_data_frame(self, event_id: int, channel:int) -> Optional["pd.DataFrame"]:
+        event = self.get_event(event_id)
         if event:
             return event.get_channel_data(channel, self.measure_magnitude)
         return None
     
-    def get_t_graph(self, event_id: int, channel:int) -> Optional[ROOT.TGraph]:
+    def get_channel_matrix(self, event_ids: Sequence[int], channel: int,
+                           magnitude: Union[str, MeasureMagnitudeEnum, None] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batch counterpart of get_data_frame: returns (matrix, time) where row k
+        of matrix is the waveform of event_ids[k] on channel and time is the
+        axis shared by all rows, in seconds.
+
+        All events must share one settings id. ADC -> voltage conversion is
+        done in one vectorised pass over the whole block. Events with a
+        trigger shift are moved by whole samples so that their trigger lands
+        where the settings' post-trigger puts it; samples shifted in from
+        outside the window are NaN. Without shifted events the ADC counts
+        matrix keeps its uint16 dtype, otherwise the result is float64.
+        """
+        if magnitude is None:
+            magnitude = self.measure_magnitude
+        elif isinstance(magnitude, str):
+            try:
+                magnitude = MeasureMagnitudeEnum[magnitude.upper()]
+            except KeyError:
+                raise ValueError(f"Invalid measure magnitude name: {magnitude}. Valid options are: {[e.name for e in MeasureMagnitudeEnum]}")
+
+        try:
+            rows = self._events.rows(event_ids)
+        except KeyError as e:
+            raise ValueError(f"Event with ID {e.args[0]} not found.")
+
+        settings_ids = np.unique(self._events.column("settings_id")[rows])
+        if len(settings_ids) != 1:
+            raise ValueError(f"Events must share one settings id, got {settings_ids.tolist()}")
+        settings = self._settings[int(settings_ids[0])]
+        digitizer = settings._digitizer
+
+        matrix = self._events.matrix(rows, channel)
+        n_samples = matrix.shape[1]
+
+        # Same convention as Event.get_channel_data: the trigger sits at the
+        # event's shift when it has one, at the post-trigger point otherwise
+        trigger = n_samples * ((100 - settings._post_trigger) / 100)
+        time = (np.arange(n_samples) - trigger) / digitizer.frequency
+
+        if magnitude == MeasureMagnitudeEnum.VOLTAGE:
+            low, high = digitizer.voltage_range
+            matrix = low + matrix * ((high - low) / (2 ** digitizer.bits - 1))
+
+        shifts = self._events.column("trigger_shift")[rows]
+        offsets = np.where(shifts != 0, np.rint(trigger - shifts), 0).astype(np.int64)
+        if offsets.any():
+            cols = np.arange(n_samples)[None, :] - offsets[:, None]
+            inside = (cols >= 0) & (cols < n_samples)
+            aligned = np.take_along_axis(matrix, np.clip(cols, 0, n_samples - 1), axis=1)
+            matrix = np.where(inside, aligned, np.nan)
+
+        return matrix, time
+
+    def get_features(self, event_ids: Sequence[int], channel: int, magnitude: Union[str, MeasureMagnitudeEnum, None] = None,
+                     **kwargs) -> "pd.DataFrame":
+        """
+        Pulse features (see PulseFeatures.extract_features) of one channel of
+        several events, computed over their get_channel_matrix at once and
+        returned as a DataFrame indexed by event id. The baseline is taken
+        before the post-trigger point of the settings and pulses are
+        measured downwards when the settings trigger on the falling edge.
+        Events of several settings ids are computed one settings id at a
+        time, each with its own trigger point, polarity and frequency, and
+        come back in the order of event_ids.
+        kwargs (rise_levels, cfd_fraction, window) go to extract_features.
+        """
+        from .PulseFeatures import extract_features  # Kept out of the package import time
+        event_ids = list(event_ids)
+        try:
+            rows = self._events.rows(event_ids)
+        except KeyError as e:
+            raise ValueError(f"Event with ID {e.args[0]} not found.")
+        settings_ids = self._events.column("settings_id")[rows]
+
+        columns: dict[str, np.ndarray] = {}
+        for settings_id in np.unique(settings_ids):
+            where = np.flatnonzero(settings_ids == settings_id)
+            matrix, _ = self.get_channel_matrix([event_ids[i] for i in where], channel, magnitude)
+            settings = self._settings[int(settings_id)]
+            trigger = matrix.shape[1] * ((100 - settings._post_trigger) / 100)
+            falling = settings._trigger is not None and settings._trigger._direction == TriggerMode.FALLING_EDGE
+
+            features = extract_features(
+                matrix, trigger, polarity=-1 if falling else 1, frequency=settings._digitizer.frequency, **kwargs
+            )
+            for name, values in features.items():
+                columns.setdefault(name, np.empty(len(event_ids), dtype=values.dtype))[where] = values
+        return pd.DataFrame(columns, index=pd.Index(event_ids, name="event_id"))
+
+    def export(self, path: str, run: Optional[str] = None, **kwargs) -> int:
+        """
+        Writes every loaded event to a Parquet or Arrow dataset, one row per
+        (event, channel) with the ADC counts trace; kwargs (format,
+        partition_by, rows_per_group, bytes_per_group, trace_type,
+        compression) are those of ArrowEventWriter. Traces are gathered per
+        settings id and channel, at most rows_per_group rows and
+        bytes_per_group bytes of samples at a time, so lazily loaded runs are
+        streamed from their files with bounded memory. Returns the number of
+        rows written. Needs pyarrow.
+        """
+        from caenParser.persistence.ArrowExport import ArrowEventWriter  # Kept out of the package import time
+        rows_per_group = kwargs.get("rows_per_group", 65536)
+        bytes_per_group = kwargs.get("bytes_per_group", 64 << 20)
+        live = np.sort(self._events.rows(self._events.ids))
+        settings_ids = self._events.column("settings_id")[live]
+        masks = self._events.column("channel_mask")[live]
+        digitizer_ids = np.array(self._events.digitizer_ids, dtype=object)
+
+        with ArrowEventWriter(path, run=run, **kwargs) as writer:
+            for settings_id in np.unique(settings_ids):
+                for channel in range(int(np.bitwise_or.reduce(masks)).bit_length()):
+                    selected = live[(settings_ids == settings_id) & ((masks >> np.uint64(channel)) & np.uint64(1) == 1)]
+                    if len(selected) == 0:
+                        continue
+                    # Traces of one settings id and channel share their length
+                    row_bytes = self._events.trace(int(selected[0]), channel).nbytes
+                    batch = max(1, min(rows_per_group, bytes_per_group // max(row_bytes, 1)))
+                    for start in range(0, len(selected), batch):
+                        rows = selected[start:start + batch]
+                        writer.write({
+                            "event_id": self._events.column("id")[rows],
+                            "settings_id": self._events.column("settings_id")[rows],
+                            "digitizer_id": digitizer_ids[self._events.column("digitizer")[rows]].astype(str),
+                            "time_stamp": self._events.column("time_stamp")[rows],
+                            "clock_time": self._events.column("clock_time")[rows],
+                            "trigger_shift": self._events.column("trigger_shift")[rows],
+                            "channel": np.full(len(rows), channel, dtype=np.int32),
+                        }, self._events.matrix(rows, channel))
+        return writer.rows_written
+
+    def time_index(self) -> "TimeIndex":
+        """
+        TimeIndex of the loaded events, built on first use and rebuilt once
+        events are added or trigger_tag_ns changes. Event times come from
+        event_times: trigger tags unwrapped per digitizer in load order and
+        anchored to the clock times, as nanoseconds since the epoch.
+        """
+        from .TimeIndex import TimeIndex, event_times  # Kept out of the package import time
+        key = (len(self._events.column("id")), self.trigger_tag_ns)
+        if self._time_index is None or self._time_index[0] != key:
+            rows = np.sort(self._events.rows(self._events.ids))
+            times = event_times(
+                self._events.column("time_stamp")[rows], self._events.column("clock_time")[rows],
+                self._events.column("digitizer")[rows], tick_ns=self.trigger_tag_ns
+            )
+            self._time_index = (key, TimeIndex(times, rows))
+        return self._time_index[1]
+
+    def get_event_times(self, event_ids: Sequence[int]) -> np.ndarray:
+        """Unwrapped times of the events, int64 nanoseconds since the epoch (see time_index)."""
+        try:
+            rows = self._events.rows(event_ids)
+        except KeyError as e:
+            raise ValueError(f"Event with ID {e.args[0]} not found.")
+        return self.time_index().time_of(rows)
+
+    def events_between(self, t0: "Time", t1: "Time") -> list[int]:
+        """Ids of the events with t0 <= time < t1 (epoch seconds or datetimes), in time order."""
+        rows = self.time_index().between(t0, t1)
+        return self._events.column("id")[rows].tolist()
+
+    def get_rate(self, bin_width: float = 1.0, t0: Optional["Time"] = None, t1: Optional["Time"] = None) -> "pd.DataFrame":
+        """
+        Trigger rate over time: events per bin of bin_width seconds from t0
+        to t1 (all events by default), counted on the time index with one
+        binary search per bin edge. One row per bin with its start "time"
+        (epoch seconds), "count" and "rate" in Hz.
+        """
+        times, counts = self.time_index().histogram(bin_width, t0, t1)
+        return pd.DataFrame({"time": times, "count": counts, "rate": counts / bin_width})
+
+    def get_t_graph(self, event_id: int, channel:int) -> Optional["ROOT.TGraph"]:
+        # ROOT is only imported here, on first use
         df = self.get_data_frame(event_id, channel)
         if df is not None:
-            return ROOT.TGraph(len(df), df["Time"].to_numpy(dtype='float64'), df['Amplitude'].to_numpy(dtype='float64'))
+            return to_t_graph(df["Time"].to_numpy(), df['Amplitude'].to_numpy())
 
     @property
     def events_ids(self) -> list[int]:
-        return list(self._events.keys())
+        return self._events.ids
     
     @property 
     def digitizers_ids(self) -> list[str]:
@@ -145,13 +502,21 @@ class DomainController:
         return list(self._settings.keys())
 
     def get_triggered_channels(self, event_id: int) -> list[int]:
-        event = self._events.get(event_id)
-        if event:
-            return event.triggered_channels()
+        row = self._events.row(event_id)
+        if row is not None:
+            return self._events.channels(row)
         print(f"WARNING: Event with ID {event_id} not found.", file=sys.stderr)
         return []
 
 
+    def set_cache_size(self, max_bytes: int) -> None:
+        """Sets the byte budget of the trace cache used by lazy loads."""
+        self._trace_cache.resize(max_bytes)
+
+    @property
+    def cache_stats(self) -> dict:
+        return self._trace_cache.stats
+
     def set_measure_magnitude(self, name: str) -> None:
         try:
             self.measure_magnitude = MeasureMagnitudeEnum[name.upper()]
@@ -167,10 +532,15 @@ class DomainController:
             print(setting)
     
     def printEvents(self):
-        for event in self._events.values():
+        for event in self.iter_events():
             print(event)
 
     def clear(self):
         self._events.clear()
+        self._time_index = None
         self._digitizer.clear()
         self._settings.clear()
+        self._trace_cache.clear()
+        for source in self._sources:
+            source.close()
+        self._sources.clear()
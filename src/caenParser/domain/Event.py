@@ -1,10 +1,12 @@
-import pandas as pd
 from .Settings import Settings
 from .Digitizer import Digitizer
 from datetime import datetime
 from enum import Enum, auto
+from caenParser.utils import get_backend
 import sys
 
+pd = get_backend("pandas")
+
 class MeasureMagnitudeEnum(Enum):
         ADC_COUNTS = auto()
         VOLTAGE = auto()
@@ -34,7 +36,7 @@ class Event:
         self._measure_magnitude = magnitude
 
 
-    def get_channel_data(self, channel: int, magnitude = None) -> pd.DataFrame:
+    def get_channel_data(self, channel: int, magnitude = None) -> "pd.DataFrame":
         """
         Returns the trace data for a specific channel as a pandas DataFrame.
         """
@@ -99,7 +101,7 @@ class Event:
     
     @property
     def trace(self):
-        return self._trace.copy() if self._trace is not None else None
+        return dict(self._trace) if self._trace is not None else None
     
     def copy(self):
         new_event = Event({
@@ -0,0 +1,389 @@
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Optional, Protocol
+from caenParser.utils import get_backend
+import numpy as np
+
+pd = get_backend("pandas")
+
+
+class TraceSource(Protocol):
+    """Anything able to hand out the samples of (event, channel) on demand."""
+
+    def trace(self, event_id: int, channel: int) -> np.ndarray: ...
+
+
+def _reserve(buffer: np.ndarray, size: int, extra: int) -> np.ndarray:
+    # buffer with room for extra more lines after its first size ones,
+    # reallocated with geometric growth so appends cost amortized O(1)
+    if size + extra <= len(buffer):
+        return buffer
+    out = np.empty((max(size + extra, len(buffer) + len(buffer) // 2),) + buffer.shape[1:], dtype=buffer.dtype)
+    out[:size] = buffer[:size]
+    return out
+
+
+class TraceBlock:
+    """
+    Traces of one (settings id, channel, samples) group, stacked as a single
+    events x samples uint16 array. rows holds, in increasing order, the
+    store row each line of data belongs to. Both live in buffers with spare
+    room at the end, which append() fills before reallocating.
+    """
+
+    __slots__ = ("_rows", "_data", "_size")
+
+    def __init__(self, rows: np.ndarray, data: np.ndarray):
+        self._rows = rows
+        self._data = data
+        self._size = len(rows)
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows[:self._size]
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def append(self, rows: np.ndarray, data: np.ndarray) -> None:
+        """Adds lines for rows, which must all be greater than the current ones."""
+        self._rows = _reserve(self._rows, self._size, len(rows))
+        self._data = _reserve(self._data, self._size, len(rows))
+        self._rows[self._size:self._size + len(rows)] = rows
+        self._data[self._size:self._size + len(rows)] = data
+        self._size += len(rows)
+
+    def drop(self, rows: np.ndarray) -> None:
+        """
+        Removes the lines of rows into new buffers, so the views already
+        handed out keep their samples.
+        """
+        keep = ~np.isin(self.rows, rows)
+        if not keep.all():
+            self._rows = self.rows[keep]
+            self._data = self.data[keep]
+            self._size = len(self._rows)
+
+    def find(self, row: int) -> int:
+        """Returns the line of data holding the trace of row, or -1."""
+        i = int(np.searchsorted(self.rows, row))
+        return i if i < len(self.rows) and self.rows[i] == row else -1
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self._rows.nbytes
+
+    def __len__(self):
+        return self._size
+
+
+class EventStore:
+    """
+    Columnar storage of the events held by the DomainController.
+
+    Event metadata lives in parallel NumPy arrays, one entry per row, and
+    the traces of all events that share settings, channel and length are
+    stacked into one contiguous TraceBlock. Rows are appended one at a time
+    and consolidated into the arrays in bulk on the next read; the arrays
+    and blocks grow geometrically, so loading N events costs O(N) whatever
+    the batches. Rows loaded lazily keep no samples; their traces are
+    fetched from a TraceSource.
+
+    Reloading an event id adds a new row and makes the id point to it. The
+    traces of the rows replaced are freed once they add up to a quarter of
+    the events; their metadata stays, so row numbers never change.
+    """
+
+    COLUMNS = {
+        "id": np.int64,
+        "settings_id": np.int64,
+        "digitizer": np.int32,        # Index into digitizer_ids
+        "time_stamp": np.int64,
+        "clock_time": np.int64,       # Seconds since the epoch
+        "trigger_shift": np.int64,
+        "channel_mask": np.uint64,    # Bit c set when channel c was recorded
+        "source": np.int32,           # Index into the trace sources, -1 for in-memory traces
+    }
+
+    def __init__(self):
+        self._columns = {name: np.empty(0, dtype) for name, dtype in self.COLUMNS.items()}  # Buffers of _size rows
+        self._size = 0
+        self._pending: list[tuple] = []
+        self._pending_traces: dict[tuple[int, int, int], tuple[list[int], list[np.ndarray]]] = {}
+        self._blocks: dict[tuple[int, int, int], TraceBlock] = {}
+        self._row_of: dict[int, int] = {}
+        self._digitizer_ids: list[Optional[str]] = []
+        self._digitizer_code: dict[Optional[str], int] = {}
+        self._sources: list[TraceSource] = []
+        self._replaced: list[int] = []  # Rows whose id was reloaded since the last drop of their traces
+
+    def append(self, event_id: int, settings_id: int, digitizer_id: Optional[str], time_stamp: int,
+               clock_time: datetime, trigger_shift: int, traces: Optional[dict[int, np.ndarray]] = None,
+               channels: Optional[list[int]] = None, source: Optional[TraceSource] = None) -> int:
+        """
+        Adds one event and returns its row. Either traces (channel -> samples,
+        stored in the blocks) or channels plus the source that serves them
+        on demand must be given.
+        """
+        row = self._size + len(self._pending)
+
+        if traces is not None:
+            channels = list(traces.keys())
+            for channel, samples in traces.items():
+                samples = np.asarray(samples, dtype=np.uint16)
+                rows, data = self._pending_traces.setdefault((settings_id, channel, len(samples)), ([], []))
+                rows.append(row)
+                data.append(samples)
+            source_code = -1
+        else:
+            source_code = self._source_code(source)
+
+        mask = 0
+        for channel in channels:
+            mask |= 1 << channel
+
+        self._pending.append((
+            event_id, settings_id, self._digitizer_code_of(digitizer_id), time_stamp,
+            int(clock_time.timestamp()), trigger_shift, mask, source_code
+        ))
+        replaced = self._row_of.get(event_id)
+        if replaced is not None:
+            self._replaced.append(replaced)
+        self._row_of[event_id] = row
+        return row
+
+    def extend(self, event_ids: np.ndarray, settings_ids: np.ndarray, digitizer_ids: list[Optional[str]],
+               digitizer_codes: np.ndarray, time_stamps: np.ndarray, clock_times: np.ndarray,
+               trigger_shifts: np.ndarray, traces: dict[tuple[int, int, int], tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """
+        Bulk counterpart of append for events already in columns: digitizer_codes
+        index into digitizer_ids, clock_times are seconds since the epoch and
+        traces maps (settings id, channel, samples) to the indices of the
+        events having that trace and their stacked samples. Returns the rows.
+        """
+        self._flush()
+        start = self._size
+        n = len(event_ids)
+        rows = np.arange(start, start + n, dtype=np.int64)
+
+        masks = np.zeros(n, dtype=np.uint64)
+        for (_, channel, _), (index, _) in traces.items():
+            masks[index] |= np.uint64(1 << channel)
+
+        codes = np.array([self._digitizer_code_of(d) for d in digitizer_ids], dtype=np.int32)
+        new_columns = {
+            "id": event_ids,
+            "settings_id": settings_ids,
+            "digitizer": codes[digitizer_codes] if n else np.empty(0, np.int32),
+            "time_stamp": time_stamps,
+            "clock_time": clock_times,
+            "trigger_shift": trigger_shifts,
+            "channel_mask": masks,
+            "source": np.full(n, -1, dtype=np.int32),
+        }
+        self._append_columns(new_columns, n)
+
+        for key, (index, data) in traces.items():
+            self._append_traces(key, rows[index], np.asarray(data, dtype=np.uint16))
+
+        ids = event_ids.tolist()
+        if self._row_of:
+            self._replaced.extend(r for r in map(self._row_of.get, ids) if r is not None)
+        self._row_of.update(zip(ids, rows.tolist()))
+        self._drop_replaced()
+        return rows
+
+    def row(self, event_id: int) -> Optional[int]:
+        return self._row_of.get(event_id)
+
+    def rows(self, event_ids) -> np.ndarray:
+        """Vectorised row lookup; raises KeyError for unknown ids."""
+        return np.fromiter((self._row_of[i] for i in event_ids), dtype=np.int64, count=len(event_ids))
+
+    def column(self, name: str) -> np.ndarray:
+        self._flush()
+        return self._columns[name][:self._size]
+
+    def value(self, row: int, name: str):
+        return self.column(name)[row].item()
+
+    def digitizer_id(self, row: int) -> Optional[str]:
+        return self._digitizer_ids[self.value(row, "digitizer")]
+
+    def clock_time(self, row: int) -> datetime:
+        return datetime.fromtimestamp(self.value(row, "clock_time"))
+
+    def channels(self, row: int) -> list[int]:
+        mask = self.value(row, "channel_mask")
+        return [c for c in range(mask.bit_length()) if mask >> c & 1]
+
+    def trace(self, row: int, channel: int) -> Optional[np.ndarray]:
+        """Samples of one channel of a row: a view into its block, or fetched from its source."""
+        self._flush()
+        if not self._columns["channel_mask"][row] >> np.uint64(channel) & np.uint64(1):
+            return None
+        source = self._columns["source"][row]
+        if source >= 0:
+            return self._sources[source].trace(int(self._columns["id"][row]), channel)
+
+        settings_id = int(self._columns["settings_id"][row])
+        for (sid, ch, _), block in self._blocks.items():
+            if sid == settings_id and ch == channel:
+                i = block.find(row)
+                if i >= 0:
+                    return block.data[i]
+        return None
+
+    def matrix(self, rows: np.ndarray, channel: int) -> np.ndarray:
+        """
+        Gathers the traces of one channel for several rows into a single
+        rows x samples uint16 array: one fancy-indexing pass per block for
+        in-memory rows, a fetch per row for rows served by a source. All rows
+        must have the channel and traces of the same length.
+        """
+        self._flush()
+        rows = np.asarray(rows, dtype=np.int64)
+        has_channel = (self._columns["channel_mask"][rows] >> np.uint64(channel)) & np.uint64(1)
+        if not has_channel.all():
+            missing = self._columns["id"][rows[has_channel == 0]]
+            raise ValueError(f"Channel {channel} is missing in events {missing.tolist()}")
+
+        out: Optional[np.ndarray] = None
+        filled = np.zeros(len(rows), dtype=bool)
+
+        def place(where: np.ndarray, data: np.ndarray):
+            nonlocal out
+            if out is None:
+                out = np.empty((len(rows), data.shape[1]), dtype=np.uint16)
+            elif data.shape[1] != out.shape[1]:
+                raise ValueError("Traces of the requested events have different lengths")
+            out[where] = data
+            filled[where] = True
+
+        for (_, ch, _), block in self._blocks.items():
+            if ch != channel:
+                continue
+            pos = np.searchsorted(block.rows, rows)
+            pos[pos >= len(block.rows)] = 0
+            found = (block.rows[pos] == rows) & ~filled
+            if found.any():
+                place(np.flatnonzero(found), block.data[pos[found]])
+
+        for i in np.flatnonzero(~filled):
+            row = int(rows[i])
+            samples = self.trace(row, channel)
+            place(np.array([i]), np.asarray(samples)[None, :])
+
+        if out is None:
+            out = np.empty((0, 0), dtype=np.uint16)
+        return out
+
+    def blocks(self, settings_id: Optional[int] = None, channel: Optional[int] = None) -> dict[tuple[int, int, int], TraceBlock]:
+        """TraceBlocks keyed by (settings id, channel, samples), optionally filtered."""
+        self._flush()
+        return {
+            k: b for k, b in self._blocks.items()
+            if (settings_id is None or k[0] == settings_id) and (channel is None or k[1] == channel)
+        }
+
+    @property
+    def digitizer_ids(self) -> list[Optional[str]]:
+        """Digitizer ids indexed by the codes of the digitizer column."""
+        return list(self._digitizer_ids)
+
+    @property
+    def ids(self) -> list[int]:
+        return list(self._row_of.keys())
+
+    @property
+    def nbytes(self) -> int:
+        self._flush()
+        return sum(c.nbytes for c in self._columns.values()) + sum(b.nbytes for b in self._blocks.values())
+
+    def clear(self):
+        self.__init__()
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, event_id):
+        return event_id in self._row_of
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        self._append_columns(dict(zip(self.COLUMNS, zip(*self._pending))), len(self._pending))
+        self._pending.clear()
+
+        for key, (rows, data) in self._pending_traces.items():
+            self._append_traces(key, np.array(rows, dtype=np.int64), np.stack(data))
+        self._pending_traces.clear()
+        self._drop_replaced()
+
+    def _append_columns(self, values: dict, n: int) -> None:
+        for name, dtype in self.COLUMNS.items():
+            self._columns[name] = _reserve(self._columns[name], self._size, n)
+            self._columns[name][self._size:self._size + n] = np.asarray(values[name], dtype=dtype)
+        self._size += n
+
+    def _append_traces(self, key: tuple[int, int, int], rows: np.ndarray, data: np.ndarray) -> None:
+        block = self._blocks.get(key)
+        if block is None:
+            self._blocks[key] = TraceBlock(rows, data)
+        else:
+            block.append(rows, data)
+
+    def _drop_replaced(self) -> None:
+        # Frees the traces of replaced rows in bulk, once there are enough of them
+        if not self._replaced or 4 * len(self._replaced) < len(self._row_of):
+            return
+        replaced = np.unique(np.array(self._replaced, dtype=np.int64))
+        self._replaced.clear()
+        self._columns["channel_mask"][replaced] = 0
+        for key, block in list(self._blocks.items()):
+            block.drop(replaced)
+            if not len(block):
+                del self._blocks[key]
+
+    def _digitizer_code_of(self, digitizer_id: Optional[str]) -> int:
+        code = self._digitizer_code.get(digitizer_id)
+        if code is None:
+            code = self._digitizer_code[digitizer_id] = len(self._digitizer_ids)
+            self._digitizer_ids.append(digitizer_id)
+        return code
+
+    def _source_code(self, source: TraceSource) -> int:
+        for i, s in enumerate(self._sources):
+            if s is source:
+                return i
+        self._sources.append(source)
+        return len(self._sources) - 1
+
+
+class EventTraceMap(Mapping):
+    """
+    Read-only channel -> DataFrame mapping over one row of an EventStore,
+    used as the trace of Event views. DataFrames are built on access and
+    share memory with the stored samples.
+    """
+
+    def __init__(self, store: EventStore, row: int):
+        self._store = store
+        self._row = row
+        self._channels = store.channels(row)
+
+    def __getitem__(self, channel: int) -> "pd.DataFrame":
+        samples = self._store.trace(self._row, channel) if channel in self._channels else None
+        if samples is None:
+            raise KeyError(channel)
+        return pd.DataFrame(samples, columns=['Amplitude'], copy=False)
+
+    def __contains__(self, channel) -> bool:
+        return channel in self._channels
+
+    def __iter__(self):
+        return iter(self._channels)
+
+    def __len__(self):
+        return len(self._channels)
@@ -0,0 +1,29 @@
+from typing import Hashable
+from caenParser.persistence.FileParserRAWMapped import FileParserRAWMapped
+from caenParser.utils import TraceCache
+import numpy as np
+
+
+class LazyTraceSource:
+    """
+    TraceSource of the events of one lazily loaded .bin file. Samples are
+    copied out of the file mapping the first time they are requested and
+    kept in the shared TraceCache under (key, event id, channel), so hot
+    traces stay resident while the budget allows.
+    """
+
+    def __init__(self, key: Hashable, parser: FileParserRAWMapped, cache: TraceCache):
+        self._key = key
+        self._parser = parser
+        self._cache = cache
+
+    def trace(self, event_id: int, channel: int) -> np.ndarray:
+        cache_key = (self._key, event_id, channel)
+        samples = self._cache.get(cache_key)
+        if samples is None:
+            samples = np.array(self._parser.get_trace(event_id, channel))
+            self._cache.put(cache_key, samples)
+        return samples
+
+    def close(self):
+        self._parser.close()
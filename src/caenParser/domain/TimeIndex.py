@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Optional, Union
+import numpy as np
+
+Time = Union[float, datetime]
+
+
+def event_times(trigger_tags: np.ndarray, clock_times: np.ndarray, digitizer_codes: Optional[np.ndarray] = None,
+                tick_ns: float = 8.0, bits: int = 32) -> np.ndarray:
+    """
+    Builds a monotonic int64 event time, in nanoseconds since the epoch,
+    from the bits-wide trigger time tags (one count every tick_ns) and the
+    one-second clock_times (epoch seconds) of events given in acquisition
+    order. Each digitizer (digitizer_codes) has its own counter.
+
+    Between consecutive events of a digitizer the tag difference modulo
+    2**bits is the elapsed time up to whole rollovers; how many rollovers
+    happened is taken from the clock difference, so gaps spanning several
+    rollovers are unwrapped too (as long as a rollover lasts well over the
+    one-second clock resolution). The unwrapped counter is then anchored to
+    the clock: shifted by the smallest offset that puts no event before its
+    clock_time.
+    """
+    tags = np.asarray(trigger_tags, dtype=np.int64)
+    clocks = np.asarray(clock_times, dtype=np.int64)
+    if digitizer_codes is None:
+        digitizer_codes = np.zeros(len(tags), dtype=np.int64)
+    codes = np.asarray(digitizer_codes)
+    period = np.int64(1) << np.int64(bits)
+    out = np.empty(len(tags), dtype=np.int64)
+
+    for code in np.unique(codes):
+        where = np.flatnonzero(codes == code)
+        tag, clock = tags[where], clocks[where]
+        step = np.diff(tag) % period
+        # Rollovers hidden in a step: the clock gap in ticks, minus the step, in periods
+        elapsed = np.diff(clock) * (1e9 / tick_ns)
+        wraps = np.maximum(np.rint((elapsed - step) / period), 0).astype(np.int64)
+        ticks = np.concatenate([[0], np.cumsum(step + wraps * period)])
+
+        ns = np.rint(ticks * tick_ns).astype(np.int64)
+        anchor = np.max(clock * 1_000_000_000 - ns)
+        out[where] = anchor + ns
+    return out
+
+
+def to_ns(t: Time) -> int:
+    """Epoch seconds (float) or a datetime as integer nanoseconds since the epoch."""
+    if isinstance(t, datetime):
+        t = t.timestamp()
+    return int(round(t * 1e9))
+
+
+class TimeIndex:
+    """
+    Events sorted by time (see event_times) for binary-search queries:
+    the rows within a time range and event counts or rates per time bin,
+    without sorting on every query.
+    """
+
+    def __init__(self, times: np.ndarray, rows: np.ndarray):
+        order = np.argsort(times, kind="stable")
+        self._times = np.asarray(times, dtype=np.int64)[order]
+        self._rows = np.asarray(rows, dtype=np.int64)[order]
+        self._by_row: Optional[np.ndarray] = None
+
+    def between(self, t0: Time, t1: Time) -> np.ndarray:
+        """Rows of the events with t0 <= time < t1, in time order."""
+        start, stop = np.searchsorted(self._times, [to_ns(t0), to_ns(t1)], side="left")
+        return self._rows[start:stop]
+
+    def time_of(self, rows: np.ndarray) -> np.ndarray:
+        """Times of the given rows, which must be indexed."""
+        if self._by_row is None:
+            self._by_row = np.argsort(self._rows, kind="stable")
+        rows = np.asarray(rows, dtype=np.int64)
+        pos = np.searchsorted(self._rows, rows, sorter=self._by_row)
+        if (pos >= len(self._rows)).any():
+            raise KeyError("Rows not in the time index")
+        found = self._by_row[pos]
+        if not np.array_equal(self._rows[found], rows):
+            raise KeyError("Rows not in the time index")
+        return self._times[found]
+
+    def count(self, t0: Time, t1: Time) -> int:
+        start, stop = np.searchsorted(self._times, [to_ns(t0), to_ns(t1)], side="left")
+        return int(stop - start)
+
+    def histogram(self, bin_width: float, t0: Optional[Time] = None,
+                  t1: Optional[Time] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Event counts per bin of bin_width seconds from t0 to t1 (the first
+        and last event by default; the last bin may extend past t1).
+        Returns the bin start times in epoch seconds and the counts; each
+        bin edge takes one binary search.
+        """
+        if bin_width <= 0:
+            raise ValueError("bin_width must be positive")
+        if len(self._times) == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        start = to_ns(t0) if t0 is not None else int(self._times[0])
+        stop = to_ns(t1) if t1 is not None else int(self._times[-1]) + 1
+        width = int(round(bin_width * 1e9))
+        n_bins = max(-(-(stop - start) // width), 1)
+        edges = start + np.arange(n_bins + 1, dtype=np.int64) * width
+        counts = np.diff(np.searchsorted(self._times, edges, side="left"))
+        return edges[:-1] / 1e9, counts
+
+    @property
+    def times(self) -> np.ndarray:
+        """Event times in nanoseconds since the epoch, sorted."""
+        return self._times
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Store rows in time order."""
+        return self._rows
+
+    def __len__(self):
+        return len(self._times)
@@ -0,0 +1,240 @@
+from typing import Iterable, Iterator, Optional, Sequence
+import numpy as np
+from .dtos import EventDTO
+
+
+class Accumulator:
+    """
+    Summary statistic updated while a file is parsed, without keeping any
+    trace. update() is called once per (event, channel) trace and
+    update_batch() with a whole events x samples block of one channel;
+    subclasses implement update_batch and get update for free.
+    end_event() is called once per event.
+
+    Accumulators of the same kind and configuration merge() into each
+    other, so files summarised separately (or in worker processes, as
+    they pickle) add up to the summary of the whole run. empty() returns a
+    fresh accumulator with the same configuration.
+    """
+
+    def __init__(self, **config):
+        self._config = config
+
+    def update(self, channel: int, time: float, samples: np.ndarray) -> None:
+        self.update_batch(channel, np.array([time], dtype=np.float64), np.asarray(samples)[None, :])
+
+    def update_batch(self, channel: int, times: np.ndarray, samples: np.ndarray) -> None:
+        pass
+
+    def end_event(self, time: float) -> None:
+        pass
+
+    def end_events(self, times: np.ndarray) -> None:
+        for t in times:
+            self.end_event(float(t))
+
+    def merge(self, other: "Accumulator") -> None:
+        if type(other) is not type(self) or other._config != self._config:
+            raise ValueError(f"Cannot merge {type(other).__name__} into {type(self).__name__}: kind or configuration differs")
+        self._merge(other)
+
+    def _merge(self, other: "Accumulator") -> None:
+        raise NotImplementedError
+
+    def empty(self) -> "Accumulator":
+        return type(self)(**self._config)
+
+    def result(self) -> dict:
+        raise NotImplementedError
+
+
+class EventCounter(Accumulator):
+    """Number of events and of traces recorded per channel."""
+
+    def __init__(self):
+        super().__init__()
+        self.events = 0
+        self.traces: dict[int, int] = {}
+
+    def update_batch(self, channel, times, samples):
+        self.traces[channel] = self.traces.get(channel, 0) + len(samples)
+
+    def end_event(self, time):
+        self.events += 1
+
+    def end_events(self, times):
+        self.events += len(times)
+
+    def _merge(self, other):
+        self.events += other.events
+        for channel, n in other.traces.items():
+            self.traces[channel] = self.traces.get(channel, 0) + n
+
+    def result(self) -> dict:
+        return {"events": self.events, "traces": dict(sorted(self.traces.items()))}
+
+
+class RateHistogram(Accumulator):
+    """
+    Events per time bin of bin_width (in the unit of the event times the
+    parser passes: seconds for RAW and XML, timestamp counts for WaveDump2).
+    Bins are kept sparse, so runs far apart in time merge cheaply.
+    """
+
+    def __init__(self, bin_width: float = 1.0):
+        if bin_width <= 0:
+            raise ValueError("bin_width must be positive")
+        super().__init__(bin_width=bin_width)
+        self.bin_width = bin_width
+        self.counts: dict[int, int] = {}
+
+    def end_event(self, time):
+        b = int(time // self.bin_width)
+        self.counts[b] = self.counts.get(b, 0) + 1
+
+    def end_events(self, times):
+        bins, counts = np.unique(np.floor_divide(np.asarray(times, dtype=np.float64), self.bin_width).astype(np.int64),
+                                 return_counts=True)
+        for b, n in zip(bins.tolist(), counts.tolist()):
+            self.counts[b] = self.counts.get(b, 0) + n
+
+    def _merge(self, other):
+        for b, n in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + n
+
+    def result(self) -> dict:
+        """Bin start times, event counts and rates (events per unit time), in time order."""
+        bins = np.array(sorted(self.counts), dtype=np.int64)
+        counts = np.array([self.counts[b] for b in bins.tolist()], dtype=np.int64)
+        return {"time": bins * self.bin_width, "counts": counts, "rate": counts / self.bin_width}
+
+
+class MeanWaveform(Accumulator):
+    """
+    Per channel mean waveform and per-sample RMS spread around it, from
+    running sums. Traces of another length than the first one seen on a
+    channel are accumulated separately, keyed by length.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._sums: dict[tuple[int, int], list] = {}  # (channel, samples) -> [count, sum, sum of squares]
+
+    def update_batch(self, channel, times, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        entry = self._sums.get((channel, samples.shape[1]))
+        if entry is None:
+            entry = self._sums[(channel, samples.shape[1])] = [0, np.zeros(samples.shape[1]), np.zeros(samples.shape[1])]
+        entry[0] += len(samples)
+        entry[1] += np.nansum(samples, axis=0)
+        entry[2] += np.nansum(samples * samples, axis=0)
+
+    def _merge(self, other):
+        for key, (n, s, s2) in other._sums.items():
+            entry = self._sums.setdefault(key, [0, np.zeros_like(s), np.zeros_like(s2)])
+            entry[0] += n
+            entry[1] += s
+            entry[2] += s2
+
+    def mean(self, channel: int, samples: Optional[int] = None) -> np.ndarray:
+        n, s, _ = self._entry(channel, samples)
+        return s / n
+
+    def rms(self, channel: int, samples: Optional[int] = None) -> np.ndarray:
+        n, s, s2 = self._entry(channel, samples)
+        mean = s / n
+        return np.sqrt(np.maximum(s2 / n - mean * mean, 0.0))
+
+    def result(self) -> dict:
+        """channel -> {"count", "mean", "rms"} for the most common trace length of each channel."""
+        out = {}
+        for channel in sorted({c for c, _ in self._sums}):
+            n, _, _ = self._entry(channel, None)
+            out[channel] = {"count": n, "mean": self.mean(channel), "rms": self.rms(channel)}
+        return out
+
+    def _entry(self, channel: int, samples: Optional[int]):
+        if samples is None:
+            candidates = [(v[0], k) for k, v in self._sums.items() if k[0] == channel]
+            if not candidates:
+                raise KeyError(channel)
+            samples = max(candidates)[1][1]
+        return self._sums[(channel, samples)]
+
+
+class AmplitudeHistogram(Accumulator):
+    """
+    Per channel histogram of pulse amplitudes over fixed bin edges. The
+    amplitude of a trace is its largest excursion from the baseline (mean
+    of the first baseline_samples samples) in the direction of polarity,
+    -1 for negative pulses.
+    """
+
+    def __init__(self, edges: Sequence[float], baseline_samples: int = 16, polarity: int = 1):
+        super().__init__(edges=tuple(float(e) for e in edges), baseline_samples=baseline_samples, polarity=polarity)
+        self.edges = np.asarray(self._config["edges"])
+        self.baseline_samples = baseline_samples
+        self.polarity = polarity
+        self.counts: dict[int, np.ndarray] = {}
+
+    def update_batch(self, channel, times, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        baseline = samples[:, :self.baseline_samples].mean(axis=1)
+        amplitude = np.nanmax((samples - baseline[:, None]) * self.polarity, axis=1)
+        counts, _ = np.histogram(amplitude, bins=self.edges)
+        if channel in self.counts:
+            self.counts[channel] += counts
+        else:
+            self.counts[channel] = counts
+
+    def _merge(self, other):
+        for channel, counts in other.counts.items():
+            if channel in self.counts:
+                self.counts[channel] = self.counts[channel] + counts
+            else:
+                self.counts[channel] = counts.copy()
+
+    def result(self) -> dict:
+        return {"edges": self.edges, "counts": dict(sorted(self.counts.items()))}
+
+
+def merge_accumulators(groups: Iterable[Sequence[Accumulator]]) -> list[Accumulator]:
+    """Merges parallel lists of accumulators (e.g. one list per file) into one list."""
+    merged: Optional[list[Accumulator]] = None
+    for group in groups:
+        if merged is None:
+            merged = [a.empty() for a in group]
+        for target, source in zip(merged, group):
+            target.merge(source)
+    return merged or []
+
+
+def update_event(accumulators: Sequence[Accumulator], event: EventDTO) -> None:
+    """Feeds every trace of an EventDTO to accumulators, timed by its clock_time in epoch seconds."""
+    time = event.clock_time.timestamp()
+    for channel, samples in event.trace.items():
+        for accumulator in accumulators:
+            accumulator.update(channel, time, samples)
+    for accumulator in accumulators:
+        accumulator.end_event(time)
+
+
+def update_block(accumulators: Sequence[Accumulator], times: np.ndarray, channel_ids: Sequence[int],
+                 waveform: np.ndarray) -> None:
+    """Feeds an events x channels x samples block (e.g. WaveDump2 records) to accumulators."""
+    times = np.asarray(times, dtype=np.float64)
+    for c, channel in enumerate(channel_ids):
+        for accumulator in accumulators:
+            accumulator.update_batch(channel, times, waveform[:, c, :])
+    for accumulator in accumulators:
+        accumulator.end_events(times)
+
+
+def accumulate(events: Iterable[EventDTO], accumulators: Optional[Sequence[Accumulator]]) -> Iterator[EventDTO]:
+    """Passes events through, feeding each one to accumulators on the way."""
+    if not accumulators:
+        yield from events
+        return
+    for event in events:
+        update_event(accumulators, event)
+        yield event
@@ -0,0 +1,250 @@
+from .dtos import EventDTO
+from typing import Iterable, Optional, Sequence, Union
+import numpy as np
+import os
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet/Arrow export needs pyarrow: pip install pyarrow (or caenParser[arrow])") from None
+    return pyarrow
+
+
+class ArrowEventWriter:
+    """
+    Writes events to a Hive-partitioned Parquet or Arrow IPC dataset, one
+    row per (event, channel): event_id, settings_id, digitizer_id,
+    time_stamp, clock_time, trigger_shift, channel and the uint16 trace.
+
+    Rows go to ``path/[run=<run>/]<column>=<value>/.../part-0.<ext>`` for the
+    columns in partition_by (which are then left out of the files, as Hive
+    readers rebuild them from the path). Every partition buffers at most
+    rows_per_group rows, and at most bytes_per_group bytes of traces, before
+    writing them out as one row group (Parquet) or record batch (Arrow), so
+    memory stays bounded whatever the number of events and trace length. trace_type="fixed" stores traces as fixed_size_list, which
+    needs one length per partition; "list" allows any length.
+
+    Requires pyarrow; an ImportError explains how to get it otherwise.
+    """
+
+    FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+    COLUMNS = ["event_id", "settings_id", "digitizer_id", "time_stamp", "clock_time", "trigger_shift", "channel"]
+
+    def __init__(self, path: str, format: str = "parquet", partition_by: Sequence[str] = ("settings_id", "channel"),
+                 run: Optional[str] = None, rows_per_group: int = 65536, trace_type: str = "fixed",
+                 compression: str = "zstd", bytes_per_group: int = 64 << 20):
+        self._pa = _require_pyarrow()
+        if format not in self.FORMATS:
+            raise ValueError(f"Invalid export format: {format}. Valid options are: {list(self.FORMATS)}")
+        if trace_type not in ("fixed", "list"):
+            raise ValueError(f"Invalid trace type: {trace_type}. Valid options are: ['fixed', 'list']")
+        unknown = [c for c in partition_by if c not in self.COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot partition by {unknown}. Valid options are: {self.COLUMNS}")
+        if rows_per_group < 1:
+            raise ValueError("rows_per_group must be positive")
+        if bytes_per_group < 1:
+            raise ValueError("bytes_per_group must be positive")
+
+        self._path = path
+        self._format = format
+        self._partition_by = list(partition_by)
+        self._run = run
+        self._rows_per_group = rows_per_group
+        self._bytes_per_group = bytes_per_group
+        self._trace_type = trace_type
+        self._compression = compression
+        self._buffers: dict[tuple, tuple[list[dict], list, int, int]] = {}  # Partition -> (column chunks, trace chunks, rows, trace bytes)
+        self._writers: dict[tuple, tuple[object, object]] = {}  # Partition -> (writer, schema)
+        self._rows_written = 0
+
+    def write(self, columns: dict[str, np.ndarray], traces: Union[np.ndarray, list[np.ndarray]]) -> None:
+        """
+        Adds rows: columns maps every name in COLUMNS to an array with one
+        entry per row and traces is either a rows x samples array or a list
+        of 1-d arrays.
+        """
+        n = len(columns["event_id"])
+        if n == 0:
+            return
+        if self._partition_by:
+            keys = np.rec.fromarrays([np.asarray(columns[c]) for c in self._partition_by])
+            partitions, inverse = np.unique(keys, return_inverse=True)
+            inverse = inverse.ravel()
+        else:
+            partitions, inverse = [()], np.zeros(n, dtype=np.int64)
+
+        for p, partition in enumerate(partitions):
+            idx = np.flatnonzero(inverse == p) if len(partitions) > 1 else slice(None)
+            key = tuple(v.item() if hasattr(v, "item") else v for v in partition)
+            part_columns = {c: np.asarray(columns[c])[idx] for c in self.COLUMNS if c not in self._partition_by}
+            if isinstance(traces, np.ndarray):
+                part_traces = traces[idx]
+            else:
+                part_traces = [traces[i] for i in (range(n) if isinstance(idx, slice) else idx)]
+            self._append(key, part_columns, part_traces)
+
+    def close(self) -> None:
+        """Writes out every partially filled group and closes the files."""
+        try:
+            for key in list(self._buffers):
+                self._flush(key, final=True)
+        finally:
+            for writer, _ in self._writers.values():
+                writer.close()
+            self._writers.clear()
+            self._buffers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def rows_written(self) -> int:
+        return self._rows_written
+
+    def _append(self, key: tuple, columns: dict[str, np.ndarray], traces) -> None:
+        column_chunks, trace_chunks, rows, nbytes = self._buffers.setdefault(key, ([], [], 0, 0))
+        column_chunks.append(columns)
+        trace_chunks.append(traces)
+        rows += len(columns["event_id"])
+        nbytes += self._trace_bytes(traces)
+        self._buffers[key] = (column_chunks, trace_chunks, rows, nbytes)
+        if rows >= self._rows_per_group or nbytes >= self._bytes_per_group:
+            self._flush(key, final=False)
+
+    def _flush(self, key: tuple, final: bool) -> None:
+        column_chunks, trace_chunks, rows, nbytes = self._buffers.pop(key)
+        if rows == 0:
+            return
+        columns = {c: np.concatenate([chunk[c] for chunk in column_chunks]) for c in column_chunks[0]}
+        traces = self._concat_traces(trace_chunks)
+        # Groups are cut at whichever of rows_per_group and bytes_per_group comes first
+        group = max(1, min(self._rows_per_group, self._bytes_per_group * rows // max(nbytes, 1)))
+
+        start = 0
+        while rows - start >= group or (final and start < rows):
+            stop = min(start + group, rows)
+            self._write_group(key, {c: a[start:stop] for c, a in columns.items()}, traces[start:stop])
+            start = stop
+
+        if start < rows:
+            # Keep the tail for the next group
+            tail = traces[start:]
+            self._buffers[key] = ([{c: a[start:] for c, a in columns.items()}], [tail], rows - start,
+                                  self._trace_bytes(tail))
+
+    @staticmethod
+    def _trace_bytes(traces) -> int:
+        if isinstance(traces, np.ndarray):
+            return traces.nbytes
+        return sum(np.asarray(t).nbytes for t in traces)
+
+    @staticmethod
+    def _concat_traces(chunks: list):
+        if all(isinstance(c, np.ndarray) and c.ndim == 2 for c in chunks):
+            if len({c.shape[1] for c in chunks}) == 1:
+                return np.concatenate(chunks)
+        flat = []
+        for c in chunks:
+            flat.extend(list(c))
+        return flat
+
+    def _write_group(self, key: tuple, columns: dict[str, np.ndarray], traces) -> None:
+        pa = self._pa
+        arrays, names = [], []
+        for c, values in columns.items():
+            if c == "clock_time":
+                arrays.append(pa.array(values.astype(np.int64), type=pa.timestamp("s")))
+            elif c == "digitizer_id":
+                arrays.append(pa.array(values.astype(str), type=pa.string()))
+            else:
+                arrays.append(pa.array(values))
+            names.append(c)
+        arrays.append(self._trace_array(traces))
+        names.append("trace")
+        batch = pa.RecordBatch.from_arrays(arrays, names=names)
+
+        if key not in self._writers:
+            self._writers[key] = (self._open_writer(key, batch.schema), batch.schema)
+        writer, schema = self._writers[key]
+        if not schema.equals(batch.schema):
+            raise ValueError(
+                f"Rows of partition {self._partition_dir(key)} do not match its schema "
+                f"(traces of different lengths need trace_type='list')"
+            )
+        writer.write_batch(batch)
+        self._rows_written += batch.num_rows
+
+    def _trace_array(self, traces):
+        pa = self._pa
+        if isinstance(traces, np.ndarray) and traces.ndim == 2:
+            samples = traces.shape[1]
+            values = pa.array(np.ascontiguousarray(traces, dtype=np.uint16).ravel())
+            if self._trace_type == "fixed":
+                return pa.FixedSizeListArray.from_arrays(values, samples)
+            offsets = pa.array(np.arange(0, (len(traces) + 1) * samples, samples, dtype=np.int32))
+            return pa.ListArray.from_arrays(offsets, values)
+
+        lengths = np.fromiter((len(t) for t in traces), dtype=np.int64, count=len(traces))
+        if self._trace_type == "fixed":
+            if len(set(lengths.tolist())) != 1:
+                raise ValueError("Traces of different lengths in one partition need trace_type='list'")
+            return self._trace_array(np.stack([np.asarray(t, dtype=np.uint16) for t in traces]))
+        values = pa.array(np.concatenate([np.asarray(t, dtype=np.uint16) for t in traces]))
+        offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32))
+        return pa.ListArray.from_arrays(offsets, values)
+
+    def _open_writer(self, key: tuple, schema):
+        directory = os.path.join(self._path, self._partition_dir(key))
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, "part-0" + self.FORMATS[self._format])
+        if self._format == "parquet":
+            return self._pa.parquet.ParquetWriter(file_path, schema, compression=self._compression)
+        return self._pa.ipc.new_file(file_path, schema)
+
+    def _partition_dir(self, key: tuple) -> str:
+        parts = [f"run={self._run}"] if self._run is not None else []
+        parts += [f"{c}={v}" for c, v in zip(self._partition_by, key)]
+        return os.path.join(*parts) if parts else ""
+
+
+def export_events(events: Iterable[EventDTO], path: str, events_per_batch: int = 4096, **kwargs) -> int:
+    """
+    Streams EventDTOs (e.g. a parser's iter_events()) into an
+    ArrowEventWriter, events_per_batch events at a time, and returns the
+    number of rows written. kwargs are passed to ArrowEventWriter.
+    """
+    with ArrowEventWriter(path, **kwargs) as writer:
+        rows: dict[str, list] = {c: [] for c in ArrowEventWriter.COLUMNS}
+        traces: list[np.ndarray] = []
+        pending = 0
+
+        def flush():
+            writer.write({c: np.array(v) for c, v in rows.items()}, traces)
+            for v in rows.values():
+                v.clear()
+            traces.clear()
+
+        for event in events:
+            for channel, samples in event.trace.items():
+                rows["event_id"].append(event.id)
+                rows["settings_id"].append(event.settings_id)
+                rows["digitizer_id"].append(event.digitizer_id)
+                rows["time_stamp"].append(event.time_stamp)
+                rows["clock_time"].append(int(event.clock_time.timestamp()))
+                rows["trigger_shift"].append(event.trigger_shift)
+                rows["channel"].append(channel)
+                traces.append(samples)
+            pending += 1
+            if pending >= events_per_batch:
+                flush()
+                pending = 0
+        flush()
+    return writer.rows_written
@@ -1,4 +1,7 @@
 from  .dtos import DigitizerDTO, SettingsDTO, EventDTO, TriggerDTO
+from .Accumulators import Accumulator
+from caenParser.utils.Profiler import profiler
+from typing import Sequence
 
 
 class FileParser:
@@ -15,6 +18,16 @@ class FileParser:
         # Parsing logic here
         pass
 
+    def summarize(self, accumulators: Sequence[Accumulator]) -> Sequence[Accumulator]:
+        """
+        Reads the open file in one pass, feeding every event to accumulators
+        and dropping it right after, and returns the accumulators. Digitizers
+        and settings are collected as by parse().
+        """
+        for _ in self.iter_events(accumulators=accumulators):
+            pass
+        return accumulators
+
     def close(self):
         self._fileObj = None
         self._digitizers.clear()
@@ -31,4 +44,9 @@ class FileParser:
     
     @property
     def events(self):
-        return [e.copy() for e in self._events]
+        with profiler.stage("FileParser.events"):
+            events = [e.copy() for e in self._events]
+        if profiler.enabled:
+            profiler.count("FileParser.events", copies=len(events),
+                           bytes_copied=sum(t.nbytes for e in events for t in e.trace.values()))
+        return events
@@ -1,8 +1,16 @@
 from caen_cpp import CBinaryIn, Header, DigitizerDescriptor, DigitizerSettings, DigitizerSettingsFixedHeader, WaveformData, WaveformFixedHeader 
 from .FileParser import FileParser
 from .dtos import DigitizerDTO, SettingsDTO, EventDTO, TriggerDTO
+from .Accumulators import Accumulator, accumulate
+from .Selection import Selection
+from caenParser.utils.Profiler import profiler
+from caenParser.utils.ReadAhead import ReadAhead, Source, is_plain_file
+from caenParser.utils.Tail import Tail, POLL_INTERVAL
 from enum import Enum, auto
 from datetime import datetime
+import os
+import sys
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence
 
 class RecordType(Enum):
     DIGITIZER_DESCRIPTION = CBinaryIn.tp_DigitizerDescription
@@ -13,25 +21,154 @@ class RecordType(Enum):
 
 
 class FileParserRAW(FileParser):
-    def __init__(self):
+    EVICTED_IDS = 4096  # Ids of events yielded incomplete kept to drop their late records
+
+    def __init__(self, selection: Optional[Selection] = None):
+        """
+        With a selection only the waveform records it accepts are read; the
+        others are skipped in C++ on their fixed header (see Selection), and
+        events are complete once their selected channels are read.
+        """
         super().__init__()
         self._fileObj: CBinaryIn = None
+        self._source: Optional[ReadAhead] = None
+        self._file_path: Optional[str] = None  # Plain files only, watched by follow()
+        self._selection = selection
 
-        self._tmpEvent: dict[int, EventDTO] = {}
+        self._tmpEvent: dict[int, EventDTO] = {}  # Reassembly buffer, oldest event first
+        self._channel_masks: dict[int, int] = {}  # Settings id -> channels_mask
 
-    def open(self, file_path: str):
+    def open(self, file_path: Source):
+        """
+        Opens a RAW file. A path to a gzip, xz or bz2 compressed file, "-"
+        for stdin, or a binary file object (e.g. a pipe) is read as a stream,
+        decompressed in large blocks on a background thread (see ReadAhead).
+        """
         try:
-            self._fileObj = CBinaryIn(file_path)
+            if is_plain_file(file_path):
+                self._fileObj = CBinaryIn(file_path)
+                self._file_path = os.fspath(file_path)
+            else:
+                self._source = ReadAhead(file_path)
+                self._fileObj = CBinaryIn(self._source.fileno(), self._source.name)
         except Exception as e:
+            self.close()
             raise ValueError(f"Error opening RAW file: {e}")
+        self._fileObj.setTiming(profiler.enabled)
             
+    @profiler.timed("FileParserRAW.parse")
     def parse(self) -> None:
+        self._events = list(self.iter_events(max_pending=None))
+        profiler.count("FileParserRAW.parse", events=len(self._events))
+        print("File parsing completed successfully.")
+
+    def iter_events(self, max_pending: Optional[int] = 64,
+                    accumulators: Optional[Sequence[Accumulator]] = None) -> Iterator[EventDTO]:
+        """
+        Reads the file and yields every event as soon as it is complete, i.e.
+        once a trace has been read for each channel enabled in the
+        channels_mask of its settings. Events still missing channels wait in
+        a reassembly buffer keyed on s_eventId; when more than max_pending are
+        waiting the oldest one is yielded as it is, so memory stays bounded
+        whatever the file size (max_pending=None never gives up on an event).
+        Whatever is left is flushed at end of file.
+
+        An event yielded incomplete is final: records of its id that come
+        later are dropped with a warning on stderr rather than starting a
+        second event with the same id. The last EVICTED_IDS such ids are
+        remembered.
+
+        Digitizers and settings read along the way are collected as by parse().
+        Every event is fed to accumulators (see Accumulators) before it is
+        yielded.
+        """
+        return accumulate(self._reassemble(max_pending), accumulators)
+
+    def follow(self, poll_interval: float = POLL_INTERVAL, idle_timeout: Optional[float] = None, stop=None,
+               max_pending: Optional[int] = 64) -> Iterator[EventDTO]:
+        """
+        Tails a file that the DAQ is still writing: yields every event of the
+        open file as iter_events does, then waits for the file to grow and
+        yields the events completed by the new records, until stop (a
+        threading.Event) is set or no event came for idle_timeout seconds
+        (see Tail). A partly written record is waited for, not an error.
+        Events still missing channels are flushed when the tail ends.
+        """
+        tail = Tail(poll_interval, idle_timeout, stop, path=self._file_path)
+        return tail.run(self._reassemble(max_pending, tail.keep_waiting))
+
+    def afollow(self, poll_interval: float = POLL_INTERVAL, idle_timeout: Optional[float] = None, stop=None,
+                max_pending: Optional[int] = 64) -> AsyncIterator[EventDTO]:
+        """follow as an asyncio iterator (async for); stop may be an asyncio.Event."""
+        tail = Tail(poll_interval, idle_timeout, stop, path=self._file_path)
+        return tail.arun(self._reassemble(max_pending, tail.keep_waiting))
+
+    def _reassemble(self, max_pending: Optional[int],
+                    follow: Optional[Callable[[], bool]] = None) -> Iterator[Optional[EventDTO]]:
+        self._tmpEvent.clear()
+        evicted: dict[int, int] = {}  # Ids yielded incomplete -> late records dropped, oldest first
+        for waveform in self._read_records(follow):
+            if waveform is None:
+                yield None  # Caught up with a file being followed
+                continue
+            if evicted and waveform.s_header.s_eventId in evicted:
+                self._drop_late_record(waveform, evicted)
+                continue
+            event = self._convert_waveform_data_to_tmp_dto(waveform)
+            if self._is_complete(event):
+                yield self._tmpEvent.pop(event.id)
+            elif max_pending is not None and len(self._tmpEvent) > max_pending:
+                oldest = self._tmpEvent.pop(next(iter(self._tmpEvent)))
+                evicted[oldest.id] = 0
+                if len(evicted) > self.EVICTED_IDS:
+                    del evicted[next(iter(evicted))]
+                yield oldest
+
+        while self._tmpEvent:
+            yield self._tmpEvent.pop(next(iter(self._tmpEvent)))
+
+    @staticmethod
+    def _drop_late_record(waveform: WaveformData, evicted: dict[int, int]) -> None:
+        # Warns on the first late record of an event only
+        event_id = waveform.s_header.s_eventId
+        if evicted[event_id] == 0:
+            print(f"WARNING: Dropping channel {waveform.s_header.s_channel} of event {event_id} and any later "
+                  f"record of it: the event was already yielded incomplete (raise max_pending)", file=sys.stderr)
+        evicted[event_id] += 1
 
+    def __iter__(self) -> Iterator[EventDTO]:
+        return self.iter_events()
+
+    def _read_records(self, follow: Optional[Callable[[], bool]] = None) -> Iterator[Optional[WaveformData]]:
+        """
+        Reads the file record by record. Digitizer and settings records are
+        converted and stored on the way; waveform records are yielded.
+        With follow, the end of the file is the end of what is written so
+        far: None is yielded and reading goes on while follow() is true.
+        """
         header = Header()
-        controlInt = self._fileObj.readHeader(header)
+        # With a selection, rejected waveform records are skipped by readHeader itself
+        selection = (self._selection.native(),) if self._selection is not None else ()
+        if follow is not None:
+            self._fileObj.setFollow(True)
+        try:
+            yield from self._read_file(header, selection, follow)
+        except ValueError:
+            if self._source is not None:
+                self._source.check()  # A broken stream explains a truncated record
+            raise
+        if self._source is not None:
+            self._source.check()
+
+    def _read_file(self, header: Header, selection: tuple,
+                   follow: Optional[Callable[[], bool]]) -> Iterator[Optional[WaveformData]]:
+        controlInt = self._fileObj.readHeader(header, *selection)
+        if controlInt == 0 and follow is not None:
+            controlInt = yield from self._wait_for_record(header, selection, follow)
         self._sanitize_control_int(controlInt, RecordType.HEADER)
 
         while (controlInt > 0):
+            waveform = None
             match header.s_type:
                 case RecordType.DIGITIZER_DESCRIPTION.value:
                     desc = DigitizerDescriptor()
@@ -40,19 +177,24 @@ class FileParserRAW(FileParser):
                 case RecordType.DIGITIZER_SETTINGS.value:
                     settings = DigitizerSettings()
                     controlInt = self._fileObj.readDigitizerSettings(settings)
-                    self._settings.append(self._convert_digitizer_settings_to_dto(settings))
+                    dto = self._convert_digitizer_settings_to_dto(settings)
+                    self._settings.append(dto)
+                    self._channel_masks[dto.id] = dto.channels_mask if self._selection is None \
+                        else self._selection.channel_mask(dto.channels_mask)
                 case RecordType.WAVEFORM_DATA.value:
                     waveform = WaveformData()
-                    controlInt = self._fileObj.readWaveformData(waveform)
-                    self._convert_waveform_data_to_tmp_dto(waveform)
+                    controlInt = self._fileObj.readWaveform(waveform)
                 case _:
                     raise ValueError(f"Unknown record type: {header.s_type}")
             
             # Sanitize controlInt for the next iteration
             self._sanitize_control_int(controlInt, RecordType(header.s_type))
+            if waveform is not None:
+                yield waveform
 
-
-            controlInt = self._fileObj.readHeader(header)
+            controlInt = self._fileObj.readHeader(header, *selection)
+            if controlInt == 0 and follow is not None:
+                controlInt = yield from self._wait_for_record(header, selection, follow)
             if controlInt != 0:
                 # Sanitize controlInt for the next header read
                 self._sanitize_control_int(controlInt, RecordType.HEADER)
@@ -60,16 +202,49 @@ class FileParserRAW(FileParser):
         #end of file reached
         if controlInt != 0:
             raise ValueError("File parsing did not end correctly")
-        print("File parsing completed successfully.")
-        self._events = list(self._tmpEvent.values())
-        self._tmpEvent.clear()
+        if profiler.enabled:
+            self._count_records()
         self._fileObj.close()
 
+    def _wait_for_record(self, header: Header, selection: tuple,
+                         follow: Callable[[], bool]) -> Iterator[None]:
+        # Yields None until a whole new record is in the file, then returns its readHeader
+        controlInt = 0
+        while controlInt == 0:
+            yield None
+            if not follow():
+                break
+            controlInt = self._fileObj.readHeader(header, *selection)
+        return controlInt
+
+    def close(self):
+        # The reader lets go of the pipe first, so a ReadAhead still feeding it stops
+        if isinstance(self._fileObj, CBinaryIn):
+            self._fileObj.close()
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+        super().close()
+
+    def _count_records(self) -> None:
+        # System calls of CBinaryIn and records decoded by this pass, counted in C++
+        f = self._fileObj
+        profiler.count("CBinaryIn", bytes_read=f.bytesRead(), read_calls=f.readCalls(), read_s=f.readSeconds(),
+                       records_skipped=f.skipped())
+        profiler.count("FileParserRAW.decode", descriptors=f.recordsRead(CBinaryIn.tp_DigitizerDescription),
+                       settings=f.recordsRead(CBinaryIn.tp_DigitizerSettings), waveforms=f.recordsRead(CBinaryIn.tp_TraceData))
+
+    def _is_complete(self, event: EventDTO) -> bool:
+        mask = self._channel_masks.get(event.settings_id)
+        if not mask:
+            return False
+        return all(mask >> c & 1 == 0 or c in event.trace for c in range(mask.bit_length()))
+
 
     def _convert_digitizer_descriptor_to_dto(self, desc: DigitizerDescriptor) -> DigitizerDTO:
         return DigitizerDTO(
             id=str(desc.s_id),
-            family= "xx" + str(desc.s_family),
+            family= "xx" + str(desc.s_familyCode),
             version= str(desc.s_ROCVersion) + "." + str(desc.s_AMCVersion),
             serial=str(desc.s_SerialNumber),
             channels=desc.s_nChans,
@@ -87,7 +262,7 @@ class FileParserRAW(FileParser):
     def _convert_digitizer_settings_to_dto(self, settings: DigitizerSettings) -> SettingsDTO:
         s_header = settings.s_header
         return SettingsDTO(
-            id = s_header.s_id,
+            id = s_header.s_sid,
             digitizer_id = str(s_header.s_did),
             dc_offsets = {i: int(settings.s_DCOffsets[i]) for i in range(s_header.s_nChannels)},
             trigger = self._convert_setting_descriptor_to_trigger_dto(settings),
@@ -102,11 +277,13 @@ class FileParserRAW(FileParser):
             direction = "rising" if bool(s_header.s_triggerCode & CBinaryIn.trg_Rising) else "falling",
             bitmask = s_header.s_TriggerMask,
             external = "disabled" if bool(s_header.s_triggerCode == CBinaryIn.trg_ExtTrigDisabled) else "acq", #inconsistency with XML, XML has one mode more.
-            thresholds= {i: settings.s_TriggerLevels[i] for i in range(s_header.s_nChannels)},
+            thresholds= {i: int(settings.s_TriggerLevels[i]) for i in range(s_header.s_nChannels)},
         )
 
 
-    def _convert_waveform_data_to_tmp_dto(self, waveform: WaveformData) -> None:
+    def _convert_waveform_data_to_tmp_dto(self, waveform: WaveformData) -> EventDTO:
+        # s_trace is a uint16 view over the WaveformData's own buffer; every
+        # record is read into a fresh WaveformData so it can be kept without copying.
         s_header = waveform.s_header
         if not s_header.s_eventId in self._tmpEvent.keys():
             self._tmpEvent[s_header.s_eventId] = EventDTO(
@@ -116,10 +293,11 @@ class FileParserRAW(FileParser):
                 time_stamp = s_header.s_triggerTag,
                 clock_time= datetime.fromtimestamp(s_header.s_todStamp),
                 trigger_shift= s_header.s_shift,
-                trace = {s_header.s_channel: waveform.s_trace.copy()}
+                trace = {s_header.s_channel: waveform.s_trace}
             )
         else:
-            self._tmpEvent[s_header.s_eventId].trace[s_header.s_channel] = waveform.s_trace.copy()
+            self._tmpEvent[s_header.s_eventId].trace[s_header.s_channel] = waveform.s_trace
+        return self._tmpEvent[s_header.s_eventId]
         
 
     def _sanitize_control_int(self, controlInt: int, record_type: RecordType = RecordType.HEADER):
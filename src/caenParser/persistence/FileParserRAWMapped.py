@@ -0,0 +1,345 @@
+from caen_cpp import CBinaryMap, CBinaryOut, DigitizerDescriptor, DigitizerSettings
+from .FileParserRAW import FileParserRAW, RecordType
+from .SidecarIndex import SidecarIndex
+from .Selection import Selection
+from .Accumulators import Accumulator, accumulate
+from .dtos import EventDTO, RunDTO
+from caenParser.utils.Profiler import profiler
+from typing import Iterator, Optional, Sequence
+from datetime import datetime
+import numpy as np
+import os
+import sys
+
+
+class FileParserRAWMapped(FileParserRAW):
+    """
+    RAW parser backed by a memory mapping of the whole file.
+
+    Opening the file walks it once in C++ and keeps a record table (type,
+    event id, digitizer, settings, channel, time tags and byte offset of
+    every record). Only the digitizer and settings records are decoded by
+    parse(); waveforms stay in the mapping and are handed out as read-only
+    uint16 views, so any event can be fetched in O(1) without copying the
+    file into Python memory.
+
+    With use_index=True the record table, event ids and DTOs are taken from
+    a SidecarIndex next to the file when it is up to date, and the sidecar is
+    (re)written after a scan otherwise.
+
+    A selection (see Selection) restricts the events, metadata and traces
+    handed out to the waveform records it accepts, by masking the record
+    table; the rejected traces are never touched.
+    """
+
+    def __init__(self, use_index: bool = False, selection: Optional[Selection] = None):
+        super().__init__(selection)
+        self._fileObj: CBinaryMap = None
+        self._records: Optional[np.ndarray] = None
+        self._event_ids: list[int] = []
+        self._use_index = use_index
+        self._index: Optional[SidecarIndex] = None
+
+    @profiler.timed("FileParserRAWMapped.open")
+    def open(self, file_path: str):
+        self._file_path = file_path
+        self._index = SidecarIndex.load(file_path) if self._use_index else None
+        try:
+            if self._index is not None:
+                self._fileObj = CBinaryMap(file_path, False)
+                try:
+                    self._fileObj.setRecords(self._index.records)
+                except ValueError:
+                    # The index does not describe this file after all, rebuild it
+                    self._index = None
+                    self._fileObj.scan()
+            else:
+                self._fileObj = CBinaryMap(file_path)
+        except Exception as e:
+            raise ValueError(f"Error opening RAW file: {e}")
+        self._records = self._fileObj.records()
+        profiler.count("FileParserRAWMapped.open", bytes_mapped=self._fileObj.fileSize(), records=len(self._records),
+                       from_index=int(self._index is not None))
+
+    @profiler.timed("FileParserRAWMapped.parse")
+    def parse(self) -> None:
+        if self._fileObj is None:
+            raise ValueError("File not opened")
+
+        if self._index is not None:
+            self._digitizers = [d.copy() for d in self._index.digitizers]
+            self._settings = [s.copy() for s in self._index.settings]
+            self._event_ids = self._index.event_ids.tolist()
+            if self._selection is not None:
+                self._event_ids = self._ordered_event_ids(self._records[self._waveform_records()]).tolist()
+            return
+
+        types = self._records["s_type"]
+        for i in np.flatnonzero(types == RecordType.DIGITIZER_DESCRIPTION.value):
+            desc = DigitizerDescriptor()
+            self._fileObj.readDigitizerDescriptor(int(i), desc)
+            self._digitizers.append(self._convert_digitizer_descriptor_to_dto(desc))
+
+        for i in np.flatnonzero(types == RecordType.DIGITIZER_SETTINGS.value):
+            settings = DigitizerSettings()
+            self._fileObj.readDigitizerSettings(int(i), settings)
+            self._settings.append(self._convert_digitizer_settings_to_dto(settings))
+
+        # Event ids in order of first appearance in the file
+        ordered_ids = self._ordered_event_ids(self._records[types == RecordType.WAVEFORM_DATA.value])
+        self._event_ids = ordered_ids.tolist()
+
+        if self._use_index:
+            try:
+                SidecarIndex(np.array(self._records), ordered_ids, self._digitizers, self._settings).save(self._file_path)
+            except OSError as e:
+                print(f"WARNING: Could not write index for {self._file_path}: {e}", file=sys.stderr)
+
+        if self._selection is not None:
+            # The index always describes the whole file
+            self._event_ids = self._ordered_event_ids(self._records[self._waveform_records()]).tolist()
+
+    def _waveform_records(self) -> np.ndarray:
+        # Positions of the waveform records in the record table, restricted to the selection
+        if self._selection is None:
+            return np.flatnonzero(self._records["s_type"] == RecordType.WAVEFORM_DATA.value)
+        return np.flatnonzero(self._selection.mask(self._records))
+
+    def _selected(self, record: int) -> bool:
+        return self._selection is None or bool(self._selection.mask(self._records[record:record + 1])[0])
+
+    @staticmethod
+    def _ordered_event_ids(entries: np.ndarray) -> np.ndarray:
+        ids, first = np.unique(entries["s_eventId"], return_index=True)
+        return ids[np.argsort(first, kind="stable")]
+
+    def get_event(self, event_id: int) -> Optional[EventDTO]:
+        """
+        Builds the EventDTO of one event straight from the record table.
+        The traces are views into the mapping; nothing is copied.
+        """
+        records = self._fileObj.eventRecords(event_id)
+        records = [r for r in records if self._selected(r)]
+        if not records:
+            return None
+
+        entry = self._records[records[0]]
+        return EventDTO(
+            id = int(entry["s_eventId"]),
+            settings_id = int(entry["s_sid"]),
+            digitizer_id = str(entry["s_did"]),
+            time_stamp = int(entry["s_triggerTag"]),
+            clock_time = datetime.fromtimestamp(int(entry["s_todStamp"])),
+            trigger_shift = int(entry["s_shift"]),
+            trace = {int(self._records[r]["s_channel"]): self._fileObj.trace(r) for r in records}
+        )
+
+    def iter_events(self, max_pending: Optional[int] = 64,
+                    accumulators: Optional[Sequence[Accumulator]] = None) -> Iterator[EventDTO]:
+        """
+        Yields every event in file order, built by get_event from the record
+        table, so all the records of an event id are always together and
+        max_pending is not needed. Every event is fed to accumulators before
+        it is yielded. Call parse() first.
+        """
+        if self._fileObj is None:
+            raise ValueError("File not opened")
+        return accumulate((self.get_event(i) for i in self._event_ids), accumulators)
+
+    def follow(self, *args, **kwargs):
+        raise ValueError("A memory mapping does not see the file grow, follow it with FileParserRAW")
+
+    def afollow(self, *args, **kwargs):
+        raise ValueError("A memory mapping does not see the file grow, follow it with FileParserRAW")
+
+    def iter_event_headers(self):
+        """
+        Yields (EventDTO, channels) for every event in file order. The DTOs
+        carry the event metadata only (their trace is empty) and channels
+        lists the channels recorded for the event; no trace is touched.
+        """
+        waveforms = self._records[self._waveform_records()]
+        order = np.argsort(waveforms["s_eventId"], kind="stable")
+        grouped = waveforms[order]
+        ids, starts = np.unique(grouped["s_eventId"], return_index=True)
+        channels = dict(zip(ids.tolist(), np.split(grouped["s_channel"], starts[1:])))
+        firsts = dict(zip(ids.tolist(), grouped[starts]))
+
+        for event_id in self._event_ids:
+            entry = firsts[event_id]
+            yield EventDTO(
+                id = event_id,
+                settings_id = int(entry["s_sid"]),
+                digitizer_id = str(entry["s_did"]),
+                time_stamp = int(entry["s_triggerTag"]),
+                clock_time = datetime.fromtimestamp(int(entry["s_todStamp"])),
+                trigger_shift = int(entry["s_shift"]),
+                trace = {}
+            ), channels[event_id].tolist()
+
+    @profiler.timed("FileParserRAWMapped.load_run")
+    def load_run(self, workers: int = 1) -> RunDTO:
+        """
+        Builds the whole run as a RunDTO straight from the record table. The
+        event columns are computed with NumPy and every trace block is
+        preallocated; the waveform records are then split into workers
+        contiguous ranges of the file, which are copied into the blocks
+        concurrently by CBinaryMap.gatherTraces with the GIL released.
+        Events whose records straddle two ranges need no stitching: every
+        record already knows its destination row.
+        """
+        waveform = self._waveform_records().astype(np.uint32)
+        entries = self._records[waveform]
+
+        # Event of every waveform record, events numbered in order of first appearance
+        ids, first, inverse = np.unique(entries["s_eventId"], return_index=True, return_inverse=True)
+        order = np.argsort(first, kind="stable")
+        event_of = np.empty(len(ids), dtype=np.int64)
+        event_of[order] = np.arange(len(ids))
+        record_event = event_of[inverse.ravel()]
+        firsts = entries[first[order]]
+
+        digitizer_ids, digitizer_codes = np.unique(firsts["s_did"], return_inverse=True)
+
+        # One preallocated block per (settings id, channel, samples)
+        keys = np.stack([entries["s_sid"], entries["s_channel"], entries["s_nSamples"]], axis=1).astype(np.int64)
+        unique_keys, block_of = np.unique(keys, axis=0, return_inverse=True)
+        block_of = block_of.ravel()
+        blocks = []
+        for b, (sid, channel, samples) in enumerate(unique_keys.tolist()):
+            in_block = np.flatnonzero(block_of == b)
+            events = record_event[in_block]
+            by_event = np.argsort(events, kind="stable")
+            rows = np.empty(len(in_block), dtype=np.int64)
+            rows[by_event] = np.arange(len(in_block))
+            out = np.empty((len(in_block), samples), dtype=np.uint16)
+            blocks.append(((sid, channel, samples), waveform[in_block], rows, events[by_event], out))
+
+        # Contiguous record ranges, each worker copies its range of every block
+        workers = max(1, min(workers, len(waveform)))
+        cuts = np.append(waveform[np.linspace(0, len(waveform), workers, endpoint=False).astype(np.int64)],
+                         np.iinfo(np.uint32).max) if len(waveform) else np.zeros(2, dtype=np.uint32)
+
+        def gather(w: int):
+            for _, records, rows, _, out in blocks:
+                start, stop = np.searchsorted(records, cuts[w:w + 2])
+                if stop > start:
+                    self._fileObj.gatherTraces(records[start:stop], rows[start:stop], out)
+
+        if workers > 1:
+            from concurrent.futures import ThreadPoolExecutor  # Kept out of the package import time
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(gather, range(workers)))
+        else:
+            gather(0)
+        if profiler.enabled:
+            profiler.count("FileParserRAWMapped.load_run", events=len(ids), traces=len(waveform),
+                           bytes_copied=sum(out.nbytes for *_, out in blocks))
+
+        return RunDTO(
+            digitizers=self.digitizers,
+            settings=self.settings,
+            event_ids=firsts["s_eventId"].astype(np.int64),
+            settings_ids=firsts["s_sid"].astype(np.int64),
+            digitizer_ids=[str(d) for d in digitizer_ids.tolist()],
+            digitizer_codes=digitizer_codes.ravel().astype(np.int32),
+            time_stamps=firsts["s_triggerTag"].astype(np.int64),
+            clock_times=firsts["s_todStamp"].astype(np.int64),
+            trigger_shifts=firsts["s_shift"].astype(np.int64),
+            traces={key: (events, out) for key, _, _, events, out in blocks}
+        )
+
+    def summarize(self, accumulators: Sequence[Accumulator], records_per_chunk: int = 4096) -> Sequence[Accumulator]:
+        """
+        Feeds the whole file to accumulators straight from the record table:
+        the waveform records of every (channel, samples) group are copied by
+        gatherTraces, in file order, into one reused buffer of
+        records_per_chunk traces and handed over as a batch, so the traces
+        are never all in memory. Call parse() first.
+        """
+        waveform = self._waveform_records().astype(np.uint32)
+        entries = self._records[waveform]
+
+        keys = np.stack([entries["s_channel"], entries["s_nSamples"]], axis=1).astype(np.int64)
+        unique_keys, group_of = np.unique(keys, axis=0, return_inverse=True)
+        group_of = group_of.ravel()
+        for g, (channel, samples) in enumerate(unique_keys.tolist()):
+            in_group = np.flatnonzero(group_of == g)
+            buffer = np.empty((min(records_per_chunk, len(in_group)), samples), dtype=np.uint16)
+            for start in range(0, len(in_group), records_per_chunk):
+                chunk = in_group[start:start + records_per_chunk]
+                out = buffer[:len(chunk)]
+                self._fileObj.gatherTraces(waveform[chunk], np.arange(len(chunk), dtype=np.int64), out)
+                times = entries["s_todStamp"][chunk].astype(np.float64)
+                for accumulator in accumulators:
+                    accumulator.update_batch(channel, times, out)
+
+        # One end of event per event id, at the time of its first record
+        _, first = np.unique(entries["s_eventId"], return_index=True)
+        times = entries["s_todStamp"][np.sort(first)].astype(np.float64)
+        for accumulator in accumulators:
+            accumulator.end_events(times)
+        return accumulators
+
+    def skim(self, out_path: str) -> int:
+        """
+        Writes the selected waveform records to a new RAW file at out_path,
+        together with the digitizer descriptor and settings records they
+        reference, all in their original order. Records are copied byte for
+        byte from the mapping by CBinaryOut.copyRecords, contiguous ones in
+        a single write; nothing is decoded. The skim reads back with any RAW
+        parser. Returns the number of waveform records written.
+        """
+        if self._fileObj is None:
+            raise ValueError("File not opened")
+        records = self._records
+        types = records["s_type"]
+        waveform = self._waveform_records()
+        kept = records[waveform]
+
+        # Settings referenced by a kept waveform, digitizers referenced by either
+        settings_keys = np.unique(np.stack([kept["s_did"], kept["s_sid"]], axis=1).astype(np.int64), axis=0)
+        settings = np.flatnonzero(types == RecordType.DIGITIZER_SETTINGS.value)
+        pairs = np.stack([records["s_did"][settings], records["s_sid"][settings]], axis=1).astype(np.int64)
+        settings = settings[(pairs[:, None, :] == settings_keys[None, :, :]).all(axis=2).any(axis=1)]
+        digitizers = np.flatnonzero((types == RecordType.DIGITIZER_DESCRIPTION.value) &
+                                    np.isin(records["s_did"], np.union1d(kept["s_did"], records["s_did"][settings])))
+
+        if os.path.exists(out_path) and os.path.samefile(out_path, self._file_path):
+            # Truncating the mapped file would pull the records from under the copy
+            raise ValueError(f"Cannot skim a file onto itself: {out_path}")
+        try:
+            out = CBinaryOut(out_path)
+            try:
+                out.copyRecords(self._fileObj, np.sort(np.concatenate([digitizers, settings, waveform])).astype(np.uint32))
+            finally:
+                out.close()
+        except (RuntimeError, OSError) as e:
+            raise ValueError(f"Error writing RAW file: {e}")
+        return len(waveform)
+
+    def get_trace(self, event_id: int, channel: int) -> Optional[np.ndarray]:
+        for r in self._fileObj.eventRecords(event_id):
+            if self._records[r]["s_channel"] == channel and self._selected(r):
+                return self._fileObj.trace(r)
+        return None
+
+    def close(self):
+        super().close()
+        self._records = None
+        self._event_ids = []
+        self._index = None
+
+    @property
+    def records(self) -> np.ndarray:
+        return self._records
+
+    @property
+    def event_ids(self) -> list[int]:
+        return list(self._event_ids)
+
+    @property
+    @profiler.timed("FileParserRAWMapped.events")
+    def events(self):
+        # Traces are read-only views into the mapping, no deep copy needed
+        return [self.get_event(i) for i in self._event_ids]
@@ -1,34 +1,117 @@
 import xml.etree.ElementTree as ET
-from typing import Optional, cast
-import re 
+from typing import Iterator, Optional, Sequence, cast
+import warnings
 from datetime import datetime
+import numpy as np
 
 from .FileParser import FileParser
 from .dtos import DigitizerDTO, SettingsDTO, EventDTO, TriggerDTO
-
+from .Accumulators import Accumulator, accumulate
+from .Selection import Selection
+from caenParser.utils.Profiler import profiler
+
+
+
+def decode_samples(text: Optional[str]) -> np.ndarray:
+    """
+    Decodes the whitespace separated body of a <trace> element into a uint16
+    array in a single native pass, without building a Python int per sample.
+    A sample outside 0..65535 raises a ValueError.
+
+    :param text: Trace body, e.g. "8144 8142\n8148".
+    :return: uint16 NumPy array with the samples.
+    """
+    if text is None or not text.strip():
+        return np.empty(0, dtype=np.uint16)
+    with warnings.catch_warnings():
+        # numpy reports unparsable tokens as a DeprecationWarning and truncates
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            # Parsed wide first: a uint16 parse would wrap samples above 65535
+            samples = np.fromstring(text, dtype=np.int64, sep=" ")
+        except (ValueError, DeprecationWarning) as e:
+            raise ValueError(f"Invalid trace body: {e}")
+    bad = np.flatnonzero((samples < 0) | (samples > 0xFFFF))
+    if len(bad):
+        raise ValueError(f"Invalid trace body: sample {text.split()[bad[0]]!r} is out of the 0..65535 range")
+    return samples.astype(np.uint16)
 
 
 class FileParserXML(FileParser):
 
-    def __init__(self):
+    def __init__(self, selection: Optional[Selection] = None):
+        # XML events can only be filtered once decoded (see Selection.filter)
         super().__init__()
+        self._selection = selection
 
     
     def open(self, file_path):
+        # The file is read incrementally by iter_events, nothing is parsed here
         try:
-            self._fileObj = ET.parse(file_path)
-        except ET.ParseError as e:
+            self._fileObj = open(file_path, "rb")
+        except OSError as e:
             raise ValueError(f"Error opening XML file: {e}")
         
 
+    @profiler.timed("FileParserXML.parse")
     def parse(self) -> None:
         
         if self._fileObj is None:
             raise ValueError("File not opened")
         
-        root = self._fileObj.getroot()
-        self.traverse_tree(root)
-        
+        self._events = list(self.iter_events())
+        profiler.count("FileParserXML.parse", bytes_read=self._fileObj.tell(), events=len(self._events))
+
+    def iter_events(self, accumulators: Optional[Sequence[Accumulator]] = None) -> Iterator[EventDTO]:
+        """
+        Streams the file with iterparse and yields each EventDTO as soon as
+        its </event> has been read. Every top-level element is dropped right
+        after conversion, so memory stays flat whatever the file size.
+        Digitizers and settings are collected as by parse(). Every event is
+        fed to accumulators (see Accumulators) before it is yielded.
+        """
+        if self._fileObj is None:
+            raise ValueError("File not opened")
+        events = self._stream_events()
+        if self._selection is not None:
+            events = self._selection.filter(events)
+        return accumulate(events, accumulators)
+
+    def _stream_events(self) -> Iterator[EventDTO]:
+        depth = 0
+        root = None
+        try:
+            for action, node in ET.iterparse(self._fileObj, events=("start", "end")):
+                if action == "start":
+                    if root is None:
+                        root = node
+                        assert root.tag == "caendigitizer"
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                if node.tag == "digitizer":
+                    self._digitizers.append(self._traverse_digitizer(node))
+                elif node.tag == "settings":
+                    self._settings.append(self._traverse_settings(node))
+                elif node.tag == "event":
+                    event = self._traverse_event(node)
+                    root.clear()
+                    yield event
+                    continue
+                else:
+                    raise ValueError(f"Unknown tag: {node.tag}")
+                root.clear()
+        except ET.ParseError as e:
+            raise ValueError(f"Error parsing XML file: {e}")
+
+    def close(self):
+        if self._fileObj is not None:
+            self._fileObj.close()
+        super().close()
     
     def traverse_tree(self, node: ET.Element) -> None:
         """
@@ -120,9 +203,7 @@ class FileParserXML(FileParser):
             if key is None:
                 raise ValueError("Trace channel attribute is missing")
             
-            trace_body =  re.split(r"[ \n]", trace.text)
-            trace_data = [int(x) for x in trace_body if x.isdigit()]
-            traces[key] = trace_data
+            traces[key] = decode_samples(trace.text)
         
 
         return EventDTO(
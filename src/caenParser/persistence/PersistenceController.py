@@ -1,5 +1,53 @@
-from .FileParserXML import FileParserXML
+from .FileParser import FileParser
 from .FileParserRAW import FileParserRAW
+from .Accumulators import Accumulator, merge_accumulators
+from .Selection import Selection
+from .dtos import RunDTO
+from caenParser.utils.Profiler import profiler
+from caenParser.utils.ReadAhead import Source, is_plain_file, strip_compression
+from itertools import repeat
+from typing import Optional, Sequence
+import os
+import sys
+
+
+def _is_raw(file_path: Source) -> bool:
+    # Compressed runs (run12.bin.gz) and streams ("-" for stdin, file objects) are read as RAW
+    return not isinstance(file_path, str) or file_path == '-' or strip_compression(file_path).endswith('.bin')
+
+
+def _raw_parser(file_path: Source, mapped: bool, use_index: bool = False,
+                selection: Optional[Selection] = None) -> FileParserRAW:
+    if not (mapped or use_index):
+        return FileParserRAW(selection)
+    if not is_plain_file(file_path):
+        raise ValueError(f"Memory-mapped reading needs an uncompressed file on disk: {file_path}")
+    from .FileParserRAWMapped import FileParserRAWMapped  # Kept out of the package import time
+    return FileParserRAWMapped(use_index, selection)
+
+
+def _xml_parser(selection: Optional[Selection] = None) -> FileParser:
+    from .FileParserXML import FileParserXML  # Kept out of the package import time
+    return FileParserXML(selection)
+
+
+def _summarize(file_path: str, accumulators: Sequence[Accumulator], mapped: bool,
+               selection: Optional[Selection]) -> Sequence[Accumulator]:
+    # Runs in the worker processes of PersistenceController.summarize
+    from .FileParserRAWMapped import FileParserRAWMapped  # Kept out of the package import time
+    if file_path.endswith('.xml'):
+        parser = _xml_parser(selection)
+    elif _is_raw(file_path):
+        parser = _raw_parser(file_path, mapped, selection=selection)
+    else:
+        raise ValueError(f"Unsupported file type: {file_path}")
+    parser.open(file_path)
+    try:
+        if isinstance(parser, FileParserRAWMapped):
+            parser.parse()
+        return parser.summarize(accumulators)
+    finally:
+        parser.close()
 
 
 class PersistenceController:
@@ -7,21 +55,171 @@ class PersistenceController:
     def __init__(self):
         pass
 
-    def load(self, file_path: str):
+    @profiler.timed("PersistenceController.load")
+    def load(self, file_path: Source, mapped: bool = False, use_index: bool = False,
+             selection: Optional[Selection] = None):
+        """
+        Parses a whole file and returns [digitizers, settings, events] DTOs.
+        With mapped=True, .bin files are read through a memory mapping and
+        the event traces are read-only views into it instead of copies.
+        use_index=True implies mapped and keeps a sidecar index next to the
+        file (see SidecarIndex) so the next load skips the scan.
+        With a selection only the channels, events, settings and time range
+        it accepts are loaded (see Selection).
+        Compressed RAW files (.bin.gz, .bin.xz, .bin.bz2), "-" for stdin and
+        binary file objects are streamed (see FileParserRAW.open); they can
+        not be memory-mapped.
+        """
 
-        if file_path.endswith('.xml'):
-            parser = FileParserXML()
-        elif file_path.endswith('.bin'):
-            parser = FileParserRAW()
+        if isinstance(file_path, str) and file_path.endswith('.xml'):
+            parser = _xml_parser(selection)
+        elif _is_raw(file_path):
+            parser = _raw_parser(file_path, mapped, use_index, selection)
         parser.open(file_path)
         parser.parse()
         info = [parser.digitizers, parser.settings, parser.events]
         parser.close()
         return info
-    
-    
 
-    
-    
-    
-    
\ No newline at end of file
+    @profiler.timed("PersistenceController.load_run")
+    def load_run(self, file_path: Source, mapped: bool = False, workers: int = 1, cache: bool = False,
+                 selection: Optional[Selection] = None) -> RunDTO:
+        """
+        Parses a whole file like load but returns it as a single column-wise
+        RunDTO. Events are streamed into the columns, so no list of EventDTOs
+        is kept. Mapped .bin files are converted from the record table, their
+        traces copied by workers threads (see FileParserRAWMapped.load_run).
+
+        With cache=True an up-to-date RunCache of the file is reopened instead
+        of parsing it, and one is written after parsing otherwise; the file
+        is hashed for the cache on a second thread while it is parsed. The
+        cache holds whole runs, so it cannot be combined with a selection.
+        Only .bin and .xml runs are cached: WaveDump2 files are not read
+        here, and WaveDump2BinParser.as_array maps them directly.
+        """
+        if cache and selection is not None:
+            raise ValueError("A cached run cannot be loaded with a selection")
+        if cache and (not isinstance(file_path, str) or file_path == '-'):
+            raise ValueError("A stream cannot be cached")
+        if cache:
+            from .RunCache import RunCache  # Kept out of the package import time
+            run = RunCache.load(file_path)
+            if run is not None:
+                return run
+            from concurrent.futures import ThreadPoolExecutor  # Kept out of the package import time
+            pool = ThreadPoolExecutor(max_workers=1)
+            try:
+                stamp = pool.submit(RunCache.stamp, file_path)
+                run = self.load_run(file_path, mapped=mapped, workers=workers)
+                stamp = stamp.result()
+            finally:
+                pool.shutdown(wait=False)
+            try:
+                RunCache(run).save(file_path, stamp)
+            except OSError as e:
+                print(f"WARNING: Could not write cache for {file_path}: {e}", file=sys.stderr)
+            return run
+
+        if isinstance(file_path, str) and file_path.endswith('.xml'):
+            parser = _xml_parser(selection)
+        elif _is_raw(file_path):
+            parser = _raw_parser(file_path, mapped, selection=selection)
+        else:
+            raise ValueError(f"Unsupported file type: {file_path}")
+        from .FileParserRAWMapped import FileParserRAWMapped  # Kept out of the package import time
+        parser.open(file_path)
+        try:
+            if isinstance(parser, FileParserRAWMapped):
+                parser.parse()
+                run = parser.load_run(workers)
+            else:
+                if isinstance(parser, FileParserRAW):
+                    events = parser.iter_events(max_pending=None)
+                else:
+                    events = parser.iter_events()
+                run = RunDTO.from_events([], [], events)
+                # Digitizers and settings are only known once the events are read
+                run.digitizers = parser.digitizers
+                run.settings = parser.settings
+        finally:
+            parser.close()
+        return run
+
+    def open(self, file_path: str, use_index: bool = False,
+             selection: Optional[Selection] = None) -> "FileParserRAWMapped":
+        """
+        Opens a .bin file for on-demand access and returns the parsed, still
+        open FileParserRAWMapped. Digitizers and settings are decoded; event
+        traces are only read when asked for through the parser.
+        """
+        if not file_path.endswith('.bin'):
+            raise ValueError(f"On-demand loading is only supported for .bin files: {file_path}")
+        from .FileParserRAWMapped import FileParserRAWMapped  # Kept out of the package import time
+        parser = FileParserRAWMapped(use_index, selection)
+        parser.open(file_path)
+        parser.parse()
+        return parser
+
+    def skim(self, file_path: str, out_path: str, selection: Optional[Selection] = None,
+             use_index: bool = False) -> int:
+        """
+        Cuts the records a selection accepts out of a .bin file into a new
+        .bin file at out_path, along with the digitizer and settings records
+        they reference, copying them byte for byte (see
+        FileParserRAWMapped.skim). Returns the number of waveform records
+        written.
+        """
+        if not file_path.endswith('.bin'):
+            raise ValueError(f"Skimming is only supported for .bin files: {file_path}")
+        parser = self.open(file_path, use_index=use_index, selection=selection)
+        try:
+            return parser.skim(out_path)
+        finally:
+            parser.close()
+
+    def export(self, file_path: str, out_path: str, run: Optional[str] = None, **kwargs) -> int:
+        """
+        Streams the events of a .bin or .xml file into a Parquet/Arrow dataset
+        (see ArrowEventWriter for kwargs) without loading the whole file and
+        returns the number of rows written. run defaults to the file name
+        without extension.
+        """
+        if file_path.endswith('.xml'):
+            parser = _xml_parser()
+        elif _is_raw(file_path):
+            parser = FileParserRAW()
+        else:
+            raise ValueError(f"Unsupported file type: {file_path}")
+        from .ArrowExport import export_events  # Kept out of the package import time
+        if run is None:
+            run = os.path.splitext(os.path.basename(strip_compression(file_path)))[0]
+        parser.open(file_path)
+        try:
+            return export_events(parser.iter_events(), out_path, run=run, **kwargs)
+        finally:
+            parser.close()
+
+
+    def summarize(self, file_paths: Sequence[str], accumulators: Sequence[Accumulator], workers: int = 1,
+                  mapped: bool = False, selection: Optional[Selection] = None) -> Sequence[Accumulator]:
+        """
+        Summarises one or several .bin/.xml files in a single pass each,
+        without keeping any trace, and returns accumulators with every file
+        merged in. Each file is fed to empty copies of the accumulators
+        (see Accumulator.empty), in a pool of worker processes when
+        workers > 1; mapped .bin files are fed in batches from the record
+        table (see FileParserRAWMapped.summarize). A selection restricts
+        the records summarised.
+        """
+        file_paths = [file_paths] if isinstance(file_paths, str) else list(file_paths)
+        workers = min(workers, len(file_paths))
+        fresh = [[a.empty() for a in accumulators] for _ in file_paths]
+        if workers <= 1:
+            merged = merge_accumulators(map(_summarize, file_paths, fresh, repeat(mapped), repeat(selection)))
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # Kept out of the package import time
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                merged = merge_accumulators(pool.map(_summarize, file_paths, fresh, repeat(mapped), repeat(selection)))
+        for target, source in zip(accumulators, merged):
+            target.merge(source)
+        return accumulators
\ No newline at end of file
@@ -0,0 +1,142 @@
+from .dtos import DigitizerDTO, SettingsDTO, RunDTO
+from typing import Optional
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+
+
+class RunCache:
+    """
+    Converted copy of a run kept next to it (``run.bin`` -> ``run.bin.cache/``).
+
+    A RunDTO is written as one .npy file per event column and two per trace
+    block (event indices and the events x samples samples), plus meta.json
+    with the digitizers, settings, block keys and a stamp of the source
+    file. Reopening memory-maps the arrays, so nothing but the metadata is
+    read until traces are used.
+
+    The cache is stale once the source changes size. When only its mtime
+    changed (copied or touched file) the content hash saved with the cache
+    decides.
+    """
+
+    VERSION = 1
+    SUFFIX = ".cache"
+    COLUMNS = ["event_ids", "settings_ids", "digitizer_codes", "time_stamps", "clock_times", "trigger_shifts"]
+
+    def __init__(self, run: RunDTO):
+        self.run = run
+
+    @classmethod
+    def path_for(cls, file_path: str) -> str:
+        return file_path + cls.SUFFIX
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional[RunDTO]:
+        """
+        Reopens the cache of file_path with every array memory-mapped.
+        Returns None when there is none, when it is stale or unreadable.
+        """
+        cache_path = cls.path_for(file_path)
+        try:
+            with open(os.path.join(cache_path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != cls.VERSION or not cls._is_fresh(file_path, meta, cache_path):
+                return None
+
+            def array(name: str) -> np.ndarray:
+                return np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+            columns = {name: array(name) for name in cls.COLUMNS}
+            traces = {
+                tuple(key): (array(f"rows_{i}"), array(f"trace_{i}"))
+                for i, key in enumerate(meta["blocks"])
+            }
+            return RunDTO(
+                digitizers=[DigitizerDTO.from_dict(d) for d in meta["digitizers"]],
+                settings=[SettingsDTO.from_dict(s) for s in meta["settings"]],
+                digitizer_ids=meta["digitizer_ids"],
+                traces=traces,
+                **columns
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, file_path: str, stamp: Optional[dict] = None) -> None:
+        """
+        Writes the cache of file_path. It is built in a temporary directory
+        and moved into place, so readers never see a half-written cache.
+        stamp is the stamp() of the source, taken before it was parsed (a
+        file changed meanwhile then leaves a stale cache); it is computed
+        here when not given.
+        """
+        run = self.run
+        meta = {
+            "version": self.VERSION,
+            "source": stamp if stamp is not None else self.stamp(file_path),
+            "digitizers": [d.to_dict() for d in run.digitizers],
+            "settings": [s.to_dict() for s in run.settings],
+            "digitizer_ids": list(run.digitizer_ids),
+            "blocks": [list(key) for key in run.traces.keys()],
+        }
+        cache_path = self.path_for(file_path)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(tmp_path)
+            for name in self.COLUMNS:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(getattr(run, name)))
+            for i, (rows, data) in enumerate(run.traces.values()):
+                np.save(os.path.join(tmp_path, f"rows_{i}.npy"), np.ascontiguousarray(rows))
+                np.save(os.path.join(tmp_path, f"trace_{i}.npy"), np.ascontiguousarray(data))
+            # meta.json last: a directory without it is never taken for a cache
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            if os.path.exists(cache_path):
+                shutil.rmtree(cache_path)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+
+    @classmethod
+    def _is_fresh(cls, file_path: str, meta: dict, cache_path: str) -> bool:
+        source = meta["source"]
+        stamp = cls._source_stamp(file_path)
+        if stamp["size"] != source["size"]:
+            return False
+        if stamp["mtime_ns"] == source["mtime_ns"]:
+            return True
+        if cls._content_hash(file_path) != source["hash"]:
+            return False
+        # Same content under a new mtime: remember it so the next open skips the hash
+        source["mtime_ns"] = stamp["mtime_ns"]
+        try:
+            with open(os.path.join(cache_path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+        return True
+
+    @classmethod
+    def stamp(cls, file_path: str) -> dict:
+        """
+        Size, mtime and content hash of file_path, as saved with its cache.
+        Hashing reads the whole file, so load_run does it on a second thread
+        while the file is parsed.
+        """
+        return {**cls._source_stamp(file_path), "hash": cls._content_hash(file_path)}
+
+    @staticmethod
+    def _source_stamp(file_path: str) -> dict:
+        st = os.stat(file_path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    @staticmethod
+    def _content_hash(file_path: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -0,0 +1,107 @@
+from caen_cpp import CBinaryIn, Selection as CSelection
+from .dtos import EventDTO
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Union
+import math
+import numpy as np
+
+Time = Union[float, datetime]
+
+
+class Selection:
+    """
+    Subset of the waveform records of a RAW file: only the given channels,
+    event ids, settings ids and clock time range (start <= time < stop, in
+    epoch seconds or datetimes). None selects everything on that field.
+    event_ids may be any iterable; a range of step 1 is kept as a bound
+    pair instead of a list.
+
+    FileParserRAW evaluates it in C++ on every WaveformFixedHeader and
+    seeks over rejected records, and FileParserRAWMapped applies it to its
+    record table (see mask); digitizer and settings records are always read.
+    """
+
+    def __init__(self, channels: Optional[Iterable[int]] = None, event_ids: Optional[Iterable[int]] = None,
+                 settings_ids: Optional[Iterable[int]] = None, time_range: Optional[tuple[Time, Time]] = None):
+        self.channels = None if channels is None else sorted(set(int(c) for c in channels))
+        self.settings_ids = None if settings_ids is None else sorted(set(int(s) for s in settings_ids))
+        self.event_range: Optional[tuple[int, int]] = None  # Inclusive
+        self.event_ids: Optional[list[int]] = None
+        if isinstance(event_ids, range) and event_ids.step == 1:
+            self.event_range = (event_ids.start, event_ids.stop - 1)
+        elif event_ids is not None:
+            self.event_ids = sorted(set(int(e) for e in event_ids))
+        self.time_range = None
+        if time_range is not None:
+            start, stop = (t.timestamp() if isinstance(t, datetime) else float(t) for t in time_range)
+            self.time_range = (start, stop)
+        if [] in (self.channels, self.settings_ids, self.event_ids):
+            # An empty list selects nothing, whereas the native lists select everything when empty
+            self.channels = self.settings_ids = self.event_ids = None
+            self.event_range = (1, 0)
+
+    def native(self) -> CSelection:
+        """The caen_cpp.Selection evaluated by CBinaryIn.readHeader."""
+        selection = CSelection()
+        if self.channels is not None:
+            selection.s_channels = self.channels
+        if self.settings_ids is not None:
+            selection.s_settingsIds = self.settings_ids
+        if self.event_ids is not None:
+            selection.s_eventIds = self.event_ids
+        first, last = self._event_bounds()
+        selection.s_firstEvent, selection.s_lastEvent = first, last
+        first, last = self._tod_bounds()
+        selection.s_firstTod, selection.s_lastTod = first, last
+        return selection
+
+    def mask(self, records: np.ndarray) -> np.ndarray:
+        """Boolean mask of the entries of a record table (CBinaryMap.records()) that are selected waveforms."""
+        keep = records["s_type"] == CBinaryIn.tp_TraceData
+        first, last = self._event_bounds()
+        keep &= (records["s_eventId"] >= first) & (records["s_eventId"] <= last)
+        first, last = self._tod_bounds()
+        keep &= (records["s_todStamp"] >= first) & (records["s_todStamp"] <= last)
+        if self.channels is not None:
+            keep &= np.isin(records["s_channel"], self.channels)
+        if self.settings_ids is not None:
+            keep &= np.isin(records["s_sid"], self.settings_ids)
+        if self.event_ids is not None:
+            keep &= np.isin(records["s_eventId"], self.event_ids)
+        return keep
+
+    def channel_mask(self, mask: int) -> int:
+        """Restricts a settings channels_mask to the selected channels."""
+        if self.channels is None:
+            return mask
+        return mask & sum(1 << c for c in self.channels)
+
+    def filter(self, events: Iterable[EventDTO]) -> Iterator[EventDTO]:
+        """Applies the selection to already decoded events (e.g. from XML), dropping unselected traces."""
+        first, last = self._event_bounds()
+        first_tod, last_tod = self._tod_bounds()
+        event_ids = None if self.event_ids is None else set(self.event_ids)
+        for event in events:
+            if not first <= event.id <= last or not first_tod <= event.clock_time.timestamp() <= last_tod:
+                continue
+            if event_ids is not None and event.id not in event_ids:
+                continue
+            if self.settings_ids is not None and event.settings_id not in self.settings_ids:
+                continue
+            if self.channels is not None:
+                event.trace = {c: t for c, t in event.trace.items() if c in self.channels}
+                if not event.trace:
+                    continue
+            yield event
+
+    def _event_bounds(self) -> tuple[int, int]:
+        first, last = self.event_range if self.event_range is not None else (0, 0xFFFFFFFF)
+        return max(first, 0), min(last, 0xFFFFFFFF)
+
+    def _tod_bounds(self) -> tuple[int, int]:
+        # Clock stamps are whole seconds: [start, stop) becomes [ceil(start), ceil(stop) - 1]
+        if self.time_range is None:
+            return 0, 0xFFFFFFFFFFFFFFFF
+        start, stop = self.time_range
+        first, last = max(math.ceil(start), 0), math.ceil(stop) - 1
+        return (first, last) if last >= first else (1, 0)
@@ -0,0 +1,78 @@
+from .dtos import DigitizerDTO, SettingsDTO
+from typing import Optional
+import numpy as np
+import json
+import os
+
+
+class SidecarIndex:
+    """
+    Record index of a RAW run saved next to it (``run.bin`` -> ``run.bin.idx``).
+
+    Holds the record table built by CBinaryMap (byte offset, type, event id,
+    channel, time tags... of every record), the event ids in file order and
+    the digitizer and settings DTOs, so reopening a run needs neither a scan
+    nor any decoding. The index remembers the size and mtime of the file it
+    was built from and is ignored once they no longer match.
+    """
+
+    VERSION = 1
+    SUFFIX = ".idx"
+
+    def __init__(self, records: np.ndarray, event_ids: np.ndarray,
+                 digitizers: list[DigitizerDTO], settings: list[SettingsDTO]):
+        self.records = records
+        self.event_ids = event_ids
+        self.digitizers = digitizers
+        self.settings = settings
+
+    @classmethod
+    def path_for(cls, file_path: str) -> str:
+        return file_path + cls.SUFFIX
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["SidecarIndex"]:
+        """
+        Reads the sidecar of file_path. Returns None when there is none, when
+        it is stale (the data file changed size or mtime) or unreadable.
+        """
+        index_path = cls.path_for(file_path)
+        try:
+            with np.load(index_path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != cls.VERSION or meta.get("source") != cls._source_stamp(file_path):
+                    return None
+                return cls(
+                    records=data["records"],
+                    event_ids=data["event_ids"],
+                    digitizers=[DigitizerDTO.from_dict(d) for d in meta["digitizers"]],
+                    settings=[SettingsDTO.from_dict(s) for s in meta["settings"]],
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the sidecar of file_path. The file is written under a temporary
+        name and renamed, so readers never see a half-written index.
+        """
+        meta = {
+            "version": self.VERSION,
+            "source": self._source_stamp(file_path),
+            "digitizers": [d.to_dict() for d in self.digitizers],
+            "settings": [s.to_dict() for s in self.settings],
+        }
+        index_path = self.path_for(file_path)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, records=self.records, event_ids=self.event_ids, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _source_stamp(file_path: str) -> dict:
+        st = os.stat(file_path)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
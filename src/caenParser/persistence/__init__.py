@@ -1,7 +1,9 @@
 from .PersistenceController import PersistenceController
+from .Selection import Selection
 from . import dtos
 
 __all__ = [
     "PersistenceController",
+    "Selection",
     "dtos"
 ]
\ No newline at end of file
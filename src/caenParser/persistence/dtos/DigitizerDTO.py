@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 
 @dataclass
@@ -36,3 +36,12 @@ class DigitizerDTO:
             windows=self.windows.copy()
         )
 
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["voltage_range"] = list(self.voltage_range)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DigitizerDTO":
+        return cls(**{**d, "voltage_range": tuple(d["voltage_range"]), "windows": list(d["windows"])})
+
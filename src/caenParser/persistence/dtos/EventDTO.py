@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime
+import numpy as np
 
 @dataclass
 class EventDTO:
@@ -9,7 +10,7 @@ class EventDTO:
     time_stamp: int
     clock_time: datetime
     trigger_shift: int
-    trace: dict[int, list[int]]  # Assuming trace is a dictionary with channel indices as keys and lists of integers as values
+    trace: dict[int, np.ndarray]  # Channel index -> uint16 samples
     
     
     def copy(self):
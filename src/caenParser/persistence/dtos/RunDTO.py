@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Iterable
+from .DigitizerDTO import DigitizerDTO
+from .SettingsDTO import SettingsDTO
+from .EventDTO import EventDTO
+import numpy as np
+
+@dataclass
+class RunDTO:
+    """
+    Whole content of one file with the events stored column-wise: one
+    array entry per event and the traces stacked per (settings id, channel,
+    samples). Cheap to pickle, used to hand parsed files between processes.
+    """
+    digitizers: list[DigitizerDTO]
+    settings: list[SettingsDTO]
+    event_ids: np.ndarray        # int64
+    settings_ids: np.ndarray     # int64
+    digitizer_ids: list[str]     # Distinct digitizer ids of the events
+    digitizer_codes: np.ndarray  # int32 index into digitizer_ids
+    time_stamps: np.ndarray      # int64
+    clock_times: np.ndarray      # int64, seconds since the epoch
+    trigger_shifts: np.ndarray   # int64
+    traces: dict[tuple[int, int, int], tuple[np.ndarray, np.ndarray]]  # (settings id, channel, samples) -> (event indices, events x samples uint16)
+
+    @classmethod
+    def from_events(cls, digitizers: list[DigitizerDTO], settings: list[SettingsDTO], events: Iterable[EventDTO]) -> "RunDTO":
+        ids, settings_ids, codes, time_stamps, clock_times, shifts = [], [], [], [], [], []
+        digitizer_code: dict[str, int] = {}
+        traces: dict[tuple[int, int, int], tuple[list[int], list[np.ndarray]]] = {}
+
+        for i, event in enumerate(events):
+            ids.append(event.id)
+            settings_ids.append(event.settings_id)
+            codes.append(digitizer_code.setdefault(event.digitizer_id, len(digitizer_code)))
+            time_stamps.append(event.time_stamp)
+            clock_times.append(int(event.clock_time.timestamp()))
+            shifts.append(event.trigger_shift)
+            for channel, samples in event.trace.items():
+                index, data = traces.setdefault((event.settings_id, channel, len(samples)), ([], []))
+                index.append(i)
+                data.append(samples)
+
+        return cls(
+            digitizers=digitizers,
+            settings=settings,
+            event_ids=np.array(ids, dtype=np.int64),
+            settings_ids=np.array(settings_ids, dtype=np.int64),
+            digitizer_ids=list(digitizer_code.keys()),
+            digitizer_codes=np.array(codes, dtype=np.int32),
+            time_stamps=np.array(time_stamps, dtype=np.int64),
+            clock_times=np.array(clock_times, dtype=np.int64),
+            trigger_shifts=np.array(shifts, dtype=np.int64),
+            traces={
+                key: (np.array(index, dtype=np.int64), np.stack(data).astype(np.uint16, copy=False))
+                for key, (index, data) in traces.items()
+            }
+        )
+
+    def __len__(self):
+        return len(self.event_ids)
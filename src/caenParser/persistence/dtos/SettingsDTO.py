@@ -21,3 +21,26 @@ class SettingsDTO:
             post_trigger=self.post_trigger,
             channels_mask=self.channels_mask
         )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "digitizer_id": self.digitizer_id,
+            "dc_offsets": {str(k): v for k, v in self.dc_offsets.items()},
+            "trigger": self.trigger.to_dict() if self.trigger else None,
+            "window": self.window,
+            "post_trigger": self.post_trigger,
+            "channels_mask": self.channels_mask,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SettingsDTO":
+        return cls(
+            id=d["id"],
+            digitizer_id=d["digitizer_id"],
+            dc_offsets={int(k): v for k, v in d["dc_offsets"].items()},
+            trigger=TriggerDTO.from_dict(d["trigger"]) if d["trigger"] else None,
+            window=d["window"],
+            post_trigger=d["post_trigger"],
+            channels_mask=d["channels_mask"],
+        )
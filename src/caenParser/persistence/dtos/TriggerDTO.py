@@ -15,4 +15,22 @@ class TriggerDTO:
             external=self.external,
             thresholds=self.thresholds.copy()  # Ensure a shallow copy of the dictionary
         )
+
+    def to_dict(self) -> dict:
+        return {
+            "direction": self.direction,
+            "bitmask": self.bitmask,
+            "external": self.external,
+            "thresholds": {str(k): v for k, v in self.thresholds.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TriggerDTO":
+        # Inverse of to_dict; JSON turns the integer channel keys into strings
+        return cls(
+            direction=d["direction"],
+            bitmask=d["bitmask"],
+            external=d["external"],
+            thresholds={int(k): v for k, v in d["thresholds"].items()},
+        )
     
\ No newline at end of file
@@ -2,10 +2,12 @@ from .DigitizerDTO import DigitizerDTO
 from .TriggerDTO import TriggerDTO
 from .EventDTO import EventDTO
 from .SettingsDTO import SettingsDTO
+from .RunDTO import RunDTO
 
 __all__ = [
     "DigitizerDTO",
     "TriggerDTO",
     "EventDTO",
-    "SettingsDTO"
+    "SettingsDTO",
+    "RunDTO"
 ]
\ No newline at end of file
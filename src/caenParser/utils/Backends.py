@@ -0,0 +1,92 @@
+from typing import Callable
+import importlib
+import importlib.util
+
+
+class Backend:
+    """
+    Optional module imported on first use. Attribute access loads it, so a
+    Backend can stand in for the module at import time (``ROOT =
+    get_backend("ROOT")``) without costing anything until it is used. A
+    missing module raises ImportError with an install hint.
+    """
+
+    def __init__(self, name: str, module: str, hint: str = ""):
+        self._name = name
+        self._module_name = module
+        self._hint = hint
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._module_name)
+            except ImportError as e:
+                raise ImportError(f"Optional backend '{self._name}' is not available ({e}). {self._hint}".strip()) from e
+        return self._module
+
+    @property
+    def available(self) -> bool:
+        """True when the module is loaded or can be found, without importing it."""
+        if self._module is not None:
+            return True
+        try:
+            return importlib.util.find_spec(self._module_name) is not None
+        except (ImportError, ValueError):
+            return False
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return f"<Backend {self._name}: {'loaded' if self.loaded else 'not loaded'}>"
+
+
+_backends: dict[str, Backend] = {}
+_adapters: dict[str, tuple[Callable, str]] = {}
+
+
+def register_backend(name: str, module: str = None, hint: str = "") -> Backend:
+    backend = _backends[name] = Backend(name, module or name, hint)
+    return backend
+
+
+def get_backend(name: str) -> Backend:
+    try:
+        return _backends[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend: {name}. Valid options are: {list(_backends)}") from None
+
+
+def adapter(name: str, requires: str) -> Callable[[Callable], Callable]:
+    """Registers the decorated function as the adapter name, which needs the backend requires."""
+    get_backend(requires)
+
+    def register(fn: Callable) -> Callable:
+        _adapters[name] = (fn, requires)
+        return fn
+    return register
+
+
+def get_adapter(name: str) -> Callable:
+    try:
+        return _adapters[name][0]
+    except KeyError:
+        raise ValueError(f"Unknown adapter: {name}. Valid options are: {list(_adapters)}") from None
+
+
+def available_adapters() -> dict[str, bool]:
+    """Adapter name -> whether its backend can be imported here."""
+    return {name: _backends[requires].available for name, (_, requires) in _adapters.items()}
+
+
+register_backend("pandas", hint="Install it with: pip install pandas")
+register_backend("ROOT", hint="Install ROOT (https://root.cern) to build TGraphs.")
+register_backend("tkinter", hint="Install Tk (e.g. sudo apt install python3-tk) or pass file paths explicitly.")
+register_backend("matplotlib", "matplotlib.pyplot", hint="Install it with: pip install matplotlib")
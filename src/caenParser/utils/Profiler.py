@@ -0,0 +1,158 @@
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, Optional
+import functools
+import os
+import sys
+import time
+
+ENV_VAR = "CAENPARSER_PROFILE"
+
+
+class Profiler:
+    """
+    Per-stage instrumentation of the load pipeline. Each named stage
+    accumulates its calls, wall and CPU time, the memory blocks it left
+    allocated (sys.getallocatedblocks) and, with memory=True, the
+    tracemalloc peak above the memory in use when it started; count() adds
+    free-form counters (bytes read, records decoded, copies made...).
+
+    Disabled, stage() hands back a shared no-op context and the hot loops
+    only test `enabled` once per file, so the pipeline runs at full speed.
+    Nested stages are reported on their own; a stage includes the time of
+    the stages inside it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self._started_tracing = False  # tracemalloc was started by enable(), not by the user
+        self._stages: dict[str, dict] = {}
+        self._open: list[list] = []   # [start peak, highest peak seen] of the running stages
+
+    def enable(self, memory: bool = False) -> None:
+        """
+        Starts collecting; memory=True also traces allocations with
+        tracemalloc (much slower), starting it unless it already runs.
+        """
+        self.enabled = True
+        self.memory = memory
+        if memory:
+            import tracemalloc  # Kept out of the package import time
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+
+    def disable(self) -> None:
+        """Stops collecting, and tracemalloc if enable() started it."""
+        if self._started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.enabled = False
+        self.memory = False
+
+    def reset(self) -> None:
+        self._stages.clear()
+
+    def stage(self, name: str):
+        """Context manager timing one run of stage name; a no-op while disabled."""
+        if not self.enabled:
+            return _NULL
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        memory = self.memory
+        if memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._open.append([current, current])
+        blocks = sys.getallocatedblocks()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self._entry(name)
+            entry["calls"] += 1
+            entry["wall_s"] += time.perf_counter() - wall
+            entry["cpu_s"] += time.process_time() - cpu
+            entry["blocks"] += sys.getallocatedblocks() - blocks
+            if memory:
+                start, highest = self._open.pop()
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(highest, peak)
+                entry["peak_bytes"] = max(entry.get("peak_bytes", 0), peak - start)
+                if self._open:
+                    self._open[-1][1] = max(self._open[-1][1], peak)
+                tracemalloc.reset_peak()
+
+    def timed(self, name: str) -> Callable:
+        """Decorator running every call of a function as stage name."""
+        def decorate(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name: str, **counters: float) -> None:
+        """Adds counters to stage name (created if needed). Callers test `enabled` first in hot paths."""
+        if not self.enabled:
+            return
+        entry = self._entry(name)
+        for key, value in counters.items():
+            entry[key] = entry.get(key, 0) + value
+
+    def _entry(self, name: str) -> dict:
+        entry = self._stages.get(name)
+        if entry is None:
+            entry = self._stages[name] = {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "blocks": 0}
+        return entry
+
+    def report(self) -> dict[str, dict]:
+        """Stage name -> {calls, wall_s, cpu_s, blocks, [peak_bytes], counters...}, in order of first use."""
+        return {name: dict(entry) for name, entry in self._stages.items()}
+
+    def format(self, report: Optional[dict[str, dict]] = None) -> str:
+        """The report as a text table, one stage per line with its counters at the end."""
+        report = self.report() if report is None else report
+        lines = [f"{'stage':<36} {'calls':>6} {'wall [s]':>10} {'cpu [s]':>10} {'blocks':>10} {'peak [MB]':>10}  counters"]
+        for name, entry in report.items():
+            peak = entry.get("peak_bytes")
+            extra = {k: v for k, v in entry.items() if k not in ("calls", "wall_s", "cpu_s", "blocks", "peak_bytes")}
+            counters = ", ".join(f"{k}={_format_value(v)}" for k, v in extra.items())
+            if entry["calls"]:
+                timing = f"{entry['calls']:>6} {entry['wall_s']:>10.4f} {entry['cpu_s']:>10.4f} {entry['blocks']:>10}"
+            else:
+                timing = f"{'-':>6} {'-':>10} {'-':>10} {'-':>10}"  # Counters only
+            lines.append(f"{name:<36} {timing} {'-' if peak is None else f'{peak / 2 ** 20:.1f}':>10}  {counters}")
+        return "\n".join(lines)
+
+
+def _format_value(value: float) -> str:
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+
+_NULL = nullcontext()
+
+profiler = Profiler()
+
+
+def _from_environment() -> None:
+    # CAENPARSER_PROFILE=1 profiles the whole process and prints the report to stderr at exit;
+    # CAENPARSER_PROFILE=memory adds the tracemalloc peaks
+    value = os.environ.get(ENV_VAR, "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return
+    profiler.enable(memory=value in ("memory", "mem", "tracemalloc"))
+    import atexit
+    atexit.register(lambda: print(profiler.format(), file=sys.stderr))
+
+
+_from_environment()
@@ -0,0 +1,168 @@
+from typing import BinaryIO, Optional, Union
+import io
+import os
+import sys
+
+BLOCK_SIZE = 4 << 20
+PIPE_SIZE = 1 << 20
+
+# Magic numbers of the compressed formats read transparently, and their usual suffixes
+COMPRESSIONS = {b"\x1f\x8b": "gzip", b"\xfd7zXZ\x00": "xz", b"BZh": "bz2"}
+SUFFIXES = (".gz", ".xz", ".bz2")
+
+Source = Union[str, os.PathLike, BinaryIO]
+
+
+def compression(head: bytes) -> Optional[str]:
+    """Compression format of data starting with head ("gzip", "xz", "bz2"), None if uncompressed."""
+    for magic, name in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def is_plain_file(source: Source) -> bool:
+    """
+    True when source is the path of an uncompressed regular file, which the
+    readers open directly (with seeks, memory mappings...). Anything else,
+    "-" for stdin, a file object, a pipe or a compressed file, is read
+    through a ReadAhead.
+    """
+    if not isinstance(source, (str, os.PathLike)) or os.fspath(source) == "-":
+        return False
+    if not os.path.isfile(source):
+        return False
+    with open(source, "rb") as f:
+        return compression(f.read(6)) is None
+
+
+def strip_compression(path: str) -> str:
+    """path without a compression suffix: "run12.bin.gz" -> "run12.bin"."""
+    for suffix in SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+class ReadAhead:
+    """
+    Reads a source in large blocks on a background thread, decompressing it
+    on the way, and hands the bytes over through a pipe: fileno() for
+    readers that take a file descriptor (CBinaryIn), reader() for a Python
+    file object. The decompressors release the GIL while they work, so
+    decompression overlaps with the decoding done by the reading thread.
+
+    source is a path, "-" for stdin, or a binary file object (a pipe, a
+    socket file...). gzip, xz and bz2 data are recognised by their magic
+    number, whatever the file name. An error of the feeding thread ends the
+    stream early and is raised by check().
+    """
+
+    def __init__(self, source: Source, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        if isinstance(source, (str, os.PathLike)) and os.fspath(source) != "-":
+            self.name = os.fspath(source)
+            stream = owned = open(source, "rb")
+        else:
+            stream = sys.stdin.buffer if isinstance(source, str) else source
+            name = getattr(stream, "name", None)
+            self.name = name if isinstance(name, str) else "<stream>"
+            owned = None
+        try:
+            decompressed = self._decompressed(stream)
+        except Exception:
+            if owned is not None:
+                owned.close()
+            raise
+
+        import threading  # Kept out of the package import time
+        self._error: Optional[BaseException] = None
+        self._reader: Optional[BinaryIO] = None
+        read_fd, write_fd = os.pipe()
+        _grow_pipe(write_fd)
+        self._fd = read_fd
+        self._thread = threading.Thread(
+            target=self._feed, args=(decompressed, owned, write_fd), name=f"ReadAhead({self.name})", daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _decompressed(stream: BinaryIO) -> BinaryIO:
+        # Peeking keeps the magic number in the stream, pipes included. The
+        # decompressors leave the stream they read open.
+        if not hasattr(stream, "peek"):
+            stream = io.BufferedReader(stream)
+        kind = compression(stream.peek(6)[:6])
+        if kind == "gzip":
+            import gzip  # Kept out of the package import time
+            return gzip.GzipFile(fileobj=stream, mode="rb")
+        if kind == "xz":
+            import lzma
+            return lzma.LZMAFile(stream)
+        if kind == "bz2":
+            import bz2
+            return bz2.BZ2File(stream)
+        return stream
+
+    def _feed(self, stream: BinaryIO, owned: Optional[BinaryIO], write_fd: int) -> None:
+        try:
+            while True:
+                block = stream.read(self.block_size)
+                if not block:
+                    break
+                view = memoryview(block)
+                while view:
+                    view = view[os.write(write_fd, view):]
+        except BrokenPipeError:
+            pass  # The reader stopped early
+        except Exception as e:
+            self._error = e
+        finally:
+            # The error is set before the reader can see the end of the stream
+            os.close(write_fd)
+            if owned is not None:
+                owned.close()
+
+    def fileno(self) -> int:
+        """Read end of the pipe. Readers taking it over should duplicate it (CBinaryIn does)."""
+        if self._fd < 0:
+            raise ValueError(f"ReadAhead of {self.name} is closed")
+        return self._fd
+
+    def reader(self) -> BinaryIO:
+        """A buffered file object over the read end of the pipe; closed with the ReadAhead."""
+        if self._reader is None:
+            self._reader = open(self.fileno(), "rb", buffering=PIPE_SIZE, closefd=False)
+        return self._reader
+
+    def check(self) -> None:
+        """Raises ValueError if the feeding thread failed, e.g. on corrupt compressed data."""
+        if self._error is not None:
+            raise ValueError(f"Error reading {self.name}: {self._error}")
+
+    def close(self) -> None:
+        """
+        Closes the read end of the pipe. A feeding thread still running stops
+        at its next write, without being waited for.
+        """
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _grow_pipe(fd: int) -> None:
+    # Fewer, larger transfers between the threads where the pipe size can be set (Linux)
+    try:
+        import fcntl
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    except (ImportError, AttributeError, OSError):
+        pass
@@ -0,0 +1,144 @@
+from typing import AsyncIterator, Iterator, Optional, TypeVar
+import os
+import sys
+import time
+
+T = TypeVar("T")
+
+POLL_INTERVAL = 0.05
+
+
+class Tail:
+    """
+    Drives the reading of a file that is still being written. The reader is
+    a generator yielding items as soon as they are complete and None
+    whenever it has caught up with the file; before trying again it asks
+    keep_waiting() and winds up (flushing what it holds) once that says no.
+
+    Caught up, the reader waits for the file at path to change. On Linux an
+    inotify watch wakes it as soon as the writer writes, so an item is
+    delivered as soon as it is complete; the wait still ends every
+    poll_interval seconds to check stop and idle_timeout. Elsewhere, or
+    without a path (a pipe), it sleeps poll_interval seconds between checks
+    of the file size: an item then comes up to poll_interval after it is
+    written, and a smaller poll_interval trades CPU wake-ups for latency.
+    An idle tail costs next to no CPU either way. Waiting stops when stop (a
+    threading.Event or asyncio.Event) is set, or after idle_timeout seconds
+    without a new item; by default it goes on until stop is set.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL, idle_timeout: Optional[float] = None, stop=None,
+                 path: Optional[str] = None):
+        if poll_interval <= 0:
+            raise ValueError("poll_interval must be positive")
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.stop = stop
+        self.path = path
+        self._last = time.monotonic()
+
+    def keep_waiting(self) -> bool:
+        """False once stop is set or nothing new came for idle_timeout seconds."""
+        if self.stop is not None and self.stop.is_set():
+            return False
+        return self.idle_timeout is None or time.monotonic() - self._last < self.idle_timeout
+
+    def run(self, items: Iterator[Optional[T]]) -> Iterator[T]:
+        """Blocking iterator over the items of reader generator items."""
+        # The watch is set before the first read, so no write goes unnoticed
+        watch = _Inotify.open(self.path) if self.path is not None else None
+        self._last = time.monotonic()
+        try:
+            for item in items:
+                if item is None:
+                    if watch is not None:
+                        watch.wait(self.poll_interval)
+                    else:
+                        time.sleep(self.poll_interval)
+                else:
+                    self._last = time.monotonic()
+                    yield item
+        finally:
+            if watch is not None:
+                watch.close()
+
+    async def arun(self, items: Iterator[Optional[T]]) -> AsyncIterator[T]:
+        """
+        asyncio iterator over the items of reader generator items. The
+        waits are asyncio ones, and the event loop gets a turn after every
+        item, so reading a backlog does not hold it up either.
+        """
+        import asyncio  # Kept out of the package import time
+        watch = _Inotify.open(self.path) if self.path is not None else None
+        self._last = time.monotonic()
+        try:
+            for item in items:
+                if item is None:
+                    if watch is not None:
+                        await watch.await_change(self.poll_interval)
+                    else:
+                        await asyncio.sleep(self.poll_interval)
+                else:
+                    self._last = time.monotonic()
+                    yield item
+                    await asyncio.sleep(0)
+        finally:
+            if watch is not None:
+                watch.close()
+
+
+class _Inotify:
+    # inotify watch of the writes to one file, through libc (Linux only)
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    @classmethod
+    def open(cls, path: str) -> Optional["_Inotify"]:
+        """A watch of path, or None where inotify is not available (the caller polls)."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes  # Kept out of the package import time
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            if libc.inotify_add_watch(fd, os.fsencode(path), cls.IN_MODIFY | cls.IN_CLOSE_WRITE) < 0:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return cls(fd)
+
+    def wait(self, timeout: float) -> None:
+        """Returns once the file was written to, or after timeout seconds."""
+        import select  # Kept out of the package import time
+        select.select([self.fd], [], [], timeout)
+        self._drain()
+
+    async def await_change(self, timeout: float) -> None:
+        """wait for an asyncio event loop."""
+        import asyncio  # Kept out of the package import time
+        loop = asyncio.get_running_loop()
+        changed = loop.create_future()
+        loop.add_reader(self.fd, lambda: changed.done() or changed.set_result(None))
+        try:
+            await asyncio.wait([changed], timeout=timeout)
+        finally:
+            loop.remove_reader(self.fd)
+        self._drain()
+
+    def _drain(self) -> None:
+        # The events only wake the reader, which then checks the file itself
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        os.close(self.fd)
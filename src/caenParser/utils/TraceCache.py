@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+import numpy as np
+
+
+class TraceCache:
+    """
+    Least-recently-used cache of trace arrays bounded by their total size.
+
+    Entries are evicted oldest-first once the bytes held exceed max_bytes;
+    a single array larger than the budget is not cached at all. Hits,
+    misses and evictions are counted so the budget can be tuned.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes < 0:
+            raise ValueError("Cache size must be non-negative")
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: np.ndarray) -> None:
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).nbytes
+        if value.nbytes > self._max_bytes:
+            return
+        self._entries[key] = value
+        self._bytes += value.nbytes
+        self._evict()
+
+    def resize(self, max_bytes: int) -> None:
+        if max_bytes < 0:
+            raise ValueError("Cache size must be non-negative")
+        self._max_bytes = max_bytes
+        self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _evict(self) -> None:
+        while self._bytes > self._max_bytes:
+            _, value = self._entries.popitem(last=False)
+            self._bytes -= value.nbytes
+            self.evictions += 1
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
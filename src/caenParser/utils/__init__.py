@@ -1,4 +1,10 @@
-from .utils import select_file
+from .utils import select_file, to_t_graph
 from .DeepDict import DeepDict
+from .TraceCache import TraceCache
+from .Backends import Backend, get_backend, register_backend, adapter, get_adapter, available_adapters
+from .Profiler import Profiler, profiler
+from .ReadAhead import ReadAhead
+from .Tail import Tail
 
-__all__ = ['select_file', 'DeepDict']
\ No newline at end of file
+__all__ = ['select_file', 'to_t_graph', 'DeepDict', 'TraceCache', 'Backend', 'get_backend', 'register_backend',
+           'adapter', 'get_adapter', 'available_adapters', 'Profiler', 'profiler', 'ReadAhead', 'Tail']
\ No newline at end of file
@@ -1,8 +1,18 @@
-import tkinter as tk
-from tkinter import filedialog
+from .Backends import adapter, get_backend
+import numpy as np
 
-def select_file():
+
+@adapter("select_file", requires="tkinter")
+def select_file(filetypes=(("XML files", "*.xml"),)):
+    tk = get_backend("tkinter").load()
+    from tkinter import filedialog
     root = tk.Tk()
     root.withdraw()  # Hide the root window
-    file_path = filedialog.askopenfilename(title="Select a file", filetypes=[("XML files", "*.xml")])
+    file_path = filedialog.askopenfilename(title="Select a file", filetypes=list(filetypes))
     return file_path
+
+
+@adapter("t_graph", requires="ROOT")
+def to_t_graph(time: np.ndarray, amplitude: np.ndarray):
+    ROOT = get_backend("ROOT")
+    return ROOT.TGraph(len(time), np.asarray(time, dtype='float64'), np.asarray(amplitude, dtype='float64'))
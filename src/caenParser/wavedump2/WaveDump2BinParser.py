@@ -1,7 +1,12 @@
+import os
 import struct
 from enum import Enum, auto
-import tkinter as tk
-from tkinter import filedialog
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence
+import numpy as np
+from caenParser.utils import select_file as _select_file
+from caenParser.utils.ReadAhead import ReadAhead, is_plain_file
+from caenParser.utils.Tail import Tail, POLL_INTERVAL
+from caenParser.persistence.Accumulators import Accumulator, update_block
 
 data_size_map = {
     'float': 4,
@@ -13,12 +18,15 @@ data_type_map = {
     'uint': 'H',
 }
 
+numpy_type_map = {
+    'float': '<f4',
+    'uint': '<u2',
+}
+
 
 def select_file():
-    root = tk.Tk()
-    root.withdraw()  # Hide the root window
-    file_path = filedialog.askopenfilename(title="Select a file", filetypes=[("All files", "*.*")])
-    return file_path
+    # Tk is only imported when the dialog is opened
+    return _select_file(filetypes=[("All files", "*.*")])
 
 
 
@@ -28,10 +36,24 @@ class WaveDump2BinParser:
 
 
     def __init__(self, filename, multi_board=False, one_file_each_channel=False, data_type: str = 'float'):
+        """
+        filename may also be a gzip, xz or bz2 compressed file, "-" for stdin
+        or a binary file object (e.g. a pipe). Those are read once, front to
+        back, decompressed in large blocks on a background thread (see
+        ReadAhead); file_size is then None and as_array() is not available.
+        """
         self._filename = filename
         self.multi_board = multi_board
         self.one_file_each_channel = one_file_each_channel
         self.data_type = data_type
+        self._source = None
+
+        if not is_plain_file(filename):
+            self._source = ReadAhead(filename)
+            self._filename = self._source.name
+            self.file_obj = self._source.reader()
+            self.file_size = None
+            return
 
         self.file_obj = open(filename, 'rb')  # Open file in binary read mode
         
@@ -46,18 +68,14 @@ class WaveDump2BinParser:
 
     def __next__(self):
         """Iterator protocol - returns next event or raises StopIteration"""
-        if self.file_obj.tell() >= self.file_size:
+        if self._at_end():
+            self._check_source()
             raise StopIteration
         
         try:
-            if self.multi_board:
-                event = self._parse_multi_board()
-            elif self.one_file_each_channel:
-                event = self._parse_one_file_each_channel()
-            else:
-                event = self._parse_normal_file()
-            return event
+            return self._parse_event()
         except ValueError as e:
+            self._check_source()
             print(f"Error parsing event: {e}")
             raise StopIteration
 
@@ -67,9 +85,59 @@ class WaveDump2BinParser:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit - closes file"""
-        if hasattr(self, 'file_obj') and self.file_obj:
+        self.close()
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()  # Closes file_obj too
+        elif hasattr(self, 'file_obj') and self.file_obj:
             self.file_obj.close()
 
+    def follow(self, poll_interval: float = POLL_INTERVAL, idle_timeout: Optional[float] = None,
+               stop=None) -> Iterator[dict]:
+        """
+        Tails a file that WaveDump2 is still writing: yields the events of
+        the file from the current position, then waits for it to grow and
+        yields every new event once it is written in full, until stop (a
+        threading.Event) is set or no event came for idle_timeout seconds
+        (see Tail). Streams are simply iterated, their reads wait for the
+        writer.
+        """
+        tail = Tail(poll_interval, idle_timeout, stop, path=self._filename if self._source is None else None)
+        return tail.run(self._tail(tail.keep_waiting))
+
+    def afollow(self, poll_interval: float = POLL_INTERVAL, idle_timeout: Optional[float] = None,
+                stop=None) -> AsyncIterator[dict]:
+        """follow as an asyncio iterator (async for); stop may be an asyncio.Event."""
+        tail = Tail(poll_interval, idle_timeout, stop, path=self._filename if self._source is None else None)
+        return tail.arun(self._tail(tail.keep_waiting))
+
+    def _tail(self, follow: Callable[[], bool]) -> Iterator[Optional[dict]]:
+        # Yields None whenever the next record is not all written yet
+        if self._source is not None:
+            yield from self
+            return
+        while True:
+            self.file_size = os.fstat(self.file_obj.fileno()).st_size
+            if self._record_ready():
+                yield self._parse_event()
+            else:
+                yield None
+                if not follow():
+                    return
+
+    def _record_ready(self) -> bool:
+        header_fmt = '<I Q I Q' if self._single_channel else '<I Q I Q i'
+        header_size = struct.calcsize(header_fmt)
+        position = self.file_obj.tell()
+        if self.file_size - position < header_size:
+            return False
+        fields = struct.unpack(header_fmt, self.file_obj.read(header_size))
+        self.file_obj.seek(position)
+        channels = 1 if self._single_channel else fields[4]
+        record_size = header_size + 2 + channels * fields[2] * data_size_map[self.data_type]
+        return self.file_size - position >= record_size
+
     def parse_all(self):
         """Parse all events and return as list (for backward compatibility)"""
         events = []
@@ -77,6 +145,13 @@ class WaveDump2BinParser:
             events.append(event)
         return events
 
+    def _parse_event(self):
+        if self.multi_board:
+            return self._parse_multi_board()
+        elif self.one_file_each_channel:
+            return self._parse_one_file_each_channel()
+        return self._parse_normal_file()
+
     def _parse_normal_file(self):
         header_fmt = '<I Q I Q i'  # Event number, Timestamp, Samples, Sampling Period, Channels
         header_size = struct.calcsize(header_fmt)
@@ -86,9 +161,8 @@ class WaveDump2BinParser:
         
         event_num, timestamp, samples, samp_period, channels = struct.unpack(header_fmt, header_bytes)
         self.file_obj.read(2)  # Skip padding bytes
-        waveform = []
-        for _ in range(channels):   
-            waveform.append(self._get_waveform(self.file_obj, samples, self.data_type))
+        # All channels in one read, split into one array per channel
+        waveform = list(self._get_waveform(self.file_obj, channels * samples, self.data_type).reshape(channels, samples))
         return {
             'event_num': event_num,
             'timestamp': timestamp,
@@ -107,9 +181,8 @@ class WaveDump2BinParser:
         
         event_id, timestamp, samples, samp_period, channels = struct.unpack(header_fmt, header_bytes)
         self.file_obj.read(2)  # Skip padding bytes
-        waveform = []
-        for _ in range(channels):
-            waveform.append(self._get_waveform(self.file_obj, samples, self.data_type))
+        # All channels in one read, split into one array per channel
+        waveform = list(self._get_waveform(self.file_obj, channels * samples, self.data_type).reshape(channels, samples))
         return {
             'global_event_id': event_id,
             'timestamp': timestamp,
@@ -154,9 +227,164 @@ class WaveDump2BinParser:
         if wave_bytes is None:
             raise ValueError("File too small for waveform data")
         
-        wave_fmt = f'<{samples}{data_type_map[data_type]}'
-        return struct.unpack(wave_fmt, wave_bytes)
+        return np.frombuffer(wave_bytes, dtype=numpy_type_map[data_type])
+
+    def record_dtype(self, samples: int, channels: int = 1) -> np.dtype:
+        """
+        NumPy structured dtype of one event record in the current layout:
+        the header fields, the two padding bytes and the waveform as a
+        (channels, samples) block. One-file-each-channel records always
+        have a single channel.
+        """
+        if self._single_channel:
+            fields = [('event_num', '<u4'), ('timestamp', '<u8'), ('samples', '<u4'), ('sampling_period_ns', '<u8')]
+            channels = 1
+        else:
+            first = 'global_event_id' if self.multi_board else 'event_num'
+            fields = [(first, '<u4'), ('timestamp', '<u8'), ('samples', '<u4'), ('sampling_period_ns', '<u8'), ('channels', '<i4')]
+        fields.append(('padding', 'V2'))
+        fields.append(('waveform', numpy_type_map[self.data_type], (channels, samples)))
+        return np.dtype(fields)
+
+    def as_array(self) -> np.ndarray:
+        """
+        Memory-maps the whole file as an array of event records (see
+        record_dtype); as_array()['waveform'] is an events x channels x
+        samples view. Nothing is read until the data are touched.
+
+        Requires every event to have the same samples and channels, as
+        WaveDump2 writes them: the headers of all records are compared with
+        the first one, in one vectorised pass, and a ValueError is raised
+        otherwise; use the iterator for such files. Streams can not be
+        mapped; use iter_chunks or the iterator.
+        """
+        if self._source is not None:
+            raise ValueError(f"{self._filename} is read as a stream and can not be memory-mapped; use iter_chunks")
+        if self.file_size == 0:
+            return np.empty(0, dtype=self.record_dtype(0))
+        dtype = self._fixed_record_dtype()
+        records = np.memmap(self._filename, dtype=dtype, mode='r', shape=(self.file_size // dtype.itemsize,))
+        self._check_uniform(records)
+        return records
+
+    def waveforms(self) -> np.ndarray:
+        """Memory-mapped events x channels x samples view of all waveforms in the file."""
+        return self.as_array()['waveform']
+
+    def iter_chunks(self, events_per_chunk: int = 1024) -> Iterator[np.ndarray]:
+        """
+        Yields the memory-mapped records of as_array() in slices of
+        events_per_chunk events. Streams are read events_per_chunk records at
+        a time instead, into new read-only arrays; a record that differs in
+        size from the first raises a ValueError.
+        """
+        if self._source is not None:
+            yield from self._read_chunks(events_per_chunk)
+            return
+        records = self.as_array()
+        for start in range(0, len(records), events_per_chunk):
+            yield records[start:start + events_per_chunk]
+
+    def summarize(self, accumulators: Sequence[Accumulator], events_per_chunk: int = 4096,
+                  channel: int = 0) -> Sequence[Accumulator]:
+        """
+        Feeds every event of the file to accumulators in one sequential pass
+        and returns them. Fixed-size files are handed over events_per_chunk
+        records at a time from the memory mapping (see iter_chunks); other
+        files event by event. Channels are numbered in file order, and
+        one-file-each-channel files are fed as channel. Event times are the
+        WaveDump2 timestamps as they are.
+        """
+        if self.file_size == 0:
+            return accumulators
+        try:
+            records = self.as_array() if self._source is None else None
+        except ValueError:
+            self.file_obj.seek(0)
+            for event in self:
+                waveform = np.stack(event['waveform'])[None, :, :]
+                channels = [channel] if self._single_channel else range(event['channels'])
+                update_block(accumulators, np.array([event['timestamp']]), channels, waveform)
+            return accumulators
+
+        chunks = self._read_chunks(events_per_chunk) if records is None else (
+            records[start:start + events_per_chunk] for start in range(0, len(records), events_per_chunk)
+        )
+        for chunk in chunks:
+            waveform = chunk['waveform']
+            channels = [channel] if self._single_channel else range(waveform.shape[1])
+            update_block(accumulators, chunk['timestamp'], channels, waveform)
+        return accumulators
+
+    def _read_chunks(self, events_per_chunk: int) -> Iterator[np.ndarray]:
+        if self._at_end():
+            self._check_source()
+            return
+        dtype = self._fixed_record_dtype()
+        while True:
+            data = self.file_obj.read(events_per_chunk * dtype.itemsize)
+            if len(data) % dtype.itemsize:
+                self._check_source()
+                raise ValueError(f"{self._filename} ends in the middle of an event")
+            if not data:
+                self._check_source()
+                return
+            chunk = np.frombuffer(data, dtype=dtype)
+            self._check_uniform(chunk)
+            yield chunk
+
+    def _check_uniform(self, records: np.ndarray) -> None:
+        # Records read with the dtype of the first one must all have its samples and channels
+        channels, samples = records.dtype['waveform'].shape
+        expected = {'samples': samples} if self._single_channel else {'samples': samples, 'channels': channels}
+        for field, value in expected.items():
+            bad = np.flatnonzero(records[field] != value)
+            if len(bad):
+                raise ValueError(
+                    f"Events of {self._filename} differ in {field}: {int(records[field][bad[0]])} "
+                    f"instead of {value}; use the iterator"
+                )
+
+    def _at_end(self) -> bool:
+        if self._source is not None:
+            return not self.file_obj.peek(1)
+        return self.file_obj.tell() >= self.file_size
+
+    def _check_source(self):
+        # A stream cut short by an error of its ReadAhead (e.g. corrupt compressed data) raises that error
+        if self._source is not None:
+            self._source.check()
+
+    def _fixed_record_dtype(self) -> np.dtype:
+        # Sizes are taken from the first header; the file must hold a whole number of such records.
+        # Streams are peeked at, the first read of the pipe holds far more than a header.
+        header_fmt = '<I Q I Q' if self._single_channel else '<I Q I Q i'
+        header_size = struct.calcsize(header_fmt)
+        if self._source is not None:
+            header_bytes = self.file_obj.peek(header_size)[:header_size]
+            header_bytes = header_bytes if len(header_bytes) == header_size else None
+        else:
+            with open(self._filename, 'rb') as f:
+                header_bytes = self._safe_read(f, header_size)
+        if header_bytes is None:
+            raise ValueError("File too small for header")
+        fields = struct.unpack(header_fmt, header_bytes)
+        samples = fields[2]
+        channels = 1 if self._single_channel else fields[4]
+
+        dtype = self.record_dtype(samples, channels)
+        if self.file_size is not None and self.file_size % dtype.itemsize != 0:
+            raise ValueError(
+                f"File size {self.file_size} is not a multiple of the {dtype.itemsize}-byte record "
+                f"({channels} channels x {samples} samples); events differ in length or the file is truncated"
+            )
+        return dtype
     
+    @property
+    def _single_channel(self):
+        # Same precedence as __next__: the multi-board layout wins
+        return self.one_file_each_channel and not self.multi_board
+
     @property
     def filename(self):
         """Return the filename"""
@@ -0,0 +1,154 @@
+from typing import Iterator, Optional, Sequence
+import numpy as np
+from .WaveDump2BinParser import WaveDump2BinParser
+from caenParser.persistence.Accumulators import Accumulator, update_block
+
+
+class WaveDump2MultiFileParser:
+    """
+    Reads a WaveDump2 run saved with one file for each channel as whole
+    multi-channel events.
+
+    All channel files are read in lockstep, events_per_block records at a
+    time with one read per file. The event numbers and timestamps of the
+    files are checked to agree and the waveforms are stacked into a single
+    events x channels x samples array, channels in the order of the mapping
+    given. A file that ends early or disagrees with the others raises a
+    ValueError instead of being dropped. Channel files may be compressed
+    (see WaveDump2BinParser); each is then decompressed on its own thread
+    and the run can only be iterated once.
+    """
+
+    def __init__(self, channel_files: dict[int, str], data_type: str = 'float', events_per_block: int = 4096):
+        if not channel_files:
+            raise ValueError("No channel files given")
+        if events_per_block < 1:
+            raise ValueError("events_per_block must be positive")
+        self._channel_files = dict(channel_files)
+        self.data_type = data_type
+        self.events_per_block = events_per_block
+
+        self._parsers = [
+            WaveDump2BinParser(path, one_file_each_channel=True, data_type=data_type)
+            for path in self._channel_files.values()
+        ]
+        self._dtype = self._common_dtype()
+
+    def __iter__(self) -> Iterator[dict]:
+        """Yields one event at a time, in the format of WaveDump2BinParser events."""
+        for batch in self.iter_batches():
+            for i in range(len(batch['event_num'])):
+                yield {
+                    'event_num': int(batch['event_num'][i]),
+                    'timestamp': int(batch['timestamp'][i]),
+                    'samples': batch['samples'],
+                    'sampling_period_ns': int(batch['sampling_period_ns'][i]),
+                    'channels': len(self._parsers),
+                    'channel_ids': batch['channel_ids'],
+                    'waveform': batch['waveform'][i]   # channels x samples
+                }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def iter_batches(self, events_per_batch: Optional[int] = None) -> Iterator[dict]:
+        """
+        Yields the run in batches of up to events_per_batch events (by default
+        events_per_block). Header fields are arrays with one entry per event
+        and waveform is a new contiguous events x channels x samples array.
+        """
+        events = events_per_batch or self.events_per_block
+        # Read buffers are reused across batches, only the stacked waveforms are new
+        buffers = [bytearray(events * self._dtype.itemsize) for _ in self._parsers]
+        for parser in self._parsers:
+            if parser.file_size is not None:  # Streams are read once
+                parser.file_obj.seek(0)
+
+        while True:
+            blocks = [self._read_block(parser, buffer) for parser, buffer in zip(self._parsers, buffers)]
+            lengths = {len(block) for block in blocks}
+            if len(lengths) != 1:
+                short = min(range(len(blocks)), key=lambda i: len(blocks[i]))
+                raise ValueError(f"Channel file {self._parsers[short].filename} ends before the others")
+            n = lengths.pop()
+            if n == 0:
+                return
+
+            first = blocks[0]
+            for parser, block in zip(self._parsers[1:], blocks[1:]):
+                for field in ('event_num', 'timestamp'):
+                    bad = np.flatnonzero(block[field] != first[field])
+                    if len(bad):
+                        raise ValueError(
+                            f"Channel file {parser.filename} disagrees on {field} at event "
+                            f"{int(first['event_num'][bad[0]])}: {block[field][bad[0]]} != {first[field][bad[0]]}"
+                        )
+
+            waveform = np.empty((n, len(blocks), self.samples), dtype=self._dtype['waveform'].base)
+            for c, block in enumerate(blocks):
+                waveform[:, c, :] = block['waveform'][:, 0, :]
+
+            yield {
+                'event_num': first['event_num'].copy(),
+                'timestamp': first['timestamp'].copy(),
+                'samples': self.samples,
+                'sampling_period_ns': first['sampling_period_ns'].copy(),
+                'channel_ids': self.channel_ids,
+                'waveform': waveform
+            }
+
+    def summarize(self, accumulators: Sequence[Accumulator],
+                  events_per_batch: Optional[int] = None) -> Sequence[Accumulator]:
+        """Feeds every batch of iter_batches to accumulators, channels by their id, and returns them."""
+        for batch in self.iter_batches(events_per_batch):
+            update_block(accumulators, batch['timestamp'], batch['channel_ids'], batch['waveform'])
+        return accumulators
+
+    def close(self):
+        for parser in self._parsers:
+            parser.close()
+
+    def _read_block(self, parser: WaveDump2BinParser, buffer: bytearray) -> np.ndarray:
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(buffer):
+            n = parser.file_obj.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        if filled < len(buffer):
+            parser._check_source()
+        if filled % self._dtype.itemsize:
+            raise ValueError(f"Channel file {parser.filename} ends in the middle of an event")
+        block = np.frombuffer(buffer, dtype=self._dtype, count=filled // self._dtype.itemsize)
+        parser._check_uniform(block)
+        return block
+
+    def _common_dtype(self) -> np.dtype:
+        # Every channel file must hold the same fixed-size records
+        dtypes = {}
+        for parser in self._parsers:
+            if parser._at_end():
+                dtypes[parser.filename] = None
+                continue
+            try:
+                dtypes[parser.filename] = parser._fixed_record_dtype()
+            except ValueError as e:
+                raise ValueError(f"Channel file {parser.filename}: {e}")
+        distinct = set(dtypes.values())
+        if len(distinct) != 1:
+            sizes = {name: (None if d is None else d['waveform'].shape[1]) for name, d in dtypes.items()}
+            raise ValueError(f"Channel files differ in samples per event: {sizes}")
+        dtype = distinct.pop()
+        return dtype if dtype is not None else self._parsers[0].record_dtype(0)
+
+    @property
+    def channel_ids(self) -> list[int]:
+        return list(self._channel_files.keys())
+
+    @property
+    def samples(self) -> int:
+        return self._dtype['waveform'].shape[1]
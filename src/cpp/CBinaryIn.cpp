@@ -31,6 +31,7 @@
 #include <fcntl.h>
 #include <errno.h>
 #include <iostream>
+#include <string.h>
 
 #ifdef __GNUG__
 #include <unistd.h>
@@ -48,6 +49,7 @@
 
 #include <stdexcept>
 #include <system_error>
+#include <algorithm>
 
 // Definition of static const members (required when taking their address for pybind11)
 const uint32_t CBinaryIn::tp_DigitizerDescription;
@@ -65,13 +67,17 @@ const uint32_t CBinaryIn::trg_TriggerOnBoth;
 const uint32_t CBinaryIn::trg_ExtTrigDisabled;
 const uint32_t CBinaryIn::trg_Rising;
 
+const size_t CBinaryIn::streamBufferSize;
+
 /**
  * CBinaryIn
  *   constructor
  *     @param name - filename the data are in.
  */
 CBinaryIn::CBinaryIn(const char* filename) : m_filename(filename),
-    m_fd(-1)
+    m_fd(-1), m_skipped(0), m_bytesRead(0), m_readCalls(0), m_readNs(0), m_timing(false),
+    m_recordsRead(), m_stream(false), m_pos(0), m_end(0),
+    m_beforeBlocking(nullptr), m_afterBlocking(nullptr), m_follow(false), m_fileSize(0)
 {
 	int mode = O_RDONLY;
 
@@ -81,17 +87,87 @@ CBinaryIn::CBinaryIn(const char* filename) : m_filename(filename),
          msg += filename;
         throw std::system_error(errno, std::generic_category(), msg.c_str());
     }
+    init();
+}
+/**
+ * CBinaryIn
+ *   constructor
+ *     @param fd   - an open file descriptor (a pipe, stdin...) to read from.
+ *                   It is duplicated: the caller still owns and closes fd.
+ *     @param name - what to call the input in messages.
+ */
+CBinaryIn::CBinaryIn(int fd, const char* name) : m_filename(name),
+    m_fd(-1), m_skipped(0), m_bytesRead(0), m_readCalls(0), m_readNs(0), m_timing(false),
+    m_recordsRead(), m_stream(false), m_pos(0), m_end(0),
+    m_beforeBlocking(nullptr), m_afterBlocking(nullptr), m_follow(false), m_fileSize(0)
+{
+    m_fd = dup(fd);
+    if (m_fd < 0) {
+        std::string msg = "Dup failed for: ";
+        msg += name;
+        throw std::system_error(errno, std::generic_category(), msg.c_str());
+    }
+    init();
+}
+/**
+ * init
+ *   Decide how the open descriptor is read: an input that can not seek is
+ *   a stream and gets its read buffer.
+ */
+void
+CBinaryIn::init()
+{
+    m_stream = lseek(m_fd, 0, SEEK_CUR) < 0;
+    if (m_stream) {
+        m_buffer.resize(streamBufferSize);
+    }
 }
 /**
  * destructor
  *   - close the file if the open worked
  */
 CBinaryIn::~CBinaryIn()
+{
+    close();
+}
+/**
+ * close
+ *   Release the file descriptor.  Safe to call more than once; the
+ *   destructor calls it as well.
+ */
+void
+CBinaryIn::close()
 {
     if (m_fd >= 0) {
-        close(m_fd);
+        ::close(m_fd);
+        m_fd = -1;
     }
 }
+/**
+ * setBlockingCalls
+ *   Functions called just before and just after every read(2) of a stream,
+ *   which may wait for a writer; e.g. to let the thread feeding the stream
+ *   run meanwhile.  Either may be nullptr.
+ */
+void
+CBinaryIn::setBlockingCalls(void (*before)(), void (*after)())
+{
+    m_beforeBlocking = before;
+    m_afterBlocking  = after;
+}
+/**
+ * setFollow
+ *   With follow on, readHeader only returns the header of a record whose
+ *   body is already in the file: a file still being written can be read up
+ *   to its last complete record, then again as it grows.  Records rejected
+ *   by a selection are skipped by their size, written or not.  Streams need
+ *   no such care, they block in read(2) until the writer catches up.
+ */
+void
+CBinaryIn::setFollow(bool on)
+{
+    m_follow = on;
+}
 
 /**
  * readHeader
@@ -105,9 +181,245 @@ CBinaryIn::~CBinaryIn()
 int
 CBinaryIn::readHeader(header& buffer)
 {
-    auto nBytes = read(m_fd, &buffer, sizeof(header));
+    // While following a file being written, a record that is not all there
+    // yet reads as the end of file and is left in place for the next try.
+
+    if (m_follow && !m_stream && !recordComplete()) return 0;
+    auto nBytes = readBytes(&buffer, sizeof(header));
     return static_cast<int>(nBytes);    // will fit in an int.
 }
+/**
+ * readHeader
+ *   Read the header of the next record wanted by a selection.  Waveform
+ *   records are judged on their fixed header alone: rejected ones are
+ *   skipped with a seek over their samples, so their traces are never read
+ *   nor allocated.  When a header is returned for a waveform the file is
+ *   left positioned at its body, ready for readWaveform.  Descriptor and
+ *   settings records are always returned.
+ *
+ *  @param buffer    - references a header struct.
+ *  @param selection - the waveform records wanted.
+ *  @return bytes read on success (as readHeader(header&)).
+ *  @retval 0     End file encountered.
+ *  @retval <0    Some error condition in errno.
+ */
+int
+CBinaryIn::readHeader(header& buffer, const Selection& selection)
+{
+    if (m_stream) return readHeaderStream(buffer, selection);
+
+    // The record header and waveform fixed header are peeked in one read at
+    // the tracked offset, so a rejected record costs a single system call.
+
+    WaveformPrefix peeked;
+    off_t offset = lseek(m_fd, 0, SEEK_CUR);
+    if (offset < 0) return -1;
+    for (;;) {
+        auto nBytes = peek(&peeked, sizeof(peeked), offset);
+        if (nBytes < 0) return static_cast<int>(nBytes);
+        if (nBytes < static_cast<int>(sizeof(header)) ||
+            peeked.s_header.s_type != tp_TraceData ||
+            nBytes != static_cast<int>(sizeof(peeked)) ||
+            selection.accepts(peeked.s_fixed)) {
+
+            // Hand this record to the normal readers (which also report
+            // short records) as if readHeader(header&) had been called.
+
+            if (lseek(m_fd, offset, SEEK_SET) < 0) return -1;
+            return readHeader(buffer);
+        }
+        offset += sizeof(peeked) + static_cast<off_t>(peeked.s_fixed.s_nSamples) * sizeof(uint16_t);
+        m_skipped++;
+    }
+}
+/**
+ * readHeaderStream
+ *   readHeader(header&, const Selection&) for streams.  The record prefix
+ *   is inspected in the read buffer; a rejected record is read past and
+ *   dropped, its samples never leaving the buffer.
+ */
+int
+CBinaryIn::readHeaderStream(header& buffer, const Selection& selection)
+{
+    WaveformPrefix peeked;
+    for (;;) {
+        auto available = fill(sizeof(peeked));
+        if (available < 0) return -1;
+        memcpy(&peeked, m_buffer.data() + m_pos, std::min(static_cast<size_t>(available), sizeof(peeked)));
+        if (available < static_cast<long long>(sizeof(peeked)) ||
+            peeked.s_header.s_type != tp_TraceData ||
+            selection.accepts(peeked.s_fixed)) {
+            return readHeader(buffer);
+        }
+        uint64_t skip = sizeof(peeked) + static_cast<uint64_t>(peeked.s_fixed.s_nSamples) * sizeof(uint16_t);
+        while (skip > 0) {
+            if (m_pos == m_end) {
+                auto nBytes = fill(1);
+                if (nBytes <= 0) return static_cast<int>(nBytes);  // Error, or a truncated last record.
+            }
+            size_t chunk = static_cast<size_t>(std::min<uint64_t>(skip, m_end - m_pos));
+            m_pos += chunk;
+            skip  -= chunk;
+        }
+        m_skipped++;
+    }
+}
+/**
+ * recordComplete
+ *    @return bool - true if the record at the file position is in the file
+ *                   in full.  The file size is only asked for again when
+ *                   the record goes past the size last seen.
+ */
+bool
+CBinaryIn::recordComplete()
+{
+    header hdr;
+    off_t offset = lseek(m_fd, 0, SEEK_CUR);
+    if (offset < 0 || peek(&hdr, sizeof(hdr), offset) != static_cast<int>(sizeof(hdr))) return false;
+    uint64_t end = static_cast<uint64_t>(offset) + hdr.s_size;
+    if (end > m_fileSize) {
+        struct stat st;
+        if (fstat(m_fd, &st) < 0) return false;
+        m_fileSize = static_cast<uint64_t>(st.st_size);
+    }
+    return end <= m_fileSize;
+}
+/**
+ * peek
+ *    Read at an offset without moving the file position.
+ * @param buffer - receives the data.
+ * @param n      - bytes wanted.
+ * @param offset - where in the file.
+ * @return number of bytes read (less than n at end of file), <0 on error.
+ */
+int
+CBinaryIn::peek(void* buffer, size_t n, off_t offset)
+{
+    auto start = m_timing ? std::chrono::steady_clock::now() : std::chrono::steady_clock::time_point();
+#ifdef _MSVC_LANG
+    off_t here = lseek(m_fd, 0, SEEK_CUR);
+    lseek(m_fd, offset, SEEK_SET);
+    auto nBytes = read(m_fd, buffer, static_cast<unsigned>(n));
+    lseek(m_fd, here, SEEK_SET);
+#else
+    auto nBytes = pread(m_fd, buffer, n, offset);
+#endif
+    count(nBytes, start);
+    return static_cast<int>(nBytes);
+}
+/**
+ * readBytes
+ *    read(2) at the current position, counted in the I/O statistics.
+ * @return number of bytes read, 0 at end of file, <0 on error.
+ */
+int
+CBinaryIn::readBytes(void* buffer, size_t n)
+{
+    if (m_stream) return static_cast<int>(readStream(buffer, n));
+    auto start = m_timing ? std::chrono::steady_clock::now() : std::chrono::steady_clock::time_point();
+#ifdef _MSVC_LANG
+    auto nBytes = read(m_fd, buffer, static_cast<unsigned>(n));
+#else
+    auto nBytes = read(m_fd, buffer, n);
+#endif
+    count(nBytes, start);
+    return static_cast<int>(nBytes);
+}
+/**
+ * readStream
+ *    readBytes for streams: served from the read buffer, refilled with
+ *    large reads.  Unlike read(2) on a pipe it only comes back short at end
+ *    of file, so the callers see the same counts as for a regular file.
+ * @return number of bytes read, 0 at end of file, <0 on error.
+ */
+long long
+CBinaryIn::readStream(void* buffer, size_t n)
+{
+    uint8_t* p = static_cast<uint8_t*>(buffer);
+    size_t got = 0;
+    while (got < n) {
+        if (m_pos == m_end) {
+            auto nBytes = fill(std::min(n - got, m_buffer.size()));
+            if (nBytes < 0) return -1;
+            if (nBytes == 0) break;                 // End of file.
+        }
+        size_t chunk = std::min(n - got, m_end - m_pos);
+        memcpy(p + got, m_buffer.data() + m_pos, chunk);
+        m_pos += chunk;
+        got   += chunk;
+    }
+    return static_cast<long long>(got);
+}
+/**
+ * fill
+ *    Have at least n bytes (at most the buffer size) in the read buffer,
+ *    reading as much as the stream gives per system call.
+ * @return bytes in the buffer: fewer than n only at end of file, <0 on error.
+ */
+long long
+CBinaryIn::fill(size_t n)
+{
+    if (m_end - m_pos >= n) return static_cast<long long>(m_end - m_pos);
+    if (m_pos > 0) {
+        memmove(m_buffer.data(), m_buffer.data() + m_pos, m_end - m_pos);
+        m_end -= m_pos;
+        m_pos  = 0;
+    }
+    while (m_end < n) {
+        auto start = m_timing ? std::chrono::steady_clock::now() : std::chrono::steady_clock::time_point();
+        if (m_beforeBlocking) m_beforeBlocking();
+#ifdef _MSVC_LANG
+        auto nBytes = read(m_fd, m_buffer.data() + m_end, static_cast<unsigned>(m_buffer.size() - m_end));
+#else
+        auto nBytes = read(m_fd, m_buffer.data() + m_end, m_buffer.size() - m_end);
+#endif
+        int error = errno;
+        if (m_afterBlocking) m_afterBlocking();
+        count(nBytes, start);
+        if (nBytes < 0) {
+            if (error == EINTR) continue;
+            errno = error;
+            return -1;
+        }
+        if (nBytes == 0) break;                     // End of file.
+        m_end += static_cast<size_t>(nBytes);
+    }
+    return static_cast<long long>(m_end - m_pos);
+}
+/**
+ * count
+ *    Add one system call to the I/O statistics, and its duration when
+ *    timing is on (see setTiming).
+ */
+void
+CBinaryIn::count(long long nBytes, std::chrono::steady_clock::time_point start)
+{
+    m_readCalls++;
+    if (nBytes > 0) m_bytesRead += static_cast<uint64_t>(nBytes);
+    if (m_timing) {
+        m_readNs += static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(
+            std::chrono::steady_clock::now() - start
+        ).count());
+    }
+}
+/**
+ * Selection::accepts
+ *    @param header - fixed header of a waveform record.
+ *    @return bool  - true if the record is wanted by the selection.
+ */
+bool
+CBinaryIn::Selection::accepts(const WaveformFixedHeader& header) const
+{
+    if (header.s_eventId < s_firstEvent || header.s_eventId > s_lastEvent) return false;
+    if (header.s_todStamp < s_firstTod || header.s_todStamp > s_lastTod) return false;
+    if (!s_channels.empty() &&
+        !std::binary_search(s_channels.begin(), s_channels.end(), header.s_channel)) return false;
+    if (!s_settingsIds.empty() &&
+        !std::binary_search(s_settingsIds.begin(), s_settingsIds.end(), header.s_sid)) return false;
+    if (!s_eventIds.empty() &&
+        !std::binary_search(s_eventIds.begin(), s_eventIds.end(), header.s_eventId)) return false;
+    return true;
+}
 /**
  * readDigitizerDescriptor
  *   Read the body of a digitizer descriptor record.
@@ -121,7 +433,8 @@ CBinaryIn::readHeader(header& buffer)
 int
 CBinaryIn::readDigitizerDescriptor(DigitizerDescriptor& buffer)
 {
-    auto nBytes = read(m_fd, &buffer, sizeof(DigitizerDescriptor));
+    auto nBytes = readBytes(&buffer, sizeof(DigitizerDescriptor));
+    if (nBytes > 0) m_recordsRead[tp_DigitizerDescription]++;
     return static_cast<int>(nBytes);
 }
 /*
@@ -148,8 +461,8 @@ CBinaryIn::readDigitizerSettings(DigitizerSettings& buffer)
         
         // Read in the DC offsets -- if possible:
         
-        auto nBytes = read(
-            m_fd, buffer.s_DCOffsets.data(),
+        auto nBytes = readBytes(
+            buffer.s_DCOffsets.data(),
             buffer.s_header.s_nChannels*sizeof(uint32_t)
         );
         // Exceptional condition handling: Errors or premature EOF:
@@ -161,14 +474,15 @@ CBinaryIn::readDigitizerSettings(DigitizerSettings& buffer)
         n += static_cast<int>(nBytes); // Total up the bytes read.
         // Read in the trigger levels in the same way:
             
-		nBytes = read(
-			m_fd, buffer.s_TriggerLevels.data(),
+		nBytes = readBytes(
+			buffer.s_TriggerLevels.data(),
 			buffer.s_header.s_nChannels * sizeof(uint32_t)
 		);
         if (nBytes < 0) return nBytes;
         if (nBytes == 0) return 0;       // Premature EOF.
         
         n += nBytes;                     // Total up the bytes read.
+        m_recordsRead[tp_DigitizerSettings]++;
     }
     return n;
 }
@@ -192,12 +506,13 @@ CBinaryIn::readWaveform(WaveformData& buffer)
         
         buffer.s_trace.resize(buffer.s_header.s_nSamples);
 
-        auto nBytes = read(
-            m_fd, buffer.s_trace.data(),
+        auto nBytes = readBytes(
+            buffer.s_trace.data(),
             buffer.s_header.s_nSamples*sizeof(uint16_t)
         );
         if (nBytes <=0)  return nBytes;
         n += static_cast<int>(nBytes);
+        m_recordsRead[tp_TraceData]++;
     }
     return n;
 }
@@ -216,8 +531,8 @@ CBinaryIn::readWaveform(WaveformData& buffer)
 int
 CBinaryIn::readSettingsFixedHeader(DigitizerSettings& buffer)
 {
-    auto n = read(
-        m_fd, &(buffer.s_header), sizeof(DigitizerSettingsFixedHeader)
+    auto n = readBytes(
+        &(buffer.s_header), sizeof(DigitizerSettingsFixedHeader)
     );
     return static_cast<int>(n);
 }
@@ -233,8 +548,8 @@ CBinaryIn::readSettingsFixedHeader(DigitizerSettings& buffer)
 int
 CBinaryIn::readWaveformFixedHeader(WaveformData& buffer)
 {
-    auto n = read(
-        m_fd, &(buffer.s_header), sizeof(WaveformFixedHeader)
+    auto n = readBytes(
+        &(buffer.s_header), sizeof(WaveformFixedHeader)
     );
 #ifdef DEBUG_OUTPUT
     std::cerr << "----------------- read waveform header  ----\n";
@@ -27,6 +27,8 @@
 #include <vector>
 #include <string>
 #include <stdint.h>
+#include <sys/types.h>
+#include <chrono>
 
 
 /**
@@ -35,7 +37,10 @@
  *     read it in C++ as binary scan etc. just doesn't do as well as
  *     read(1) with variable sizes.  This class is then encapsulated via
  *     methods in CDigitizer.h s that it is accessible in Tcl.
- *  
+ *
+ *     Files that can not seek (pipes, stdin, the read end of a
+ *     decompressing thread) are read as streams: through a large buffer,
+ *     rejected records being read past instead of skipped with a seek.
  */
 class CBinaryIn
 {
@@ -145,21 +150,82 @@ public:
 #pragma pack(pop)
 
 
+    // Waveform record selection (see readHeader(header&, const Selection&)).
+    // Empty id lists select every id; the ranges are inclusive.
+
+    typedef struct _Selection {
+        std::vector<uint32_t> s_channels;     // Channels wanted, sorted.
+        std::vector<uint32_t> s_eventIds;     // Event ids wanted, sorted.
+        std::vector<uint32_t> s_settingsIds;  // Settings ids wanted, sorted.
+        uint32_t  s_firstEvent = 0;           // Event id range.
+        uint32_t  s_lastEvent  = UINT32_MAX;
+        uint64_t  s_firstTod   = 0;           // Clock seconds range.
+        uint64_t  s_lastTod    = UINT64_MAX;
+
+        bool accepts(const WaveformFixedHeader& header) const;
+    } Selection, *pSelection;
+
+
     // Class private data:
     
 private:
    std::string m_filename;
    int         m_fd;
+   uint64_t    m_skipped;                 // Waveform records skipped by selections.
+   uint64_t    m_bytesRead;               // I/O statistics: bytes and system calls,
+   uint64_t    m_readCalls;
+   uint64_t    m_readNs;                  // and their time while timing is on.
+   bool        m_timing;
+   uint64_t    m_recordsRead[4];          // Record bodies read, by s_type.
+   bool        m_stream;                  // Not seekable (pipe, stdin...): read through m_buffer.
+   std::vector<uint8_t> m_buffer;         // Stream read buffer, valid from m_pos to m_end.
+   size_t      m_pos;
+   size_t      m_end;
+   void      (*m_beforeBlocking)();       // Called around every read(2) of a stream.
+   void      (*m_afterBlocking)();
+   bool        m_follow;                  // Only complete records are read (see setFollow).
+   uint64_t    m_fileSize;                // File size last seen while following.
 public:
+    static const size_t streamBufferSize = 1 << 20;
+
     CBinaryIn(const char* filename);
+    CBinaryIn(int fd, const char* name);
     ~CBinaryIn();
 
     int readHeader(header& buffer);
+    int readHeader(header& buffer, const Selection& selection);
+    uint64_t skipped() const { return m_skipped; }
+    uint64_t bytesRead() const { return m_bytesRead; }
+    uint64_t readCalls() const { return m_readCalls; }
+    double   readSeconds() const { return m_readNs * 1e-9; }
+    void     setTiming(bool on) { m_timing = on; }
+    uint64_t recordsRead(uint32_t type) const { return type < 4 ? m_recordsRead[type] : 0; }
+    bool     isStream() const { return m_stream; }
+    void     setBlockingCalls(void (*before)(), void (*after)());
+    void     setFollow(bool on);
     int readDigitizerDescriptor(DigitizerDescriptor& buffer);
     int readDigitizerSettings(DigitizerSettings& buffer);
     int readWaveform(WaveformData& buffer);
+    void close();
     
 private:
+    // A waveform record up to its samples, as readHeader(header&, const Selection&) peeks it.
+
+#pragma pack(push, 1)
+    typedef struct _WaveformPrefix {
+        header              s_header;
+        WaveformFixedHeader s_fixed;
+    } WaveformPrefix;
+#pragma pack(pop)
+
+    int peek(void* buffer, size_t n, off_t offset);
+    int readBytes(void* buffer, size_t n);
+    long long readStream(void* buffer, size_t n);
+    long long fill(size_t n);
+    bool recordComplete();
+    int readHeaderStream(header& buffer, const Selection& selection);
+    void init();
+    void count(long long nBytes, std::chrono::steady_clock::time_point start);
     int readSettingsFixedHeader(DigitizerSettings& buffer);
     int readWaveformFixedHeader(WaveformData& buffer);
 };
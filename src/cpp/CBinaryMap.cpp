@@ -0,0 +1,505 @@
+/*
+**************************************************************************
+* @file     CBinaryMap.cpp
+* @brief    Implement the CBinaryMap class
+*
+*/
+#include "CBinaryMap.h"
+
+#include <string.h>
+#include <errno.h>
+#include <sstream>
+#include <stdexcept>
+#include <system_error>
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+#endif
+
+/**
+ * CBinaryMap
+ *   constructor
+ *     @param filename - file the data are in.
+ *     @param scan     - build the record index right away.  Pass false when
+ *                       the index will be supplied some other way.
+ */
+CBinaryMap::CBinaryMap(const char* filename, bool scan) :
+    m_filename(filename), m_base(nullptr), m_size(0), m_shared(false)
+#ifdef _WIN32
+    , m_file(nullptr), m_mapping(nullptr)
+#endif
+{
+    map();
+    if (scan) {
+        try {
+            this->scan();
+        }
+        catch (...) {
+            unmap();
+            throw;
+        }
+    }
+}
+/**
+ * destructor
+ *   - drop the mapping.  Arrays handed out to Python keep the object (and
+ *     so the mapping) alive, which is why there is no public close().
+ */
+CBinaryMap::~CBinaryMap()
+{
+    unmap();
+}
+
+/**
+ * scan
+ *    Walk the file once, from the first byte to the last, and record one
+ *    RecordEntry per record (see decodeRecord).
+ *
+ * @throw std::runtime_error - unknown record type or a record running past
+ *                             the end of the file.
+ * @throw std::logic_error   - the table is shared (see shareRecords).
+ */
+void
+CBinaryMap::scan()
+{
+    checkUnshared();
+    m_records.clear();
+    m_events.clear();
+
+    size_t offset = 0;
+    while (offset < m_size) {
+        RecordEntry e;
+        decodeRecord(offset, e);
+        indexRecord(e);
+        offset += e.s_size;
+    }
+}
+
+/**
+ * setRecords
+ *    Adopt a record table built earlier (e.g. saved next to the file)
+ *    instead of scanning.  Every entry is decoded again from the record
+ *    header at its offset, as scan() would, and must match it in full:
+ *    type, size, and the sample count and channel the size follows from.
+ *
+ * @param entries - the table.
+ * @param n       - number of entries.
+ * @throw std::invalid_argument - an entry does not match the mapped file.
+ * @throw std::logic_error      - the table is shared (see shareRecords).
+ */
+void
+CBinaryMap::setRecords(const RecordEntry* entries, size_t n)
+{
+    checkUnshared();
+    m_records.clear();
+    m_events.clear();
+    m_records.reserve(n);
+
+    for (size_t i = 0; i < n; i++) {
+        const RecordEntry& e = entries[i];
+        RecordEntry actual;
+        const char* problem = nullptr;
+        if (e.s_offset >= m_size) {
+            problem = "does not fit in";
+        } else {
+            try {
+                decodeRecord(e.s_offset, actual);
+            }
+            catch (std::runtime_error&) {
+                problem = "is not a valid record of";
+            }
+        }
+        if (!problem && (
+                e.s_size != actual.s_size || e.s_type != actual.s_type ||
+                e.s_nSamples != actual.s_nSamples || e.s_channel != actual.s_channel ||
+                e.s_eventId != actual.s_eventId || e.s_did != actual.s_did ||
+                e.s_sid != actual.s_sid || e.s_triggerTag != actual.s_triggerTag ||
+                e.s_todStamp != actual.s_todStamp || e.s_shift != actual.s_shift)) {
+            problem = "does not match the record header in";
+        }
+        if (problem) {
+            m_records.clear();
+            m_events.clear();
+            std::ostringstream msg;
+            msg << "Record " << i << " at offset " << e.s_offset << " " << problem
+                << " " << m_filename;
+            throw std::invalid_argument(msg.str());
+        }
+        indexRecord(actual);
+    }
+}
+
+/**
+ * decodeRecord
+ *    Fill a RecordEntry from the record starting at offset.  Body sizes are
+ *    derived from the fixed headers exactly as CBinaryIn reads them.
+ *
+ * @param offset - offset of the record header in the file.
+ * @param e      - the entry, zeroed first.
+ * @throw std::runtime_error - unknown record type or a record running past
+ *                             the end of the file.
+ */
+void
+CBinaryMap::decodeRecord(size_t offset, RecordEntry& e) const
+{
+    if (m_size - offset < sizeof(CBinaryIn::header)) {
+        std::ostringstream msg;
+        msg << "Truncated record header at offset " << offset << " in " << m_filename;
+        throw std::runtime_error(msg.str());
+    }
+    CBinaryIn::header hdr;
+    memcpy(&hdr, m_base + offset, sizeof(hdr));
+
+    memset(&e, 0, sizeof(e));
+    e.s_offset = offset;
+    e.s_type   = hdr.s_type;
+
+    const uint8_t* body  = m_base + offset + sizeof(hdr);
+    size_t available     = m_size - offset - sizeof(hdr);
+    uint64_t bodySize    = 0;
+
+    switch (hdr.s_type) {
+    case CBinaryIn::tp_DigitizerDescription:
+        {
+            bodySize = sizeof(CBinaryIn::DigitizerDescriptor);
+            if (available < bodySize) break;
+            CBinaryIn::DigitizerDescriptor desc;
+            memcpy(&desc, body, sizeof(desc));
+            e.s_did = desc.s_id;
+        }
+        break;
+    case CBinaryIn::tp_DigitizerSettings:
+        {
+            bodySize = sizeof(CBinaryIn::DigitizerSettingsFixedHeader);
+            if (available < bodySize) break;
+            CBinaryIn::DigitizerSettingsFixedHeader sh;
+            memcpy(&sh, body, sizeof(sh));
+            bodySize += 2 * uint64_t(sh.s_nChannels) * sizeof(uint32_t);
+            e.s_sid = sh.s_sid;
+            e.s_did = sh.s_did;
+        }
+        break;
+    case CBinaryIn::tp_TraceData:
+        {
+            bodySize = sizeof(CBinaryIn::WaveformFixedHeader);
+            if (available < bodySize) break;
+            CBinaryIn::WaveformFixedHeader wh;
+            memcpy(&wh, body, sizeof(wh));
+            bodySize += uint64_t(wh.s_nSamples) * sizeof(uint16_t);
+            e.s_eventId    = wh.s_eventId;
+            e.s_did        = wh.s_did;
+            e.s_sid        = wh.s_sid;
+            e.s_triggerTag = wh.s_triggerTag;
+            e.s_todStamp   = wh.s_todStamp;
+            e.s_shift      = wh.s_shift;
+            e.s_channel    = wh.s_channel;
+            e.s_nSamples   = wh.s_nSamples;
+        }
+        break;
+    default:
+        {
+            std::ostringstream msg;
+            msg << "Unknown record type " << hdr.s_type << " at offset " << offset
+                << " in " << m_filename;
+            throw std::runtime_error(msg.str());
+        }
+    }
+    if (available < bodySize) {
+        std::ostringstream msg;
+        msg << "Truncated record of type " << hdr.s_type << " at offset " << offset
+            << " in " << m_filename;
+        throw std::runtime_error(msg.str());
+    }
+    e.s_size = static_cast<uint32_t>(sizeof(hdr) + bodySize);
+}
+
+/**
+ * shareRecords
+ *    The record table, for a caller that keeps pointing into it (the
+ *    zero-copy view of the Python binding).  From then on the table is
+ *    frozen: scan() and setRecords() would reallocate it under the
+ *    caller, so they throw instead.
+ */
+const std::vector<CBinaryMap::RecordEntry>&
+CBinaryMap::shareRecords()
+{
+    m_shared = true;
+    return m_records;
+}
+
+/**
+ * checkUnshared
+ *    @throw std::logic_error - the table was shared by shareRecords().
+ */
+void
+CBinaryMap::checkUnshared() const
+{
+    if (m_shared) {
+        throw std::logic_error(
+            "The record table of " + m_filename + " is in use by a records() view and cannot be rebuilt"
+        );
+    }
+}
+
+/**
+ * eventRecords
+ *    @param eventId - event number.
+ *    @return the indices of the waveform records of that event, in file
+ *            order.  Empty if the event is not in the file.
+ */
+std::vector<uint32_t>
+CBinaryMap::eventRecords(uint32_t eventId) const
+{
+    auto p = m_events.find(eventId);
+    if (p == m_events.end()) {
+        return std::vector<uint32_t>();
+    }
+    return p->second;
+}
+
+/**
+ * recordData
+ *    @param record - index of the record.
+ *    @return pointer to its record header; records()[record].s_size bytes
+ *            of header and body follow.
+ */
+const uint8_t*
+CBinaryMap::recordData(size_t record) const
+{
+    if (record >= m_records.size()) {
+        throw std::out_of_range("Record index out of range");
+    }
+    return m_base + m_records[record].s_offset;
+}
+
+/**
+ * recordBody
+ *    @param record - index of the record.
+ *    @return pointer to the first byte after the record header.
+ */
+const uint8_t*
+CBinaryMap::recordBody(size_t record) const
+{
+    if (record >= m_records.size()) {
+        throw std::out_of_range("Record index out of range");
+    }
+    return m_base + m_records[record].s_offset + sizeof(CBinaryIn::header);
+}
+
+/**
+ * trace
+ *    @param record - index of a waveform record.
+ *    @return pointer to its samples inside the mapping; there are
+ *            records()[record].s_nSamples of them.
+ */
+const uint16_t*
+CBinaryMap::trace(size_t record) const
+{
+    entry(record, CBinaryIn::tp_TraceData);
+    return reinterpret_cast<const uint16_t*>(
+        recordBody(record) + sizeof(CBinaryIn::WaveformFixedHeader)
+    );
+}
+
+/**
+ * gatherTraces
+ *    Copy the samples of several waveform records into rows of a
+ *    preallocated nRows x nSamples array.  Touches nothing but the mapping
+ *    and out, so disjoint sets of records can be gathered from several
+ *    threads at once.
+ *
+ * @param records  - indices of the waveform records to copy.
+ * @param rows     - rows[i] is the row of out that receives records[i].
+ * @param n        - number of records.
+ * @param out      - destination, row-major.
+ * @param nRows    - rows in out.
+ * @param nSamples - samples per row; every record must have exactly that many.
+ * @throw std::length_error - a record has a different number of samples.
+ * @throw std::out_of_range - a row is outside out.
+ */
+void
+CBinaryMap::gatherTraces(
+    const uint32_t* records, const int64_t* rows, size_t n,
+    uint16_t* out, size_t nRows, size_t nSamples
+) const
+{
+    for (size_t i = 0; i < n; i++) {
+        const RecordEntry& e = entry(records[i], CBinaryIn::tp_TraceData);
+        if (e.s_nSamples != nSamples) {
+            throw std::length_error("Waveform record has a different number of samples");
+        }
+        if (rows[i] < 0 || static_cast<size_t>(rows[i]) >= nRows) {
+            throw std::out_of_range("Destination row out of range");
+        }
+        memcpy(out + rows[i] * nSamples, trace(records[i]), nSamples * sizeof(uint16_t));
+    }
+}
+
+/**
+ * readDigitizerDescriptor
+ *    Copy the body of a descriptor record out of the mapping.
+ */
+void
+CBinaryMap::readDigitizerDescriptor(size_t record, CBinaryIn::DigitizerDescriptor& buffer) const
+{
+    entry(record, CBinaryIn::tp_DigitizerDescription);
+    memcpy(&buffer, recordBody(record), sizeof(buffer));
+}
+
+/**
+ * readDigitizerSettings
+ *    Decode a settings record: the fixed header followed by the DC offsets
+ *    and trigger levels, just as CBinaryIn::readDigitizerSettings does.
+ */
+void
+CBinaryMap::readDigitizerSettings(size_t record, CBinaryIn::DigitizerSettings& buffer) const
+{
+    entry(record, CBinaryIn::tp_DigitizerSettings);
+    const uint8_t* p = recordBody(record);
+    memcpy(&buffer.s_header, p, sizeof(buffer.s_header));
+    p += sizeof(buffer.s_header);
+
+    size_t n = buffer.s_header.s_nChannels;
+    buffer.s_DCOffsets.resize(n);
+    buffer.s_TriggerLevels.resize(n);
+    memcpy(buffer.s_DCOffsets.data(), p, n * sizeof(uint32_t));
+    p += n * sizeof(uint32_t);
+    memcpy(buffer.s_TriggerLevels.data(), p, n * sizeof(uint32_t));
+}
+
+/**
+ * readWaveformHeader
+ *    Copy the fixed header of a waveform record out of the mapping.
+ */
+void
+CBinaryMap::readWaveformHeader(size_t record, CBinaryIn::WaveformFixedHeader& buffer) const
+{
+    entry(record, CBinaryIn::tp_TraceData);
+    memcpy(&buffer, recordBody(record), sizeof(buffer));
+}
+///////////////////////////////////////////////////////////////////////////////
+// Utility methods
+
+/**
+ * map
+ *    Map the whole file read-only.  An empty file is left unmapped.
+ */
+void
+CBinaryMap::map()
+{
+#ifdef _WIN32
+    HANDLE file = CreateFileA(
+        m_filename.c_str(), GENERIC_READ, FILE_SHARE_READ | FILE_SHARE_WRITE,
+        NULL, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL
+    );
+    if (file == INVALID_HANDLE_VALUE) {
+        std::string msg = "Open failed for: " + m_filename;
+        throw std::system_error(GetLastError(), std::system_category(), msg.c_str());
+    }
+    LARGE_INTEGER size;
+    GetFileSizeEx(file, &size);
+    m_file = file;
+    m_size = static_cast<size_t>(size.QuadPart);
+    if (m_size == 0) return;
+
+    HANDLE mapping = CreateFileMappingA(file, NULL, PAGE_READONLY, 0, 0, NULL);
+    if (mapping == NULL) {
+        unmap();
+        std::string msg = "Mapping failed for: " + m_filename;
+        throw std::system_error(GetLastError(), std::system_category(), msg.c_str());
+    }
+    m_mapping = mapping;
+    m_base = static_cast<const uint8_t*>(MapViewOfFile(mapping, FILE_MAP_READ, 0, 0, 0));
+    if (m_base == nullptr) {
+        unmap();
+        std::string msg = "Mapping failed for: " + m_filename;
+        throw std::system_error(GetLastError(), std::system_category(), msg.c_str());
+    }
+#else
+    int fd = open(m_filename.c_str(), O_RDONLY);
+    if (fd < 0) {
+        std::string msg = "Open failed for: " + m_filename;
+        throw std::system_error(errno, std::generic_category(), msg.c_str());
+    }
+    struct stat info;
+    if (fstat(fd, &info) < 0) {
+        int err = errno;
+        ::close(fd);
+        std::string msg = "stat failed for: " + m_filename;
+        throw std::system_error(err, std::generic_category(), msg.c_str());
+    }
+    m_size = static_cast<size_t>(info.st_size);
+    if (m_size > 0) {
+        void* p = mmap(nullptr, m_size, PROT_READ, MAP_SHARED, fd, 0);
+        if (p == MAP_FAILED) {
+            int err = errno;
+            ::close(fd);
+            std::string msg = "Mapping failed for: " + m_filename;
+            throw std::system_error(err, std::generic_category(), msg.c_str());
+        }
+        madvise(p, m_size, MADV_SEQUENTIAL);
+        m_base = static_cast<const uint8_t*>(p);
+    }
+    ::close(fd);                  // The mapping holds its own reference.
+#endif
+}
+
+/**
+ * unmap
+ *    Release the mapping (and on Windows the handles behind it).
+ */
+void
+CBinaryMap::unmap()
+{
+#ifdef _WIN32
+    if (m_base) UnmapViewOfFile(m_base);
+    if (m_mapping) CloseHandle(static_cast<HANDLE>(m_mapping));
+    if (m_file) CloseHandle(static_cast<HANDLE>(m_file));
+    m_mapping = nullptr;
+    m_file = nullptr;
+#else
+    if (m_base) munmap(const_cast<uint8_t*>(m_base), m_size);
+#endif
+    m_base = nullptr;
+}
+
+/**
+ * indexRecord
+ *    Append an entry to the record table and, for waveforms, to the
+ *    event -> records map.
+ */
+void
+CBinaryMap::indexRecord(const RecordEntry& e)
+{
+    uint32_t index = static_cast<uint32_t>(m_records.size());
+    m_records.push_back(e);
+    if (e.s_type == CBinaryIn::tp_TraceData) {
+        m_events[e.s_eventId].push_back(index);
+    }
+}
+
+/**
+ * entry
+ *    @return the index entry of a record after checking its type.
+ *    @throw std::out_of_range / std::invalid_argument on a bad index or type.
+ */
+const CBinaryMap::RecordEntry&
+CBinaryMap::entry(size_t record, uint32_t type) const
+{
+    if (record >= m_records.size()) {
+        throw std::out_of_range("Record index out of range");
+    }
+    const RecordEntry& e = m_records[record];
+    if (e.s_type != type) {
+        std::ostringstream msg;
+        msg << "Record " << record << " has type " << e.s_type << ", expected " << type;
+        throw std::invalid_argument(msg.str());
+    }
+    return e;
+}
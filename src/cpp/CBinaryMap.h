@@ -0,0 +1,96 @@
+/*
+**************************************************************************
+* @file     CBinaryMap.h
+* @brief    Memory-mapped, indexed access to the CBinaryIn file format.
+*
+*/
+#ifndef CBINARYMAP_H
+#define CBINARYMAP_H
+#include "CBinaryIn.h"
+
+#include <vector>
+#include <string>
+#include <unordered_map>
+#include <stddef.h>
+#include <stdint.h>
+
+
+/**
+ * @class CBinaryMap
+ *     Maps a whole file written in the CBinaryIn layout into memory and
+ *     walks it once, recording where every record starts together with the
+ *     header fields needed to select it.  After that scan any record can be
+ *     reached directly: descriptor and settings bodies are decoded from the
+ *     mapping and trace samples are handed out as pointers into it, so the
+ *     file itself is never copied.
+ */
+class CBinaryMap
+{
+public:
+    // One entry per record in the file.  Fields that do not apply to a
+    // record type (e.g. s_channel for a settings record) are zero.
+
+    typedef struct _RecordEntry {
+        uint64_t  s_offset;             // Offset of the record header in the file.
+        uint64_t  s_todStamp;           // Waveform: clock seconds at trigger.
+        uint32_t  s_size;               // Header + body size in bytes.
+        uint32_t  s_type;               // CBinaryIn::tp_* record type.
+        uint32_t  s_eventId;            // Waveform: event number.
+        uint32_t  s_did;                // Digitizer id (descriptor, settings, waveform).
+        uint32_t  s_sid;                // Settings id (settings, waveform).
+        uint32_t  s_channel;            // Waveform: channel number.
+        uint32_t  s_triggerTag;         // Waveform: trigger time tag.
+        int32_t   s_shift;              // Waveform: trigger jitter compensation.
+        uint32_t  s_nSamples;           // Waveform: number of samples.
+        uint32_t  s_reserved;           // Keeps the entry 8-byte aligned.
+    } RecordEntry, *pRecordEntry;
+
+    // Class private data:
+
+private:
+    std::string              m_filename;
+    const uint8_t*           m_base;
+    size_t                   m_size;
+#ifdef _WIN32
+    void*                    m_file;
+    void*                    m_mapping;
+#endif
+    std::vector<RecordEntry> m_records;
+    bool                     m_shared;      // records() was handed out as a view.
+    std::unordered_map<uint32_t, std::vector<uint32_t> > m_events;
+
+public:
+    CBinaryMap(const char* filename, bool scan = true);
+    ~CBinaryMap();
+
+    size_t fileSize() const { return m_size; }
+    const std::string& filename() const { return m_filename; }
+
+    void scan();
+    void setRecords(const RecordEntry* entries, size_t n);
+    const std::vector<RecordEntry>& records() const { return m_records; }
+    const std::vector<RecordEntry>& shareRecords();
+    std::vector<uint32_t> eventRecords(uint32_t eventId) const;
+
+    const uint8_t* recordData(size_t record) const;
+    const uint8_t* recordBody(size_t record) const;
+    const uint16_t* trace(size_t record) const;
+    void gatherTraces(
+        const uint32_t* records, const int64_t* rows, size_t n,
+        uint16_t* out, size_t nRows, size_t nSamples
+    ) const;
+
+    void readDigitizerDescriptor(size_t record, CBinaryIn::DigitizerDescriptor& buffer) const;
+    void readDigitizerSettings(size_t record, CBinaryIn::DigitizerSettings& buffer) const;
+    void readWaveformHeader(size_t record, CBinaryIn::WaveformFixedHeader& buffer) const;
+
+private:
+    void map();
+    void unmap();
+    void decodeRecord(size_t offset, RecordEntry& e) const;
+    void indexRecord(const RecordEntry& entry);
+    void checkUnshared() const;
+    const RecordEntry& entry(size_t record, uint32_t type) const;
+};
+
+#endif
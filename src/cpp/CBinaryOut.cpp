@@ -0,0 +1,274 @@
+/*
+**************************************************************************
+* @file     CBinaryOut.cpp
+* @brief    Implement the CBinaryOut class
+*
+*/
+#include "CBinaryOut.h"
+
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <string.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <sstream>
+#include <stdexcept>
+#include <system_error>
+
+#ifdef __GNUG__
+#include <unistd.h>
+#define O_BINARY 0     // There is no O_BINARY in linux/gnucc.
+#endif
+
+#ifdef _MSVC_LANG
+#include <io.h>
+#endif
+
+const size_t CBinaryOut::bufferSize;
+
+/**
+ * CBinaryOut
+ *   constructor
+ *     @param filename - file to create; an existing file is truncated.
+ */
+CBinaryOut::CBinaryOut(const char* filename) : m_filename(filename),
+    m_fd(-1), m_written(0), m_records(0)
+{
+    m_fd = open(m_filename.c_str(), O_WRONLY | O_CREAT | O_TRUNC | O_BINARY, 0644);
+    if (m_fd < 0) {
+        std::string msg = "Open failed for: ";
+        msg += filename;
+        throw std::system_error(errno, std::generic_category(), msg.c_str());
+    }
+    m_buffer.reserve(bufferSize);
+}
+/**
+ * destructor
+ *   - flush and close the file if that was not done already.  Errors can
+ *     not be reported from here; call close() to see them.
+ */
+CBinaryOut::~CBinaryOut()
+{
+    try {
+        close();
+    }
+    catch (...) {
+    }
+}
+/**
+ * close
+ *   Flush what is buffered and release the file descriptor.  Safe to call
+ *   more than once; the destructor calls it as well.
+ */
+void
+CBinaryOut::close()
+{
+    if (m_fd >= 0) {
+        try {
+            flush();
+        }
+        catch (...) {
+            ::close(m_fd);
+            m_fd = -1;
+            throw;
+        }
+        ::close(m_fd);
+        m_fd = -1;
+    }
+}
+/**
+ * flush
+ *   Write out the buffered records.
+ */
+void
+CBinaryOut::flush()
+{
+    if (!m_buffer.empty()) {
+        writeAll(m_buffer.data(), m_buffer.size());
+        m_buffer.clear();
+    }
+}
+
+/**
+ * writeDigitizerDescriptor
+ *   Write a digitizer descriptor record.
+ * @param buffer - the descriptor body.
+ * @return uint64_t - size of the record, header included.
+ */
+uint64_t
+CBinaryOut::writeDigitizerDescriptor(const CBinaryIn::DigitizerDescriptor& buffer)
+{
+    writeHeader(CBinaryIn::tp_DigitizerDescription, sizeof(buffer));
+    append(&buffer, sizeof(buffer));
+    return sizeof(CBinaryIn::header) + sizeof(buffer);
+}
+/**
+ * writeDigitizerSettings
+ *   Write a settings record: the fixed header, then s_nChannels DC offsets
+ *   and s_nChannels trigger levels.
+ * @param buffer - the settings.
+ * @return uint64_t - size of the record, header included.
+ * @throw std::length_error - the vectors do not hold s_nChannels values.
+ */
+uint64_t
+CBinaryOut::writeDigitizerSettings(const CBinaryIn::DigitizerSettings& buffer)
+{
+    size_t n = buffer.s_header.s_nChannels;
+    if (buffer.s_DCOffsets.size() != n || buffer.s_TriggerLevels.size() != n) {
+        throw std::length_error("DC offsets and trigger levels must hold s_nChannels values each");
+    }
+    size_t bodySize = sizeof(buffer.s_header) + 2 * n * sizeof(uint32_t);
+    writeHeader(CBinaryIn::tp_DigitizerSettings, bodySize);
+    append(&buffer.s_header, sizeof(buffer.s_header));
+    append(buffer.s_DCOffsets.data(), n * sizeof(uint32_t));
+    append(buffer.s_TriggerLevels.data(), n * sizeof(uint32_t));
+    return sizeof(CBinaryIn::header) + bodySize;
+}
+/**
+ * writeWaveform
+ *   Write a waveform record.
+ * @param buffer - the fixed header and trace; s_nSamples must match the trace.
+ * @return uint64_t - size of the record, header included.
+ */
+uint64_t
+CBinaryOut::writeWaveform(const CBinaryIn::WaveformData& buffer)
+{
+    return writeWaveform(buffer.s_header, buffer.s_trace.data(), buffer.s_trace.size());
+}
+/**
+ * writeWaveform
+ *   Write a waveform record from a fixed header and samples held elsewhere
+ *   (e.g. a NumPy array), without copying them into a WaveformData.
+ * @param header   - the fixed header.
+ * @param samples  - the trace.
+ * @param nSamples - length of the trace; must equal header.s_nSamples.
+ * @return uint64_t - size of the record, header included.
+ * @throw std::length_error - the trace length differs from s_nSamples.
+ */
+uint64_t
+CBinaryOut::writeWaveform(
+    const CBinaryIn::WaveformFixedHeader& header, const uint16_t* samples, size_t nSamples
+)
+{
+    if (header.s_nSamples != nSamples) {
+        throw std::length_error("Trace length differs from s_nSamples");
+    }
+    size_t bodySize = sizeof(header) + nSamples * sizeof(uint16_t);
+    writeHeader(CBinaryIn::tp_TraceData, bodySize);
+    append(&header, sizeof(header));
+    append(samples, nSamples * sizeof(uint16_t));
+    return sizeof(CBinaryIn::header) + bodySize;
+}
+/**
+ * copyRecords
+ *   Copy whole records of a mapped file, byte for byte, in the order given.
+ *   Nothing is decoded: runs of records that follow each other in the
+ *   source go out in a single write straight from the mapping, so a skim
+ *   of large contiguous ranges proceeds at disk speed.
+ *
+ * @param source  - the mapped file.
+ * @param records - indices of the records to copy (see CBinaryMap::records).
+ * @param n       - number of records.
+ * @return uint64_t - bytes copied.
+ * @throw std::out_of_range - a record index is not in the source.
+ */
+uint64_t
+CBinaryOut::copyRecords(const CBinaryMap& source, const uint32_t* records, size_t n)
+{
+    const std::vector<CBinaryMap::RecordEntry>& table = source.records();
+    for (size_t i = 0; i < n; i++) {
+        if (records[i] >= table.size()) {
+            throw std::out_of_range("Record index out of range");
+        }
+    }
+
+    uint64_t copied = 0;
+    size_t i = 0;
+    while (i < n) {
+        uint64_t start = table[records[i]].s_offset;
+        uint64_t end   = start + table[records[i]].s_size;
+        size_t   j     = i + 1;
+        while (j < n && table[records[j]].s_offset == end) {
+            end += table[records[j]].s_size;
+            j++;
+        }
+        const uint8_t* data = source.recordData(records[i]);
+        size_t size = static_cast<size_t>(end - start);
+        if (size < bufferSize) {
+            append(data, size);
+        } else {
+            flush();
+            writeAll(data, size);
+            m_written += size;
+        }
+        m_records += j - i;
+        copied += size;
+        i = j;
+    }
+    return copied;
+}
+///////////////////////////////////////////////////////////////////////////////
+// Utility methods
+
+/**
+ * writeHeader
+ *    Start a record: its header with the total size and the type.
+ */
+void
+CBinaryOut::writeHeader(uint32_t type, size_t bodySize)
+{
+    uint64_t size = sizeof(CBinaryIn::header) + uint64_t(bodySize);
+    if (size > UINT32_MAX) {
+        throw std::length_error("Record too large for the file format");
+    }
+    CBinaryIn::header hdr;
+    hdr.s_size = static_cast<uint32_t>(size);
+    hdr.s_type = type;
+    append(&hdr, sizeof(hdr));
+    m_records++;
+}
+/**
+ * append
+ *    Add bytes to the output buffer, flushing it when it would overflow.
+ *    Blocks larger than the buffer are written directly.
+ */
+void
+CBinaryOut::append(const void* data, size_t n)
+{
+    if (m_fd < 0) {
+        throw std::logic_error("Write to a closed CBinaryOut: " + m_filename);
+    }
+    if (m_buffer.size() + n > bufferSize) {
+        flush();
+    }
+    if (n > bufferSize) {
+        writeAll(static_cast<const uint8_t*>(data), n);
+    } else {
+        const uint8_t* p = static_cast<const uint8_t*>(data);
+        m_buffer.insert(m_buffer.end(), p, p + n);
+    }
+    m_written += n;
+}
+/**
+ * writeAll
+ *    write(2) until every byte is out, in chunks every platform accepts.
+ * @throw std::system_error - the write failed (e.g. disk full).
+ */
+void
+CBinaryOut::writeAll(const uint8_t* data, size_t n)
+{
+    if (m_fd < 0) {
+        throw std::logic_error("Write to a closed CBinaryOut: " + m_filename);
+    }
+    const size_t chunk = size_t(1) << 30;
+    while (n > 0) {
+        auto nBytes = write(m_fd, data, static_cast<unsigned>(n < chunk ? n : chunk));
+        if (nBytes < 0) {
+            if (errno == EINTR) continue;
+            std::string msg = "Write failed for: " + m_filename;
+            throw std::system_error(errno, std::generic_category(), msg.c_str());
+        }
+        data += nBytes;
+        n -= static_cast<size_t>(nBytes);
+    }
+}
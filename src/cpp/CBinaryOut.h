@@ -0,0 +1,62 @@
+/*
+**************************************************************************
+* @file     CBinaryOut.h
+* @brief    C++ class to write the CBinaryIn file format.
+*
+*/
+#ifndef CBINARYOUT_H
+#define CBINARYOUT_H
+#include "CBinaryIn.h"
+#include "CBinaryMap.h"
+
+#include <vector>
+#include <string>
+#include <stddef.h>
+#include <stdint.h>
+
+
+/**
+ * @class CBinaryOut
+ *     The counterpart of CBinaryIn: writes digitizer descriptor, settings
+ *     and waveform records, each preceded by its record header, in exactly
+ *     the layout CBinaryIn and CBinaryMap read.  Small records are gathered
+ *     in a buffer and written in large blocks; copyRecords moves whole
+ *     records of a mapped file across without decoding them.
+ */
+class CBinaryOut
+{
+    // Class private data:
+
+private:
+    std::string          m_filename;
+    int                  m_fd;
+    std::vector<uint8_t> m_buffer;      // Pending output, flushed when full.
+    uint64_t             m_written;     // Bytes handed to write() or buffered.
+    uint64_t             m_records;     // Records written.
+
+public:
+    static const size_t bufferSize = 1 << 20;
+
+    CBinaryOut(const char* filename);
+    ~CBinaryOut();
+
+    uint64_t writeDigitizerDescriptor(const CBinaryIn::DigitizerDescriptor& buffer);
+    uint64_t writeDigitizerSettings(const CBinaryIn::DigitizerSettings& buffer);
+    uint64_t writeWaveform(const CBinaryIn::WaveformData& buffer);
+    uint64_t writeWaveform(
+        const CBinaryIn::WaveformFixedHeader& header, const uint16_t* samples, size_t nSamples
+    );
+    uint64_t copyRecords(const CBinaryMap& source, const uint32_t* records, size_t n);
+
+    uint64_t bytesWritten() const { return m_written; }
+    uint64_t recordsWritten() const { return m_records; }
+    void flush();
+    void close();
+
+private:
+    void writeHeader(uint32_t type, size_t bodySize);
+    void append(const void* data, size_t n);
+    void writeAll(const uint8_t* data, size_t n);
+};
+
+#endif
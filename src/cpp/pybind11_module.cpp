@@ -2,18 +2,115 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/stl_bind.h>
+#include <pybind11/numpy.h>
 #include "CBinaryIn.h"
+#include "CBinaryMap.h"
+#include "CBinaryOut.h"
+#include <string.h>
 
 
 namespace py = pybind11;
 
+/**
+ * vectorView
+ *    Wrap the storage of a std::vector member as a NumPy array without
+ *    copying it.  The Python object that owns the vector is installed as
+ *    the array base, so the C++ memory lives as long as any array viewing it.
+ *    Re-reading into the same owner resizes the vector and invalidates
+ *    earlier views, so readers should use a fresh buffer per record.
+ *
+ * @param owner - Python handle to the object holding the vector.
+ * @param v     - the vector to expose.
+ * @return py::array_t<T> - 1-d array over v.data().
+ */
+template <typename T>
+static py::array_t<T>
+vectorView(py::handle owner, std::vector<T>& v)
+{
+    return py::array_t<T>(
+        {static_cast<py::ssize_t>(v.size())}, {static_cast<py::ssize_t>(sizeof(T))},
+        v.data(), owner
+    );
+}
+
+/**
+ * readonlyView
+ *    Wrap a pointer into a read-only mapping as a non-writable NumPy array.
+ *    The owner (the CBinaryMap) is the array base, which keeps the mapping
+ *    alive until the last view is gone.
+ */
+template <typename T>
+static py::array_t<T>
+readonlyView(py::handle owner, const T* data, size_t n)
+{
+    py::array_t<T> a(
+        {static_cast<py::ssize_t>(n)}, {static_cast<py::ssize_t>(sizeof(T))},
+        data, owner
+    );
+    py::detail::array_proxy(a.ptr())->flags &= ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+    return a;
+}
+
+/**
+ * copyFixed
+ *    Store a string in a fixed-size, NUL padded char field, truncating it
+ *    if it does not fit.
+ */
+static void
+copyFixed(char* field, size_t size, const std::string& value)
+{
+    memset(field, 0, size);
+    memcpy(field, value.data(), value.size() < size ? value.size() : size);
+}
+
+/**
+ * releaseGil / acquireGil
+ *    Blocking calls of a CBinaryIn stream (see setBlockingCalls).  A stream
+ *    may be fed by a Python thread, which needs the GIL to make progress
+ *    while the reader waits in read(2).
+ */
+static thread_local PyThreadState* s_blockedThread = nullptr;
+
+static void
+releaseGil()
+{
+    s_blockedThread = PyEval_SaveThread();
+}
+static void
+acquireGil()
+{
+    PyEval_RestoreThread(s_blockedThread);
+    s_blockedThread = nullptr;
+}
+
 PYBIND11_MODULE(caen_cpp, m) {
     py::class_<CBinaryIn>(m, "CBinaryIn")
-        .def(py::init<const char*>())
-        .def("readHeader", &CBinaryIn::readHeader)
+        .def(py::init([](const char* filename) {
+            auto in = new CBinaryIn(filename);
+            in->setBlockingCalls(releaseGil, acquireGil);
+            return in;
+        }))
+        .def(py::init([](int fd, const char* name) {
+            auto in = new CBinaryIn(fd, name);
+            in->setBlockingCalls(releaseGil, acquireGil);
+            return in;
+        }), py::arg("fd"), py::arg("name") = "<stream>")
+        .def("readHeader", static_cast<int (CBinaryIn::*)(CBinaryIn::header&)>(&CBinaryIn::readHeader))
+        .def("readHeader", static_cast<int (CBinaryIn::*)(CBinaryIn::header&, const CBinaryIn::Selection&)>(
+            &CBinaryIn::readHeader
+        ))
+        .def("skipped", &CBinaryIn::skipped)
+        .def("bytesRead", &CBinaryIn::bytesRead)
+        .def("readCalls", &CBinaryIn::readCalls)
+        .def("readSeconds", &CBinaryIn::readSeconds)
+        .def("setTiming", &CBinaryIn::setTiming)
+        .def("recordsRead", &CBinaryIn::recordsRead)
+        .def("isStream", &CBinaryIn::isStream)
+        .def("setFollow", &CBinaryIn::setFollow)
         .def("readDigitizerDescriptor", &CBinaryIn::readDigitizerDescriptor)
         .def("readDigitizerSettings", &CBinaryIn::readDigitizerSettings)
         .def("readWaveform", &CBinaryIn::readWaveform)
+        .def("close", &CBinaryIn::close)
         .def_readonly_static("tp_DigitizerDescription", &CBinaryIn::tp_DigitizerDescription)
         .def_readonly_static("tp_DigitizerSettings", &CBinaryIn::tp_DigitizerSettings)
         .def_readonly_static("tp_TraceData", &CBinaryIn::tp_TraceData)
@@ -27,17 +124,35 @@ PYBIND11_MODULE(caen_cpp, m) {
         .def_readonly_static("trg_Rising", &CBinaryIn::trg_Rising);
 
 
+    py::class_<CBinaryIn::Selection>(m, "Selection")
+        .def(py::init<>())
+        .def_readwrite("s_channels", &CBinaryIn::Selection::s_channels)
+        .def_readwrite("s_eventIds", &CBinaryIn::Selection::s_eventIds)
+        .def_readwrite("s_settingsIds", &CBinaryIn::Selection::s_settingsIds)
+        .def_readwrite("s_firstEvent", &CBinaryIn::Selection::s_firstEvent)
+        .def_readwrite("s_lastEvent", &CBinaryIn::Selection::s_lastEvent)
+        .def_readwrite("s_firstTod", &CBinaryIn::Selection::s_firstTod)
+        .def_readwrite("s_lastTod", &CBinaryIn::Selection::s_lastTod)
+        .def("accepts", &CBinaryIn::Selection::accepts);
+
+
     py::class_<CBinaryIn::header>(m, "Header")
+        .def(py::init<>())
         .def_readwrite("s_size", &CBinaryIn::header::s_size)
         .def_readwrite("s_type", &CBinaryIn::header::s_type)
         .def_static("size", [](){ return sizeof(CBinaryIn::header); });
 
 
     py::class_<CBinaryIn::DigitizerDescriptor>(m, "DigitizerDescriptor")
+        .def(py::init<>())
         .def_readwrite("s_id", &CBinaryIn::DigitizerDescriptor::s_id)
         .def_readwrite("s_familyCode", &CBinaryIn::DigitizerDescriptor::s_familyCode)
-        .def_readonly("s_ROCVersion", &CBinaryIn::DigitizerDescriptor::s_ROCVersion)
-        .def_readonly("s_AMCVersion", &CBinaryIn::DigitizerDescriptor::s_AMCVersion)
+        .def_property("s_ROCVersion",
+            [](const CBinaryIn::DigitizerDescriptor& d) { return std::string(d.s_ROCVersion, strnlen(d.s_ROCVersion, sizeof(d.s_ROCVersion))); },
+            [](CBinaryIn::DigitizerDescriptor& d, const std::string& v) { copyFixed(d.s_ROCVersion, sizeof(d.s_ROCVersion), v); })
+        .def_property("s_AMCVersion",
+            [](const CBinaryIn::DigitizerDescriptor& d) { return std::string(d.s_AMCVersion, strnlen(d.s_AMCVersion, sizeof(d.s_AMCVersion))); },
+            [](CBinaryIn::DigitizerDescriptor& d, const std::string& v) { copyFixed(d.s_AMCVersion, sizeof(d.s_AMCVersion), v); })
         .def_readwrite("s_SerialNumber", &CBinaryIn::DigitizerDescriptor::s_SerialNumber)
         .def_readwrite("s_boardVersion", &CBinaryIn::DigitizerDescriptor::s_boardVersion)
         .def_readwrite("s_nChans", &CBinaryIn::DigitizerDescriptor::s_nChans)
@@ -51,13 +166,19 @@ PYBIND11_MODULE(caen_cpp, m) {
 
 
     py::class_<CBinaryIn::DigitizerSettings>(m, "DigitizerSettings")
+        .def(py::init<>())
         .def_readwrite("s_header", &CBinaryIn::DigitizerSettings::s_header)
-        .def_readwrite("s_DCOffsets", &CBinaryIn::DigitizerSettings::s_DCOffsets)
-        .def_readwrite("s_TriggerLevels", &CBinaryIn::DigitizerSettings::s_TriggerLevels)
+        .def_property("s_DCOffsets", [](py::object self) {
+            return vectorView(self, self.cast<CBinaryIn::DigitizerSettings&>().s_DCOffsets);
+        }, [](CBinaryIn::DigitizerSettings& self, const std::vector<uint32_t>& v) { self.s_DCOffsets = v; })
+        .def_property("s_TriggerLevels", [](py::object self) {
+            return vectorView(self, self.cast<CBinaryIn::DigitizerSettings&>().s_TriggerLevels);
+        }, [](CBinaryIn::DigitizerSettings& self, const std::vector<uint32_t>& v) { self.s_TriggerLevels = v; })
         .def_static("size", [](){ return sizeof(CBinaryIn::DigitizerSettings); });
 
 
     py::class_<CBinaryIn::DigitizerSettingsFixedHeader>(m, "DigitizerSettingsFixedHeader")
+        .def(py::init<>())
         .def_readwrite("s_sid", &CBinaryIn::DigitizerSettingsFixedHeader::s_sid)
         .def_readwrite("s_did", &CBinaryIn::DigitizerSettingsFixedHeader::s_did)
         .def_readwrite("s_TriggerMask", &CBinaryIn::DigitizerSettingsFixedHeader::s_TriggerMask)
@@ -69,12 +190,16 @@ PYBIND11_MODULE(caen_cpp, m) {
 
 
     py::class_<CBinaryIn::WaveformData>(m, "WaveformData")
+        .def(py::init<>())
         .def_readwrite("s_header", &CBinaryIn::WaveformData::s_header)
-        .def_readwrite("s_trace", &CBinaryIn::WaveformData::s_trace)
+        .def_property("s_trace", [](py::object self) {
+            return vectorView(self, self.cast<CBinaryIn::WaveformData&>().s_trace);
+        }, [](CBinaryIn::WaveformData& self, const std::vector<uint16_t>& v) { self.s_trace = v; })
         .def_static("size", [](){ return sizeof(CBinaryIn::WaveformData); });
 
 
     py::class_<CBinaryIn::WaveformFixedHeader>(m, "WaveformFixedHeader")
+        .def(py::init<>())
         .def_readwrite("s_eventId", &CBinaryIn::WaveformFixedHeader::s_eventId)
         .def_readwrite("s_did", &CBinaryIn::WaveformFixedHeader::s_did)
         .def_readwrite("s_sid", &CBinaryIn::WaveformFixedHeader::s_sid)
@@ -83,4 +208,82 @@ PYBIND11_MODULE(caen_cpp, m) {
         .def_readwrite("s_shift", &CBinaryIn::WaveformFixedHeader::s_shift)
         .def_readwrite("s_channel", &CBinaryIn::WaveformFixedHeader::s_channel)
         .def_readwrite("s_nSamples", &CBinaryIn::WaveformFixedHeader::s_nSamples);
-}
\ No newline at end of file
+
+
+    PYBIND11_NUMPY_DTYPE(CBinaryMap::RecordEntry,
+        s_offset, s_todStamp, s_size, s_type, s_eventId, s_did, s_sid,
+        s_channel, s_triggerTag, s_shift, s_nSamples, s_reserved);
+
+    py::class_<CBinaryMap>(m, "CBinaryMap")
+        .def(py::init<const char*, bool>(), py::arg("filename"), py::arg("scan") = true)
+        .def("scan", &CBinaryMap::scan, py::call_guard<py::gil_scoped_release>())
+        .def("setRecords", [](CBinaryMap& self,
+                               py::array_t<CBinaryMap::RecordEntry, py::array::c_style> entries) {
+            self.setRecords(entries.data(), entries.size());
+        })
+        .def("fileSize", &CBinaryMap::fileSize)
+        .def("filename", &CBinaryMap::filename)
+        .def("numRecords", [](const CBinaryMap& self) { return self.records().size(); })
+        .def("records", [](py::object self) {
+            // A zero-copy view: the table can no longer be rebuilt (see shareRecords)
+            const auto& r = self.cast<CBinaryMap&>().shareRecords();
+            return readonlyView(self, r.data(), r.size());
+        })
+        .def("eventRecords", &CBinaryMap::eventRecords)
+        .def("trace", [](py::object self, size_t record) {
+            const CBinaryMap& map = self.cast<const CBinaryMap&>();
+            const uint16_t* p = map.trace(record);
+            return readonlyView(self, p, map.records()[record].s_nSamples);
+        })
+        .def("gatherTraces", [](const CBinaryMap& self,
+                                py::array_t<uint32_t, py::array::c_style | py::array::forcecast> records,
+                                py::array_t<int64_t, py::array::c_style | py::array::forcecast> rows,
+                                py::array_t<uint16_t, py::array::c_style> out) {
+            // Copies records[i] into out[rows[i]] with the GIL released
+            if (records.size() != rows.size()) {
+                throw std::invalid_argument("records and rows differ in length");
+            }
+            if (out.ndim() != 2) {
+                throw std::invalid_argument("out must be a 2-d array");
+            }
+            const uint32_t* r = records.data();
+            const int64_t* d = rows.data();
+            uint16_t* o = out.mutable_data();
+            size_t n = records.size(), nRows = out.shape(0), nSamples = out.shape(1);
+            py::gil_scoped_release release;
+            self.gatherTraces(r, d, n, o, nRows, nSamples);
+        }, py::arg("records"), py::arg("rows"), py::arg("out"))
+        .def("readDigitizerDescriptor", &CBinaryMap::readDigitizerDescriptor)
+        .def("readDigitizerSettings", &CBinaryMap::readDigitizerSettings)
+        .def("readWaveformHeader", &CBinaryMap::readWaveformHeader)
+        .def_static("entrySize", [](){ return sizeof(CBinaryMap::RecordEntry); });
+
+
+    py::class_<CBinaryOut>(m, "CBinaryOut")
+        .def(py::init<const char*>())
+        .def("writeDigitizerDescriptor", &CBinaryOut::writeDigitizerDescriptor)
+        .def("writeDigitizerSettings", &CBinaryOut::writeDigitizerSettings)
+        .def("writeWaveform", static_cast<uint64_t (CBinaryOut::*)(const CBinaryIn::WaveformData&)>(
+            &CBinaryOut::writeWaveform
+        ))
+        .def("writeWaveform", [](CBinaryOut& self, const CBinaryIn::WaveformFixedHeader& header,
+                                 py::array_t<uint16_t, py::array::c_style | py::array::forcecast> samples) {
+            // Samples straight from the array, no WaveformData in between
+            if (samples.ndim() != 1) {
+                throw std::invalid_argument("samples must be a 1-d array");
+            }
+            return self.writeWaveform(header, samples.data(), samples.size());
+        }, py::arg("header"), py::arg("samples"))
+        .def("copyRecords", [](CBinaryOut& self, const CBinaryMap& source,
+                               py::array_t<uint32_t, py::array::c_style | py::array::forcecast> records) {
+            // Whole records from the mapping with the GIL released
+            const uint32_t* r = records.data();
+            size_t n = records.size();
+            py::gil_scoped_release release;
+            return self.copyRecords(source, r, n);
+        }, py::arg("source"), py::arg("records"))
+        .def("bytesWritten", &CBinaryOut::bytesWritten)
+        .def("recordsWritten", &CBinaryOut::recordsWritten)
+        .def("flush", &CBinaryOut::flush)
+        .def("close", &CBinaryOut::close);
+}